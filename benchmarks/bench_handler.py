@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+End-to-end handler benchmark
+
+Drives handler.handler() against the mock ComfyUI server (no GPU needed) and
+reports, per video size and input mode:
+
+    overhead   handler latency minus the time the mock spent "executing" the prompt
+    p50 / p99  handler latency
+    jobs/s     throughput of back-to-back jobs
+    peak RSS   highest resident set size sampled while the scenario ran
+
+With --client, every job goes through GenerateVideoClient and a mock RunPod
+endpoint instead, so client-side encoding, transfer and decoding are included.
+
+Keep the mock delays at 0 to measure pure handler overhead; raise them to see
+how overhead compares with a realistic job.
+
+Usage:
+    python benchmarks/bench_handler.py [--jobs 20] [--video-sizes 1000000,20000000]
+                                       [--input-modes path,url,base64] [--output-mode base64]
+                                       [--client] [--json results.json]
+"""
+
+import argparse
+import functools
+import json
+import logging
+import os
+import shutil
+import statistics
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_comfyui import MockComfyUI  # noqa: E402
+from mock_runpod import MockRunPod  # noqa: E402
+
+# handler.py reads its configuration at import time
+WORK_DIR = tempfile.mkdtemp(prefix="bench_handler_")
+os.environ.setdefault("INPUT_CACHE_DIR", os.path.join(WORK_DIR, "input_cache"))
+os.environ.setdefault("TEXT_EMBED_CACHE_DIR", os.path.join(WORK_DIR, "text_embed_cache"))
+os.environ.setdefault("OUTPUT_UPLOADER", "local")
+os.environ.setdefault("OUTPUT_LOCAL_DIR", os.path.join(WORK_DIR, "outputs"))
+os.environ.setdefault("WORKER_READY_FILE", os.path.join(WORK_DIR, "worker_ready"))
+
+import handler  # noqa: E402
+from generate_video_client import GenerateVideoClient  # noqa: E402
+
+
+def write_png(path, size):
+    """Write a size x size RGB PNG with noisy pixels (incompressible, like a photo)"""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    rows = b"".join(b"\0" + os.urandom(size * 3) for _ in range(size))
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(rows, 1)))
+        f.write(chunk(b"IEND", b""))
+
+
+def read_rss():
+    """Current resident set size in bytes"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class RSSSampler:
+    """Samples RSS in a background thread and keeps the peak"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak = read_rss()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, read_rss())
+            self._stop.wait(self.interval)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def serve_directory(directory):
+    """Serve a directory over HTTP for image_url inputs"""
+    class QuietHandler(SimpleHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=directory))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def build_job_input(mode, image_path, image_url, image_base64, output_mode):
+    job_input = {
+        "prompt": "running man, grab the gun",
+        "seed": 42,
+        "cfg": 2.0,
+        "width": 480,
+        "height": 832,
+        "length": 81,
+        "steps": 10,
+        "output_mode": output_mode,
+    }
+    if mode == "path":
+        job_input["image_path"] = image_path
+    elif mode == "url":
+        job_input["image_url"] = image_url
+    else:
+        job_input["image_base64"] = image_base64
+    return job_input
+
+
+def run_scenario(mock, run_job, jobs):
+    """Run jobs back to back, returning latency/overhead/throughput/RSS statistics"""
+    latencies = []
+    overheads = []
+    with RSSSampler() as rss:
+        start = time.perf_counter()
+        for _ in range(jobs):
+            seen = set(mock.execution_seconds)
+            job_start = time.perf_counter()
+            result = run_job()
+            latency = time.perf_counter() - job_start
+            if "error" in result:
+                raise RuntimeError(f"job failed: {result['error']}")
+            executed = sum(s for pid, s in list(mock.execution_seconds.items()) if pid not in seen)
+            latencies.append(latency)
+            overheads.append(latency - executed)
+        wall = time.perf_counter() - start
+    return {
+        "jobs": jobs,
+        "overhead_ms_mean": statistics.mean(overheads) * 1000,
+        "latency_ms_p50": percentile(latencies, 50) * 1000,
+        "latency_ms_p99": percentile(latencies, 99) * 1000,
+        "jobs_per_second": jobs / wall,
+        "peak_rss_mb": rss.peak / 1024 ** 2,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=20)
+    parser.add_argument("--video-sizes", default="1000000,20000000", help="Comma separated fake video sizes in bytes")
+    parser.add_argument("--input-modes", default="path,url,base64")
+    parser.add_argument("--output-mode", choices=("base64", "url"), default="base64")
+    parser.add_argument("--image-size", type=int, default=512, help="Input PNG width/height in pixels")
+    parser.add_argument("--node-delay", type=float, default=0.0)
+    parser.add_argument("--step-delay", type=float, default=0.0)
+    parser.add_argument("--progress", action="store_true", help="Send RunPod progress updates (to a counting sink)")
+    parser.add_argument("--client", action="store_true", help="Go through GenerateVideoClient and a mock RunPod endpoint")
+    parser.add_argument("--json", help="Write the results to this file as a baseline")
+    args = parser.parse_args()
+
+    logging.getLogger(handler.__name__).setLevel(logging.WARNING)
+    logging.getLogger("generate_video_client").setLevel(logging.WARNING)
+
+    progress_updates = []
+    handler.runpod.serverless.progress_update = lambda job, progress: progress_updates.append(progress)
+
+    mock = MockComfyUI(port=0, output_dir=os.path.join(WORK_DIR, "comfy_output"),
+                       node_delay=args.node_delay, step_delay=args.step_delay).start()
+    handler.comfy = handler.ComfyUIConnection("127.0.0.1", handler.client_id, port=mock.port)
+
+    image_dir = os.path.join(WORK_DIR, "images")
+    os.makedirs(image_dir)
+    image_path = os.path.join(image_dir, "input.png")
+    write_png(image_path, args.image_size)
+    with open(image_path, "rb") as f:
+        image_base64 = handler.base64.b64encode(f.read()).decode("utf-8")
+    file_server = serve_directory(image_dir)
+    image_url = f"http://127.0.0.1:{file_server.server_address[1]}/input.png"
+
+    runpod = None
+    client = None
+    if args.client:
+        runpod = MockRunPod(handler.handler).start()
+        client = GenerateVideoClient("bench", "bench-key", completion_mode="runsync", api_base_url=runpod.url)
+    output_path = os.path.join(WORK_DIR, "client_output.mp4")
+
+    print(f"input image: {args.image_size}x{args.image_size} PNG, {os.path.getsize(image_path) / 1024:.0f} KiB"
+          f" / output_mode: {args.output_mode} / {'client + mock RunPod' if args.client else 'handler()'}")
+    print(f"{'video':>9} {'input':>7} {'overhead':>10} {'p50':>10} {'p99':>10} {'jobs/s':>8} {'peak RSS':>10}")
+
+    results = []
+    try:
+        for video_bytes in (int(v) for v in args.video_sizes.split(",")):
+            mock.video_bytes = video_bytes
+            for mode in args.input_modes.split(","):
+                job_input = build_job_input(mode, image_path, image_url, image_base64, args.output_mode)
+                if client:
+                    def run_job():
+                        result = client.create_video_from_image(
+                            image_path, width=480, height=832, length=81, steps=10, output_mode=args.output_mode)
+                        if "error" not in result and not client.save_video_result(result, output_path):
+                            return {"error": "saving the video failed"}
+                        return result
+                else:
+                    job = {"input": job_input}
+                    if args.progress:
+                        job["id"] = "bench"
+
+                    def run_job():
+                        return handler.handler(dict(job))
+
+                # one untimed job so input caches and connections are warm
+                run_job()
+                stats = run_scenario(mock, run_job, args.jobs)
+                stats.update(video_bytes=video_bytes, input_mode="base64 (client)" if client else mode)
+                results.append(stats)
+                print(f"{video_bytes / 1e6:>7.1f}MB {stats['input_mode'] if not client else 'client':>7}"
+                      f" {stats['overhead_ms_mean']:>8.1f}ms {stats['latency_ms_p50']:>8.1f}ms"
+                      f" {stats['latency_ms_p99']:>8.1f}ms {stats['jobs_per_second']:>8.1f}"
+                      f" {stats['peak_rss_mb']:>8.1f}MB")
+                if client:
+                    # the client always sends the image as base64
+                    break
+    finally:
+        if runpod:
+            runpod.stop()
+        file_server.shutdown()
+        mock.stop()
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+    if args.progress:
+        print(f"progress updates sent: {len(progress_updates)}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
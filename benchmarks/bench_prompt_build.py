@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Prompt-build microbenchmark
+
+Compares the per-job cost of building a ComfyUI workflow the old way
+(re-read and re-parse the template JSON, then patch nodes in place) against
+handler.build_prompt (cached read-only template + copy-on-write nodes).
+
+Usage:
+    python benchmarks/bench_prompt_build.py [--iterations 2000]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import handler  # noqa: E402
+
+LORA_PAIRS = [
+    {"high": "lora1_high.safetensors", "low": "lora1_low.safetensors", "high_weight": 1.0, "low_weight": 0.8},
+    {"high": "lora2_high.safetensors", "low": "lora2_low.safetensors"},
+]
+
+PARAMS = {
+    "image": "/tmp/input_image.jpg",
+    "prompt": "running man, grab the gun",
+    "negative_prompt": handler.DEFAULT_NEGATIVE_PROMPT,
+    "length": 81,
+    "seed": 42,
+    "cfg": 2.0,
+    "width": 480,
+    "height": 832,
+    "context_overlap": 48,
+}
+
+
+def build_prompt_legacy(workflow_path):
+    """Per-job template load and in-place patching, as the handler did before caching"""
+    prompt = handler.load_workflow(workflow_path)
+    prompt["244"]["inputs"]["image"] = PARAMS["image"]
+    prompt["541"]["inputs"]["num_frames"] = PARAMS["length"]
+    prompt["135"]["inputs"]["positive_prompt"] = PARAMS["prompt"]
+    prompt["135"]["inputs"]["negative_prompt"] = PARAMS["negative_prompt"]
+    prompt["220"]["inputs"]["seed"] = PARAMS["seed"]
+    prompt["540"]["inputs"]["seed"] = PARAMS["seed"]
+    prompt["540"]["inputs"]["cfg"] = PARAMS["cfg"]
+    prompt["235"]["inputs"]["value"] = PARAMS["width"]
+    prompt["236"]["inputs"]["value"] = PARAMS["height"]
+    prompt["498"]["inputs"]["context_overlap"] = PARAMS["context_overlap"]
+    prompt["498"]["inputs"]["context_frames"] = PARAMS["length"]
+    for i, lora_pair in enumerate(LORA_PAIRS):
+        prompt["279"]["inputs"][f"lora_{i+1}"] = lora_pair["high"]
+        prompt["279"]["inputs"][f"strength_{i+1}"] = lora_pair.get("high_weight", 1.0)
+        prompt["553"]["inputs"][f"lora_{i+1}"] = lora_pair["low"]
+        prompt["553"]["inputs"][f"strength_{i+1}"] = lora_pair.get("low_weight", 1.0)
+    return prompt
+
+
+def measure(func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    # LoRA logging would dominate the measurement
+    logging.getLogger(handler.__name__).setLevel(logging.WARNING)
+
+    workflow_path = os.path.join(handler.WORKFLOW_DIR, handler.WORKFLOW_FILES["single"])
+    legacy = build_prompt_legacy(workflow_path)
+    cached = handler.build_prompt("single", PARAMS, LORA_PAIRS)
+    same = json.loads(json.dumps(cached, default=handler._json_default)) == legacy
+
+    legacy_us = measure(lambda: build_prompt_legacy(workflow_path), args.iterations)
+    cached_us = measure(lambda: handler.build_prompt("single", PARAMS, LORA_PAIRS), args.iterations)
+
+    print(f"identical output : {same}")
+    print(f"legacy (load+patch) : {legacy_us:8.1f} us/job")
+    print(f"cached template     : {cached_us:8.1f} us/job")
+    print(f"speedup             : {legacy_us / cached_us:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,488 @@
+#!/usr/bin/env python3
+"""
+Mock ComfyUI server
+
+A local stand-in for ComfyUI so handler.py (and GenerateVideoClient through a
+local RunPod stand-in) can be exercised and benchmarked without a GPU.
+
+Implements the endpoints the handler uses:
+    POST /prompt              queue a workflow, returns {"prompt_id", "number", "node_errors"}
+    GET  /history/{prompt_id} outputs and status of a finished prompt
+    POST /history             {"delete": [prompt_id, ...]} or {"clear": true}
+    GET  /queue               {"queue_running": [...], "queue_pending": [...]}
+    POST /queue               {"delete": [prompt_id, ...]} or {"clear": true}
+    POST /interrupt           stop the running prompt (execution_interrupted event)
+    GET  /view                serve an output file (filename, subfolder, type)
+    GET  /system_stats        one CUDA device with the configured VRAM
+    GET  /ws?clientId=...     websocket with the ComfyUI event stream
+
+Prompts run one at a time in queue order, like ComfyUI. For each prompt the
+server sends execution_start, execution_cached, executing/progress/executed
+per node in dependency order, executing with node=None and
+execution_success. Nodes whose inputs are unchanged since the previous prompt
+are reported as cached and skipped, so model loaders only "load" once.
+Sampler nodes emit one progress event per step, every
+VHS_VideoCombine node writes a fake mp4 of the configured size, and every
+PreviewImage/SaveImage node writes a small PNG (served by /view).
+
+Usage:
+    python benchmarks/mock_comfyui.py [--port 8188] [--video-bytes 2000000]
+                                      [--node-delay 0.01] [--step-delay 0.05]
+                                      [--load-delay 0.5] [--vram-gb 24]
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import queue
+import socket
+import struct
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+SAMPLER_CLASS_TYPES = ("WanVideoSampler",)
+VIDEO_CLASS_TYPES = ("VHS_VideoCombine",)
+IMAGE_CLASS_TYPES = {"PreviewImage": "temp", "SaveImage": "output"}
+
+
+def encode_frame(payload, opcode=0x1):
+    """Encode an unmasked server-to-client websocket frame"""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack(">BB", 0x80 | opcode, length)
+    elif length < 65536:
+        header = struct.pack(">BBH", 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack(">BBQ", 0x80 | opcode, 127, length)
+    return header + payload
+
+
+def read_frame(rfile):
+    """Read one (masked) client frame, returning (opcode, payload) or (None, b"") on EOF"""
+    head = rfile.read(2)
+    if len(head) < 2:
+        return None, b""
+    opcode = head[0] & 0x0F
+    masked = head[1] & 0x80
+    length = head[1] & 0x7F
+    if length == 126:
+        length = struct.unpack(">H", rfile.read(2))[0]
+    elif length == 127:
+        length = struct.unpack(">Q", rfile.read(8))[0]
+    mask = rfile.read(4) if masked else b"\0\0\0\0"
+    payload = bytearray(rfile.read(length))
+    for i in range(len(payload)):
+        payload[i] ^= mask[i % 4]
+    return opcode, bytes(payload)
+
+
+def _is_link(value):
+    return isinstance(value, list) and len(value) == 2 and isinstance(value[0], str)
+
+
+class WebSocketClient:
+    """A connected /ws client; frames are written under a lock from the executor thread"""
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def send_json(self, message):
+        if self.closed:
+            return
+        frame = encode_frame(json.dumps(message).encode("utf-8"))
+        try:
+            with self.lock:
+                self.wfile.write(frame)
+                self.wfile.flush()
+        except OSError:
+            self.closed = True
+
+
+class MockComfyUI:
+    """In-process mock ComfyUI server
+
+    Args:
+        host: Address to bind
+        port: Port to bind (0 picks a free port)
+        output_dir: Where fake videos and images are written (a temporary directory by default)
+        video_bytes: Size of each fake mp4
+        node_delay: Seconds spent in every executed node
+        step_delay: Seconds per sampler step
+        load_delay: Extra seconds for loader nodes (class type containing "Loader")
+        vram_gb: GPU memory reported by /system_stats
+    """
+
+    def __init__(self, host="127.0.0.1", port=8188, output_dir=None, video_bytes=2_000_000,
+                 node_delay=0.01, step_delay=0.05, load_delay=0.0, vram_gb=24):
+        self.output_dir = output_dir or tempfile.mkdtemp(prefix="mock_comfyui_")
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.video_bytes = video_bytes
+        self.node_delay = node_delay
+        self.step_delay = step_delay
+        self.load_delay = load_delay
+        self.vram_gb = vram_gb
+        self.clients = {}
+        self.history = {}
+        # prompt_id -> seconds spent executing (queue wait excluded)
+        self.execution_seconds = {}
+        self.prompt_count = 0
+        self.running = None
+        self.pending = []
+        self.interrupted = []
+        self._deleted = set()
+        self._interrupt = threading.Event()
+        self._queue = queue.Queue()
+        self._node_signatures = {}
+        self._counter = 0
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._threads = []
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    @property
+    def url(self):
+        return f"http://{self._server.server_address[0]}:{self.port}"
+
+    def start(self):
+        """Start serving and executing prompts in background threads"""
+        for target in (self._server.serve_forever, self._execute_loop):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        self._queue.put(None)
+        self._server.shutdown()
+        self._server.server_close()
+
+    def queue_remaining(self):
+        return len(self.pending) + (1 if self.running else 0)
+
+    def queue_state(self):
+        def item(number, prompt_id):
+            return [number, prompt_id, {}, {}, []]
+        return {
+            "queue_running": [item(*self.running)] if self.running else [],
+            "queue_pending": [item(*entry) for entry in self.pending],
+        }
+
+    def delete_from_queue(self, prompt_ids):
+        self._deleted.update(prompt_ids)
+        self.pending = [entry for entry in self.pending if entry[1] not in self._deleted]
+
+    def interrupt(self, prompt_id=None):
+        if self.running and prompt_id in (None, self.running[1]):
+            self._interrupt.set()
+
+    def _broadcast_status(self):
+        message = {"type": "status", "data": {"status": {"exec_info": {"queue_remaining": self.queue_remaining()}}}}
+        for client in list(self.clients.values()):
+            client.send_json(message)
+
+    def submit(self, prompt, client_id):
+        self.prompt_count += 1
+        prompt_id = str(uuid.uuid4())
+        self.pending.append((self.prompt_count, prompt_id))
+        self._queue.put((self.prompt_count, prompt_id, prompt, client_id))
+        self._broadcast_status()
+        return {"prompt_id": prompt_id, "number": self.prompt_count, "node_errors": {}}
+
+    def _execution_order(self, prompt):
+        """Dependency (topological) order of the prompt's nodes"""
+        order = []
+        visited = set()
+
+        def visit(node_id):
+            if node_id in visited or node_id not in prompt:
+                return
+            visited.add(node_id)
+            for value in prompt[node_id].get("inputs", {}).values():
+                if _is_link(value):
+                    visit(value[0])
+            order.append(node_id)
+
+        for node_id in sorted(prompt, key=lambda n: (not n.isdigit(), int(n) if n.isdigit() else 0, n)):
+            visit(node_id)
+        return order
+
+    def _signature(self, prompt, node_id, signatures):
+        inputs = {}
+        for name, value in prompt[node_id].get("inputs", {}).items():
+            inputs[name] = signatures.get(value[0]) if _is_link(value) else value
+        data = json.dumps([prompt[node_id]["class_type"], inputs], sort_keys=True, default=str)
+        return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+    def _resolve(self, prompt, value):
+        """Follow a link to a constant node's value (INTConstant and friends)"""
+        if _is_link(value):
+            inputs = prompt.get(value[0], {}).get("inputs", {})
+            return self._resolve(prompt, inputs.get("value", 0))
+        return value
+
+    def _sampler_steps(self, prompt, node_id):
+        inputs = prompt[node_id]["inputs"]
+        steps = int(self._resolve(prompt, inputs.get("steps", 1)))
+        start = int(self._resolve(prompt, inputs.get("start_step", 0)))
+        end = int(self._resolve(prompt, inputs.get("end_step", -1)))
+        if end < 0 or end > steps:
+            end = steps
+        return range(start, end), steps
+
+    def _write_video(self, prompt, node_id):
+        self._counter += 1
+        prefix = prompt[node_id]["inputs"].get("filename_prefix", "ComfyUI")
+        filename = f"{os.path.basename(str(prefix))}_{self._counter:05}.mp4"
+        fullpath = os.path.join(self.output_dir, filename)
+        with open(fullpath, "wb") as f:
+            remaining = self.video_bytes
+            block = os.urandom(min(remaining, 1024 * 1024))
+            while remaining > 0:
+                f.write(block[:remaining])
+                remaining -= len(block)
+        return {"gifs": [{"filename": filename, "subfolder": "", "type": "output",
+                          "format": "video/h264-mp4", "fullpath": fullpath}]}
+
+    def _write_image(self, prompt, node_id):
+        self._counter += 1
+        class_type = prompt[node_id]["class_type"]
+        prefix = prompt[node_id]["inputs"].get("filename_prefix", "ComfyUI")
+        filename = f"{os.path.basename(str(prefix))}_{self._counter:05}_.png"
+
+        def chunk(kind, data):
+            return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+        with open(os.path.join(self.output_dir, filename), "wb") as f:
+            f.write(b"\x89PNG\r\n\x1a\n")
+            f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0)))
+            f.write(chunk(b"IDAT", zlib.compress(b"\0" + os.urandom(3))))
+            f.write(chunk(b"IEND", b""))
+        return {"images": [{"filename": filename, "subfolder": "", "type": IMAGE_CLASS_TYPES[class_type]}]}
+
+    def _execute_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            number, prompt_id = item[:2]
+            self.pending = [entry for entry in self.pending if entry[1] != prompt_id]
+            if prompt_id in self._deleted:
+                continue
+            self.running = (number, prompt_id)
+            self._interrupt.clear()
+            try:
+                self._execute(*item[1:])
+            finally:
+                self.running = None
+            self._broadcast_status()
+
+    def _execute(self, prompt_id, prompt, client_id):
+        client = self.clients.get(client_id)
+
+        def send(msg_type, **data):
+            if client is not None:
+                client.send_json({"type": msg_type, "data": dict(data, prompt_id=prompt_id)})
+
+        start = time.time()
+        send("execution_start", timestamp=int(start * 1000))
+        order = self._execution_order(prompt)
+        signatures = {}
+        for node_id in order:
+            signatures[node_id] = self._signature(prompt, node_id, signatures)
+        cached = [n for n in order if self._node_signatures.get(n) == signatures[n]
+                  and prompt[n]["class_type"] not in VIDEO_CLASS_TYPES
+                  and prompt[n]["class_type"] not in IMAGE_CLASS_TYPES]
+        send("execution_cached", nodes=cached, timestamp=int(time.time() * 1000))
+
+        outputs = {}
+        for node_id in order:
+            if node_id in cached:
+                continue
+            class_type = prompt[node_id]["class_type"]
+            send("executing", node=node_id, display_node=node_id)
+            delay = self.node_delay + (self.load_delay if "Loader" in class_type else 0)
+            time.sleep(delay)
+            if class_type in SAMPLER_CLASS_TYPES:
+                steps, max_steps = self._sampler_steps(prompt, node_id)
+                for step in steps:
+                    if self._interrupt.is_set():
+                        break
+                    time.sleep(self.step_delay)
+                    send("progress", value=step + 1, max=max_steps, node=node_id)
+            if self._interrupt.is_set():
+                # like ComfyUI: interrupted prompts keep no cache and end without execution_success
+                self._node_signatures = {}
+                self.interrupted.append(prompt_id)
+                self.history[prompt_id] = {
+                    "prompt": [self.prompt_count, prompt_id, prompt, {"client_id": client_id}, []],
+                    "outputs": outputs,
+                    "status": {"status_str": "error", "completed": False, "messages": []},
+                }
+                send("execution_interrupted", node_id=node_id, node_type=class_type, executed=[])
+                return
+            if class_type in VIDEO_CLASS_TYPES:
+                outputs[node_id] = self._write_video(prompt, node_id)
+                send("executed", node=node_id, display_node=node_id, output=outputs[node_id])
+            elif class_type in IMAGE_CLASS_TYPES:
+                outputs[node_id] = self._write_image(prompt, node_id)
+                send("executed", node=node_id, display_node=node_id, output=outputs[node_id])
+        self._node_signatures = signatures
+
+        self.execution_seconds[prompt_id] = time.time() - start
+        self.history[prompt_id] = {
+            "prompt": [self.prompt_count, prompt_id, prompt, {"client_id": client_id}, list(outputs)],
+            "outputs": outputs,
+            "status": {"status_str": "success", "completed": True, "messages": []},
+        }
+        send("executing", node=None)
+        send("execution_success", timestamp=int(time.time() * 1000))
+
+    def _make_handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                # headers and body are written separately; without this Nagle + delayed ACK add ~40 ms per request
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, data, status=200):
+                body = json.dumps(data).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if url.path == "/ws":
+                    return self._websocket(query.get("clientId", [str(uuid.uuid4())])[0])
+                if url.path.startswith("/history/"):
+                    prompt_id = url.path.rsplit("/", 1)[-1]
+                    entry = mock.history.get(prompt_id)
+                    return self._send_json({prompt_id: entry} if entry else {})
+                if url.path == "/queue":
+                    return self._send_json(mock.queue_state())
+                if url.path == "/system_stats":
+                    vram = int(mock.vram_gb * 1024 ** 3)
+                    return self._send_json({
+                        "system": {"os": "posix", "python_version": "mock", "embedded_python": False},
+                        "devices": [{"name": "cuda:0 Mock GPU", "type": "cuda", "index": 0,
+                                     "vram_total": vram, "vram_free": vram,
+                                     "torch_vram_total": vram, "torch_vram_free": vram}],
+                    })
+                if url.path == "/view":
+                    filename = os.path.basename(query.get("filename", [""])[0])
+                    path = os.path.join(mock.output_dir, query.get("subfolder", [""])[0], filename)
+                    if not filename or not os.path.isfile(path):
+                        return self._send_json({"error": "not found"}, 404)
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/octet-stream")
+                    self.send_header("Content-Length", str(os.path.getsize(path)))
+                    self.end_headers()
+                    with open(path, "rb") as f:
+                        while chunk := f.read(1024 * 1024):
+                            self.wfile.write(chunk)
+                    return
+                # "/" and anything else: readiness probe
+                self._send_json({})
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                length = int(self.headers.get("Content-Length", 0))
+                data = json.loads(self.rfile.read(length) or b"{}")
+                if url.path == "/prompt":
+                    return self._send_json(mock.submit(data["prompt"], data.get("client_id")))
+                if url.path == "/queue":
+                    if data.get("clear"):
+                        mock.delete_from_queue([entry[1] for entry in mock.pending])
+                    mock.delete_from_queue(data.get("delete", []))
+                    return self._send_json({})
+                if url.path == "/interrupt":
+                    mock.interrupt(data.get("prompt_id"))
+                    return self._send_json({})
+                if url.path == "/history":
+                    if data.get("clear"):
+                        mock.history.clear()
+                    for prompt_id in data.get("delete", []):
+                        mock.history.pop(prompt_id, None)
+                    return self._send_json({})
+                self._send_json({"error": f"unsupported endpoint {url.path}"}, 404)
+
+            def _websocket(self, client_id):
+                key = self.headers["Sec-WebSocket-Key"]
+                accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+                self.send_response(101)
+                self.send_header("Upgrade", "websocket")
+                self.send_header("Connection", "Upgrade")
+                self.send_header("Sec-WebSocket-Accept", accept)
+                self.end_headers()
+                self.wfile.flush()
+                client = WebSocketClient(self.wfile)
+                mock.clients[client_id] = client
+                client.send_json({"type": "status", "data": {"status": {"exec_info": {"queue_remaining": mock.queue_remaining()}}, "sid": client_id}})
+                try:
+                    while True:
+                        opcode, payload = read_frame(self.rfile)
+                        if opcode is None or opcode == 0x8:
+                            break
+                        if opcode == 0x9:
+                            with client.lock:
+                                self.wfile.write(encode_frame(payload, opcode=0xA))
+                                self.wfile.flush()
+                except OSError:
+                    pass
+                finally:
+                    client.closed = True
+                    if mock.clients.get(client_id) is client:
+                        del mock.clients[client_id]
+                    self.close_connection = True
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8188)
+    parser.add_argument("--output-dir", default=None)
+    parser.add_argument("--video-bytes", type=int, default=2_000_000)
+    parser.add_argument("--node-delay", type=float, default=0.01)
+    parser.add_argument("--step-delay", type=float, default=0.05)
+    parser.add_argument("--load-delay", type=float, default=0.0)
+    parser.add_argument("--vram-gb", type=float, default=24)
+    args = parser.parse_args()
+
+    mock = MockComfyUI(args.host, args.port, args.output_dir, args.video_bytes,
+                       args.node_delay, args.step_delay, args.load_delay, args.vram_gb).start()
+    print(f"Mock ComfyUI listening on {mock.url} (outputs in {mock.output_dir})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    main()
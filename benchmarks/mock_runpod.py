@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Mock RunPod serverless endpoint
+
+Runs a handler function (normally handler.handler) behind the RunPod
+endpoint API so GenerateVideoClient can be driven end to end locally:
+
+    POST {url}/{endpoint_id}/run          queue a job, returns {"id", "status": "IN_QUEUE"}
+    POST {url}/{endpoint_id}/runsync      queue a job and hold the request until it finishes
+    GET  {url}/{endpoint_id}/status/{id}  job status, output, delayTime/executionTime (ms)
+    POST {url}/{endpoint_id}/cancel/{id}  cancel a queued or running job
+    GET  {url}/{endpoint_id}/health       job counts by state and idle/running workers
+
+Jobs run on `workers` threads in submission order. Async handlers (like
+handler.async_handler) run in an event loop per worker thread, and cancelling
+a running job cancels its task, as the RunPod SDK does. A handler result
+containing "error" is reported as FAILED with the remaining keys as output,
+like the RunPod SDK does. When the job input carries a "webhook", the final
+status is POSTed to it. Setting `failing` makes every request answer 503, to
+exercise client failover.
+Run several mocks to stand in for an endpoint pool.
+
+Use the mock's `url` as GenerateVideoClient's api_base_url.
+"""
+
+import asyncio
+import itertools
+import json
+import queue
+import socket
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+
+class MockRunPod:
+    """In-process mock RunPod endpoint
+
+    Args:
+        handler: Function called with {"id", "input"} for each job
+        workers: Number of jobs executed at the same time
+        runsync_wait: Seconds /runsync holds the request before returning a running job
+        host: Address to bind
+        port: Port to bind (0 picks a free port)
+    """
+
+    def __init__(self, handler, workers=1, runsync_wait=90.0, host="127.0.0.1", port=0):
+        self.handler = handler
+        self.workers = workers
+        self.runsync_wait = runsync_wait
+        self.failing = False
+        self.jobs = {}
+        self.status_requests = 0
+        self._ids = itertools.count(1)
+        self._queue = queue.Queue()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        for _ in range(self.workers):
+            threading.Thread(target=self._work, daemon=True).start()
+        return self
+
+    def stop(self):
+        for _ in range(self.workers):
+            self._queue.put(None)
+        self._server.shutdown()
+        self._server.server_close()
+
+    def submit(self, body):
+        # unique across mocks, like real RunPod job IDs, so a pool of mocks never hands out the same ID
+        job_id = f"mock-{self._server.server_address[1]}-{next(self._ids)}"
+        self.jobs[job_id] = {
+            "id": job_id,
+            "status": "IN_QUEUE",
+            "input": body.get("input", {}),
+            "webhook": body.get("webhook"),
+            "submitted": time.time(),
+            "done": threading.Event(),
+        }
+        self._queue.put(job_id)
+        return job_id
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return {"id": job_id, "status": "NOT_FOUND"}
+        if job["status"] in ("IN_QUEUE", "IN_PROGRESS"):
+            if job.get("task") is not None:
+                job["loop"].call_soon_threadsafe(job["task"].cancel)
+            job["status"] = "CANCELLED"
+            job["done"].set()
+        return {"id": job_id, "status": job["status"]}
+
+    def _call_handler(self, job):
+        if not asyncio.iscoroutinefunction(self.handler):
+            return self.handler({"id": job["id"], "input": job["input"]})
+
+        async def run():
+            job["loop"] = asyncio.get_running_loop()
+            job["task"] = asyncio.current_task()
+            return await self.handler({"id": job["id"], "input": job["input"]})
+
+        return asyncio.run(run())
+
+    def status(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return {"id": job_id, "status": "NOT_FOUND"}
+        data = {"id": job_id, "status": job["status"]}
+        for key in ("output", "error", "delayTime", "executionTime"):
+            if key in job:
+                data[key] = job[key]
+        return data
+
+    def health(self):
+        counts = {"completed": 0, "failed": 0, "inProgress": 0, "inQueue": 0}
+        for job in list(self.jobs.values()):
+            key = {"COMPLETED": "completed", "FAILED": "failed", "IN_PROGRESS": "inProgress",
+                   "IN_QUEUE": "inQueue"}.get(job["status"])
+            if key:
+                counts[key] += 1
+        running = min(counts["inProgress"], self.workers)
+        return {"jobs": counts, "workers": {"idle": self.workers - running, "running": running}}
+
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                return
+            job = self.jobs[job_id]
+            if job["status"] == "CANCELLED":
+                continue
+            start = time.time()
+            job["status"] = "IN_PROGRESS"
+            job["delayTime"] = int((start - job["submitted"]) * 1000)
+            try:
+                output = self._call_handler(job)
+                if job["status"] == "CANCELLED":
+                    pass
+                elif isinstance(output, dict) and "error" in output:
+                    job["status"] = "FAILED"
+                    job["error"] = output["error"]
+                    job["output"] = {key: value for key, value in output.items() if key != "error"}
+                else:
+                    job["status"] = "COMPLETED"
+                    job["output"] = output
+            except asyncio.CancelledError:
+                job["status"] = "CANCELLED"
+            except Exception:
+                if job["status"] != "CANCELLED":
+                    job["status"] = "FAILED"
+                    job["error"] = traceback.format_exc()
+            job["executionTime"] = int((time.time() - start) * 1000)
+            job["done"].set()
+            if job["webhook"]:
+                try:
+                    requests.post(job["webhook"], json=self.status(job_id), timeout=10)
+                except requests.exceptions.RequestException:
+                    pass
+
+    def _make_handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                # headers and body are written separately; without this Nagle + delayed ACK add ~40 ms per request
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, data, status=200):
+                body = json.dumps(data).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if mock.failing:
+                    return self._send_json({"error": "endpoint unavailable"}, 503)
+                parts = self.path.rstrip("/").split("/")
+                if len(parts) >= 2 and parts[-2] == "cancel":
+                    return self._send_json(mock.cancel(parts[-1]))
+                action = parts[-1]
+                if action not in ("run", "runsync"):
+                    return self._send_json({"error": f"unsupported endpoint {self.path}"}, 404)
+                job_id = mock.submit(body)
+                if action == "runsync":
+                    mock.jobs[job_id]["done"].wait(mock.runsync_wait)
+                self._send_json(mock.status(job_id))
+
+            def do_GET(self):
+                if mock.failing:
+                    return self._send_json({"error": "endpoint unavailable"}, 503)
+                parts = self.path.rstrip("/").split("/")
+                if parts[-1] == "health":
+                    return self._send_json(mock.health())
+                if len(parts) >= 2 and parts[-2] == "status":
+                    mock.status_requests += 1
+                    return self._send_json(mock.status(parts[-1]))
+                self._send_json({"error": f"unsupported endpoint {self.path}"}, 404)
+
+        return Handler
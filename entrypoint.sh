@@ -3,9 +3,25 @@
 # Exit immediately if a command exits with a non-zero status.
 set -e
 
+# 텍스트 임베딩 캐시를 네트워크 볼륨에 저장 (워커가 바뀌어도 유지, T5 모델별 폴더)
+TEXT_EMBED_MODEL=${TEXT_EMBED_MODEL:-umt5-xxl-enc-bf16}
+WAN_NODE_DIR=/ComfyUI/custom_nodes/ComfyUI-WanVideoWrapper
+if [ -d /runpod-volume ] && [ -d "$WAN_NODE_DIR" ]; then
+    mkdir -p "/runpod-volume/embed_cache/$TEXT_EMBED_MODEL"
+    rm -rf "$WAN_NODE_DIR/text_embed_cache"
+    ln -s "/runpod-volume/embed_cache/$TEXT_EMBED_MODEL" "$WAN_NODE_DIR/text_embed_cache"
+    echo "Text embedding cache linked to /runpod-volume/embed_cache/$TEXT_EMBED_MODEL"
+fi
+
+# ComfyUI 노드 출력 LRU 캐시 (CLIP vision 인코딩 등 입력이 같은 노드 결과를 여러 작업에서 재사용)
+COMFYUI_ARGS="--listen --use-sage-attention"
+if [ -n "$COMFYUI_CACHE_LRU" ] && [ "$COMFYUI_CACHE_LRU" != "0" ]; then
+    COMFYUI_ARGS="$COMFYUI_ARGS --cache-lru $COMFYUI_CACHE_LRU"
+fi
+
 # Start ComfyUI in the background
 echo "Starting ComfyUI in the background..."
-python /ComfyUI/main.py --listen --use-sage-attention &
+python /ComfyUI/main.py $COMFYUI_ARGS &
 
 # Wait for ComfyUI to be ready
 echo "Waiting for ComfyUI to be ready..."
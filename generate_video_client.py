@@ -9,30 +9,698 @@ import requests
 import json
 import time
 import base64
-from typing import Optional, Dict, Any, List, Union
+import hashlib
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Dict, Any, List, Sequence, Tuple, Union
+from urllib.parse import urlsplit
+from urllib3.exceptions import NewConnectionError
 import logging
 
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it images are uploaded unchanged
+    Image = None
+
 # Logging configuration
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+RUNPOD_API_BASE_URL = "https://api.runpod.ai/v2"
+
+# Completion modes for wait_for_completion / create_video_from_image
+COMPLETION_MODES = ("fixed", "adaptive", "runsync", "webhook")
+
+# Reference job used to scale expected durations (480x832, 81 frames, 10 steps)
+REFERENCE_PIXEL_FRAMES = 480 * 832 * 81
+REFERENCE_STEPS = 10
+REFERENCE_SECONDS = 120.0
+FIXED_OVERHEAD_SECONDS = 20.0
+
+# Input keys that change how the result is delivered, not the video itself
+FINGERPRINT_IGNORED_KEYS = ("output_mode",)
+
+# Endpoint pool scheduling: health refresh interval, failover and cold start cost (seconds)
+HEALTH_CHECK_INTERVAL = 10.0
+ENDPOINT_MAX_ERRORS = 3
+ENDPOINT_COOLDOWN = 60.0
+COLD_START_SECONDS = 60.0
+# Weight of the newest job when tracking how fast an endpoint runs jobs
+ENDPOINT_SPEED_SMOOTHING = 0.3
+
+# Re-encoding of pre-resized uploads ("jpeg" or "png")
+UPLOAD_FORMAT = "jpeg"
+UPLOAD_JPEG_QUALITY = 95
+
+# Journal batch_process_images(resume=True) keeps in the output folder
+BATCH_JOURNAL_NAME = "batch_journal.jsonl"
+
+# LoRA pairs the workflow applies (HIGH/LOW slots per pair)
+MAX_LORA_PAIRS = 4
+
+# Submission retry backoff (seconds)
+SUBMIT_BACKOFF_BASE = 2.0
+SUBMIT_BACKOFF_MAX = 60.0
+
+
+def estimate_job_duration(width: int = 480, height: int = 832, length: int = 81, steps: int = 10) -> float:
+    """
+    Estimate how long a job runs once a worker picks it up
+    
+    Sampling cost scales roughly with pixels x frames x steps; model loading,
+    decoding and encoding are folded into a fixed overhead.
+    
+    Args:
+        width: Output width
+        height: Output height
+        length: Number of frames
+        steps: Number of steps
+    
+    Returns:
+        Expected execution time in seconds
+    """
+    scale = (width * height * length) / REFERENCE_PIXEL_FRAMES * (steps / REFERENCE_STEPS)
+    return FIXED_OVERHEAD_SECONDS + REFERENCE_SECONDS * scale
+
+
+def to_nearest_multiple_of_16(value: float) -> int:
+    """
+    Round a width/height to the nearest multiple of 16 (at least 16), like the worker does
+    
+    Args:
+        value: Requested width or height
+    
+    Returns:
+        Adjusted value
+    """
+    return max(16, int(round(float(value) / 16.0) * 16))
+
+
+def prepare_image(
+    image_path: str,
+    width: int,
+    height: int,
+    image_format: str = UPLOAD_FORMAT,
+    quality: int = UPLOAD_JPEG_QUALITY
+) -> Tuple[bytes, Dict[str, Any]]:
+    """
+    Shrink an image to the frame the worker will actually use
+    
+    The worker center-crops the image to the output aspect ratio and resizes it
+    with lanczos to the 16-aligned output size (ImageResizeKJv2, node "171").
+    Doing the same here means only those pixels are uploaded, and the worker's
+    resize becomes a no-op. Images that are not larger than the output, that
+    Pillow cannot read, or that would not get smaller are sent unchanged.
+    
+    Args:
+        image_path: Image file path
+        width: Output width
+        height: Output height
+        image_format: Re-encoding format ("jpeg" or "png")
+        quality: JPEG quality
+    
+    Returns:
+        (image bytes to upload, {"image_bytes", "upload_bytes", "resized"})
+    """
+    with open(image_path, 'rb') as f:
+        original = f.read()
+    info = {"image_bytes": len(original), "upload_bytes": len(original), "resized": False}
+    if Image is None:
+        return original, info
+    
+    target = (to_nearest_multiple_of_16(width), to_nearest_multiple_of_16(height))
+    try:
+        image = Image.open(io.BytesIO(original))
+        # LoadImage applies the EXIF orientation before resizing
+        image = ImageOps.exif_transpose(image)
+    except (OSError, ValueError, SyntaxError):
+        return original, info
+    if image.width <= target[0] or image.height <= target[1]:
+        return original, info
+    
+    image = ImageOps.fit(image.convert("RGB"), target, method=Image.LANCZOS, centering=(0.5, 0.5))
+    buffer = io.BytesIO()
+    if image_format == "png":
+        image.save(buffer, format="PNG")
+    else:
+        image.save(buffer, format="JPEG", quality=quality)
+    if buffer.tell() >= len(original):
+        return original, info
+    info.update(upload_bytes=buffer.tell(), resized=True)
+    return buffer.getvalue(), info
+
+
+def redact_input(input_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Copy of API input data that is safe and short enough to log
+    
+    Base64 payloads are replaced by their length and URL query strings (which
+    often carry signatures) are dropped.
+    
+    Args:
+        input_data: API input data
+    
+    Returns:
+        Redacted copy
+    """
+    redacted = {}
+    for key, value in input_data.items():
+        if key.endswith("_base64") and isinstance(value, str):
+            redacted[key] = f"<{len(value)} base64 chars>"
+        elif key.endswith("_url") and isinstance(value, str) and urlsplit(value).query:
+            redacted[key] = urlsplit(value)._replace(query="<redacted>").geturl()
+        else:
+            redacted[key] = value
+    return redacted
+
+
+def request_fingerprint(input_data: Dict[str, Any]) -> str:
+    """
+    Fingerprint of a generation request
+    
+    The workflow is deterministic for a fixed seed and inputs, so two requests
+    with the same fingerprint render the same video. The image is hashed by its
+    decoded bytes and keys that only affect delivery (output_mode) are ignored.
+    
+    Args:
+        input_data: API input data (see build_input_data)
+    
+    Returns:
+        Hex SHA-256 fingerprint
+    """
+    canonical = {k: v for k, v in input_data.items() if k not in FINGERPRINT_IGNORED_KEYS}
+    if canonical.get("image_base64"):
+        canonical["image_base64"] = hashlib.sha256(base64.b64decode(canonical["image_base64"])).hexdigest()
+    encoded = json.dumps(canonical, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def request_not_sent(error: requests.exceptions.RequestException) -> bool:
+    """
+    Whether a failed request never reached the server, so sending it again cannot duplicate it
+    
+    Connection timeouts and refused connections fail before the request is
+    written. Read timeouts and dropped connections are ambiguous: the server
+    may already have queued the job.
+    
+    Args:
+        error: Exception raised by requests
+    
+    Returns:
+        True if the request was certainly not sent
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+        return isinstance(getattr(error.args[0], "reason", None), NewConnectionError)
+    return False
+
+
+def submit_backoff(fingerprint: str, attempt: int) -> float:
+    """
+    Delay before resubmitting a request
+    
+    Exponential backoff with jitter derived from the fingerprint, so retries of
+    different requests spread out while retries of one request stay reproducible.
+    
+    Args:
+        fingerprint: Request fingerprint
+        attempt: Failed attempt number (0 = first attempt)
+    
+    Returns:
+        Delay in seconds
+    """
+    jitter = 0.5 + int(fingerprint[:8], 16) / 0xffffffff
+    return min(SUBMIT_BACKOFF_MAX, SUBMIT_BACKOFF_BASE * (2 ** attempt) * jitter)
+
+
+def lora_set_key(lora_pairs: Optional[List[Dict[str, Any]]]) -> str:
+    """
+    Canonical key of a LoRA configuration
+    
+    The worker fills the HIGH and LOW LoRA slots in sorted order, so pairs given
+    in any order produce the same workflow and the same key. Jobs with the same
+    key reuse the LoRA weights the previous job applied.
+    
+    Args:
+        lora_pairs: LoRA settings list (only the first MAX_LORA_PAIRS are used)
+    
+    Returns:
+        JSON string of {"high": [[name, weight], ...], "low": [...]}
+    """
+    pairs = (lora_pairs or [])[:MAX_LORA_PAIRS]
+    loras = {
+        side: sorted([pair[side], float(pair.get(f"{side}_weight", 1.0))] for pair in pairs if pair.get(side))
+        for side in ("high", "low")
+    }
+    return json.dumps(loras, sort_keys=True, separators=(",", ":"))
+
+
+def count_lora_switches(keys: Sequence[str]) -> int:
+    """
+    Number of times consecutive jobs change LoRA configuration
+    
+    Args:
+        keys: lora_set_key of each job in run order
+    
+    Returns:
+        Number of adjacent pairs with different keys
+    """
+    return sum(1 for previous, current in zip(keys, keys[1:]) if previous != current)
+
+
+def order_by_lora_set(items: Sequence[str], keys: Dict[str, str]) -> List[str]:
+    """
+    Group items by LoRA configuration
+    
+    Jobs without LoRAs go first (a warmed-up worker has no extra LoRAs applied),
+    then each configuration in order of first appearance. Items keep their
+    relative order within a group.
+    
+    Args:
+        items: Items (e.g. image filenames) in their original order
+        keys: lora_set_key of every item
+    
+    Returns:
+        Reordered items
+    """
+    no_lora = lora_set_key(None)
+    first_seen: Dict[str, int] = {}
+    for item in items:
+        first_seen.setdefault(keys[item], len(first_seen))
+    return sorted(items, key=lambda item: (keys[item] != no_lora, first_seen[keys[item]]))
+
+
+class ResultJournal:
+    """
+    Local journal of submitted and completed jobs, keyed by request fingerprint
+    
+    Every state change is appended to a JSONL file ({"fingerprint", "status",
+    "job_id", "video", "filename", "output_file", "time"}; later lines update
+    earlier ones) and completed videos are copied into video_dir, so an
+    identical request is answered from disk without a GPU run and a job
+    submitted by an earlier run can be picked up again instead of resubmitted.
+    """
+    
+    def __init__(self, path: str = "generate_video_journal.jsonl", video_dir: Optional[str] = None, cache_videos: bool = True):
+        """
+        Args:
+            path: Journal file (JSONL, appended to)
+            video_dir: Folder for cached videos (default: "<journal name>_videos" next to the journal)
+            cache_videos: Copy completed videos into video_dir; without it only saved
+                output files (batch runs) are reused
+        """
+        self.path = path
+        self.video_dir = video_dir or f"{os.path.splitext(path)[0]}_videos"
+        self.cache_videos = cache_videos
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Partially written last line from an interrupted run
+                        continue
+                    self.entries[record["fingerprint"]] = {**self.entries.get(record["fingerprint"], {}), **record}
+        logger.info(f"Result journal: {path} ({len(self.entries)} requests)")
+    
+    def get(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """
+        Latest journal record for a fingerprint
+        
+        Args:
+            fingerprint: Request fingerprint
+        
+        Returns:
+            Record dictionary or None
+        """
+        with self._lock:
+            return self.entries.get(fingerprint)
+    
+    def record(self, fingerprint: str, status: str, **fields: Any) -> Dict[str, Any]:
+        """
+        Append a state change for a fingerprint
+        
+        Fields not given keep their previous value.
+        
+        Args:
+            fingerprint: Request fingerprint
+            status: "SUBMITTED", "COMPLETED", "UNCONFIRMED" (submission outcome unknown) or a failure status
+            **fields: Extra fields (job_id, video, filename, output_file)
+        
+        Returns:
+            The merged record
+        """
+        record = {"fingerprint": fingerprint, "status": status, "time": round(time.time(), 3), **fields}
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.entries[fingerprint] = {**self.entries.get(fingerprint, {}), **record}
+            return dict(self.entries[fingerprint])
+    
+    def video_path(self, fingerprint: str) -> str:
+        """
+        Path the cached video for a fingerprint is stored at
+        
+        Args:
+            fingerprint: Request fingerprint
+        
+        Returns:
+            File path inside video_dir
+        """
+        return os.path.join(self.video_dir, f"{fingerprint}.mp4")
+    
+    def cached_video(self, fingerprint: str) -> Optional[str]:
+        """
+        Cached video of a completed request
+        
+        Args:
+            fingerprint: Request fingerprint
+        
+        Returns:
+            File path (the cached copy, else the saved output file) or None
+            (not completed, or the files were removed)
+        """
+        record = self.get(fingerprint)
+        if not record or record["status"] != "COMPLETED":
+            return None
+        for key in ("video", "output_file"):
+            if record.get(key) and os.path.exists(record[key]):
+                return record[key]
+        return None
+
+
+def _stage_stats(values: List[float]) -> Dict[str, float]:
+    ordered = sorted(values)
+    p95_index = max(0, min(len(ordered) - 1, int(round(0.95 * len(ordered) + 0.5)) - 1))
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 3),
+        "p95": round(ordered[p95_index], 3),
+        "max": round(ordered[-1], 3)
+    }
+
+
+def summarize_timings(records: List[Dict[str, Any]]) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """
+    Aggregate per-job timing blocks of a batch into per-stage statistics
+    
+    Client stages come from each record's "timing" dictionary, handler stages
+    and per-node durations from the "timings" block the worker returns, and
+    payload sizes from its "sizes" block.
+    
+    Args:
+        records: Batch result entries (the "results" list of batch_process_images)
+    
+    Returns:
+        {"client": {...}, "handler": {...}, "nodes": {...}, "sizes": {...}} mapping
+        each stage to count/mean/p95/max
+    """
+    groups: Dict[str, Dict[str, List[float]]] = {"client": {}, "handler": {}, "nodes": {}, "sizes": {}}
+    
+    def add(group: str, name: str, value: Any) -> None:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            groups[group].setdefault(name, []).append(value)
+    
+    for record in records:
+        timing = record.get("timing") or {}
+        for name, value in timing.items():
+            add("client", name, value)
+        for name, value in (timing.get("handler") or {}).items():
+            add("handler", name, value)
+        for node_id, node in ((timing.get("handler") or {}).get("nodes") or {}).items():
+            add("nodes", f"{node_id} {node.get('class_type')}", node.get("seconds"))
+        for name, value in (timing.get("sizes") or {}).items():
+            add("sizes", name, value)
+    
+    return {
+        group: {name: _stage_stats(values) for name, values in stages.items()}
+        for group, stages in groups.items()
+    }
+
+
+def format_timing_summary(summary: Dict[str, Dict[str, Dict[str, float]]]) -> str:
+    """
+    Render summarize_timings output as a text table
+    
+    Args:
+        summary: Result of summarize_timings
+    
+    Returns:
+        Multi-line report (slowest stages first within each group)
+    """
+    lines = [f"{'stage':<40} {'count':>6} {'mean':>12} {'p95':>12}"]
+    for group, stages in summary.items():
+        ranked = sorted(stages.items(), key=lambda item: item[1]["mean"], reverse=True)
+        for name, stats in ranked:
+            lines.append(f"{group + '.' + name:<40} {stats['count']:>6} {stats['mean']:>12} {stats['p95']:>12}")
+    return "\n".join(lines)
+
+
+class WebhookReceiver:
+    """Local HTTP server that receives RunPod job completion webhooks"""
+    
+    def __init__(self, host: str = "0.0.0.0", port: int = 0, public_url: Optional[str] = None):
+        """
+        Initialize webhook receiver
+        
+        Args:
+            host: Interface to listen on
+            port: Port to listen on (0 = pick a free port)
+            public_url: URL the endpoint should call (defaults to http://<host>:<port>/webhook)
+        """
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self._condition = threading.Condition()
+        receiver = self
+        
+        class _Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+            
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                try:
+                    receiver._deliver(json.loads(body))
+                    self.send_response(200)
+                except ValueError:
+                    self.send_response(400)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+        
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self._public_url = public_url
+        self._thread = None
+    
+    @property
+    def url(self) -> str:
+        """Webhook URL passed to RunPod with each job"""
+        if self._public_url:
+            return self._public_url
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/webhook"
+    
+    def start(self) -> "WebhookReceiver":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f"Webhook receiver listening: {self.url}")
+        return self
+    
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+    
+    def _deliver(self, data: Dict[str, Any]) -> None:
+        with self._condition:
+            self._results[data.get('id')] = data
+            self._condition.notify_all()
+    
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Wait for the webhook of a job
+        
+        Args:
+            job_id: Job ID
+            timeout: Maximum wait time (seconds)
+        
+        Returns:
+            Webhook payload (same shape as a status response) or None on timeout
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: job_id in self._results, timeout=timeout)
+            return self._results.pop(job_id, None)
+
+
+class RunPodEndpoint:
+    """
+    One endpoint of a GenerateVideoClient endpoint pool
+    
+    Keeps the endpoint's last /health snapshot, the jobs this client has in
+    flight on it, how fast it runs jobs relative to estimate_job_duration and
+    its consecutive request errors. After ENDPOINT_MAX_ERRORS errors in a row
+    it is left out of scheduling for ENDPOINT_COOLDOWN seconds.
+    """
+    
+    def __init__(self, endpoint: str, api_base_url: str = RUNPOD_API_BASE_URL):
+        """
+        Args:
+            endpoint: Endpoint ID, or a full endpoint URL (e.g. a local stand-in)
+            api_base_url: RunPod API base URL used with endpoint IDs
+        """
+        self.name = endpoint
+        if endpoint.startswith(("http://", "https://")):
+            self.base_url = endpoint.rstrip("/")
+        else:
+            self.base_url = f"{api_base_url}/{endpoint}"
+        self.run_url = f"{self.base_url}/run"
+        self.runsync_url = f"{self.base_url}/runsync"
+        self.status_url = f"{self.base_url}/status"
+        self.cancel_url = f"{self.base_url}/cancel"
+        self.health_url = f"{self.base_url}/health"
+        
+        self.health: Optional[Dict[str, Any]] = None
+        self.health_time = 0.0
+        self.submitted_since_health = 0
+        self.in_flight = 0
+        self.submitted = 0
+        self.speed = 1.0
+        self.errors = 0
+        self.down_until = 0.0
+    
+    @property
+    def available(self) -> bool:
+        """Whether the endpoint is out of its failure cooldown"""
+        return time.time() >= self.down_until
+    
+    def record_success(self) -> None:
+        self.errors = 0
+    
+    def record_error(self) -> None:
+        self.errors += 1
+        if self.errors >= ENDPOINT_MAX_ERRORS:
+            self.errors = 0
+            self.down_until = time.time() + ENDPOINT_COOLDOWN
+            logger.warning(f"⚠️ Endpoint {self.name} failed {ENDPOINT_MAX_ERRORS} times in a row, "
+                           f"skipping it for {ENDPOINT_COOLDOWN:.0f}s")
+    
+    def update_health(self, health: Dict[str, Any]) -> None:
+        self.health = health
+        self.health_time = time.time()
+        self.submitted_since_health = 0
+    
+    def record_finish(self, expected_duration: Optional[float], execution_ms: Optional[float]) -> None:
+        """
+        Account for a finished job and update the endpoint's speed factor
+        
+        Args:
+            expected_duration: estimate_job_duration of the job (seconds, None if unknown)
+            execution_ms: executionTime RunPod reported (ms, None if not completed)
+        """
+        self.in_flight = max(0, self.in_flight - 1)
+        if expected_duration and execution_ms:
+            ratio = execution_ms / 1000 / expected_duration
+            self.speed += ENDPOINT_SPEED_SMOOTHING * (ratio - self.speed)
+    
+    def expected_completion(self, expected_duration: float) -> float:
+        """
+        Expected seconds until a new job of expected_duration would finish here
+        
+        Jobs ahead of it (queued and running according to /health, plus this
+        client's submissions since) are spread over the active workers; with no
+        active worker a cold start is added. Without any health data only this
+        client's in-flight jobs are counted.
+        
+        Args:
+            expected_duration: estimate_job_duration of the new job (seconds)
+        
+        Returns:
+            Expected completion time in seconds
+        """
+        if self.health is None:
+            backlog, active = self.in_flight, 0
+        else:
+            jobs = self.health.get("jobs") or {}
+            workers = self.health.get("workers") or {}
+            backlog = jobs.get("inQueue", 0) + jobs.get("inProgress", 0) + self.submitted_since_health
+            active = workers.get("idle", 0) + workers.get("running", 0)
+        start_delay = 0.0 if active else COLD_START_SECONDS
+        return start_delay + (backlog // max(active, 1) + 1) * expected_duration * self.speed
+    
+    def snapshot(self) -> Dict[str, Any]:
+        jobs = (self.health or {}).get("jobs") or {}
+        return {
+            "endpoint": self.name,
+            "submitted": self.submitted,
+            "in_flight": self.in_flight,
+            "in_queue": jobs.get("inQueue"),
+            "in_progress": jobs.get("inProgress"),
+            "speed": round(self.speed, 3),
+            "available": self.available
+        }
+
+
 class GenerateVideoClient:
     def __init__(
         self,
-        runpod_endpoint_id: str,
-        runpod_api_key: str
+        runpod_endpoint_id: Union[str, Sequence[str]],
+        runpod_api_key: str,
+        completion_mode: str = "adaptive",
+        webhook_receiver: Optional[WebhookReceiver] = None,
+        api_base_url: str = RUNPOD_API_BASE_URL,
+        journal: Optional[ResultJournal] = None,
+        submit_retries: int = 3,
+        prepare_images: bool = True
     ):
         """
         Initialize Generate Video client
         
         Args:
-            runpod_endpoint_id: RunPod endpoint ID
+            runpod_endpoint_id: RunPod endpoint ID, or a list of endpoint IDs/URLs to balance jobs
+                over (each job goes to the endpoint with the lowest expected completion time)
             runpod_api_key: RunPod API key
+            completion_mode: How to wait for jobs - "fixed" (poll every check_interval),
+                "adaptive" (poll around the expected finish time), "runsync" (wait on /runsync,
+                then adaptive polling) or "webhook" (endpoint pushes completion to webhook_receiver)
+            webhook_receiver: Started WebhookReceiver (required for "webhook" mode)
+            api_base_url: RunPod API base URL
+            journal: ResultJournal for de-duplicating identical requests (None disables it)
+            submit_retries: How many times a failed submission is retried with backoff
+            prepare_images: Crop/resize images to the output size before uploading (needs Pillow)
         """
+        if completion_mode not in COMPLETION_MODES:
+            raise ValueError(f"Unknown completion mode: {completion_mode} (choose from {', '.join(COMPLETION_MODES)})")
+        if completion_mode == "webhook" and webhook_receiver is None:
+            raise ValueError("webhook completion mode requires a webhook_receiver")
+        
+        endpoint_ids = [runpod_endpoint_id] if isinstance(runpod_endpoint_id, str) else list(runpod_endpoint_id)
+        if not endpoint_ids:
+            raise ValueError("at least one endpoint is required")
+        
         self.runpod_endpoint_id = runpod_endpoint_id
         self.runpod_api_key = runpod_api_key
-        self.runpod_api_endpoint = f"https://api.runpod.ai/v2/{runpod_endpoint_id}/run"
-        self.status_url = f"https://api.runpod.ai/v2/{runpod_endpoint_id}/status"
+        self.completion_mode = completion_mode
+        self.webhook_receiver = webhook_receiver
+        self.journal = journal
+        self.submit_retries = submit_retries
+        self.prepare_images = prepare_images
+        
+        # Endpoint pool (a single endpoint is a pool of one); job IDs remember where they were submitted
+        self.endpoints = [RunPodEndpoint(endpoint_id, api_base_url) for endpoint_id in endpoint_ids]
+        self._job_endpoints: Dict[str, RunPodEndpoint] = {}
+        self._in_flight: Dict[str, Optional[float]] = {}
+        self._schedule_lock = threading.Lock()
+        
+        primary = self.endpoints[0]
+        self.runpod_api_endpoint = primary.run_url
+        self.runsync_url = primary.runsync_url
+        self.status_url = primary.status_url
+        self.cancel_url = primary.cancel_url
         
         # Initialize HTTP session
         self.session = requests.Session()
@@ -41,7 +709,7 @@ class GenerateVideoClient:
             'Content-Type': 'application/json'
         })
         
-        logger.info(f"GenerateVideoClient initialized - Endpoint: {runpod_endpoint_id}")
+        logger.info(f"GenerateVideoClient initialized - Endpoint: {', '.join(endpoint_ids)}")
     
     def encode_file_to_base64(self, file_path: str) -> Optional[str]:
         """
@@ -69,87 +737,562 @@ class GenerateVideoClient:
             logger.error(f"❌ File base64 encoding failed: {e}")
             return None
     
-    def submit_job(self, input_data: Dict[str, Any]) -> Optional[str]:
+    def _refresh_health(self, endpoint: RunPodEndpoint) -> None:
+        """
+        Refresh an endpoint's /health snapshot when it is older than HEALTH_CHECK_INTERVAL
+        
+        Args:
+            endpoint: Pool endpoint
+        """
+        if time.time() - endpoint.health_time < HEALTH_CHECK_INTERVAL:
+            return
+        try:
+            response = self.session.get(endpoint.health_url, timeout=10)
+            response.raise_for_status()
+            endpoint.update_health(response.json())
+            endpoint.record_success()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.warning(f"⚠️ Endpoint health check failed ({endpoint.name}): {e}")
+            endpoint.health_time = time.time()
+            endpoint.record_error()
+    
+    def _reserve_endpoint(self, expected_duration: float, exclude: Sequence[RunPodEndpoint] = ()) -> RunPodEndpoint:
+        """
+        Pick the endpoint with the lowest expected completion time and count the job on it
+        
+        Endpoints in failure cooldown or in exclude are skipped unless nothing else is left.
+        
+        Args:
+            expected_duration: estimate_job_duration of the job (seconds)
+            exclude: Endpoints that already failed this submission
+        
+        Returns:
+            Chosen endpoint (release it with _release_endpoint if the submission fails)
+        """
+        with self._schedule_lock:
+            if len(self.endpoints) == 1:
+                endpoint = self.endpoints[0]
+            else:
+                candidates = [e for e in self.endpoints if e not in exclude]
+                candidates = [e for e in candidates if e.available] or candidates or self.endpoints
+                for candidate in candidates:
+                    self._refresh_health(candidate)
+                endpoint = min(candidates, key=lambda e: e.expected_completion(expected_duration))
+                logger.info(f"Endpoint {endpoint.name} chosen (expected completion "
+                            f"{endpoint.expected_completion(expected_duration):.0f}s)")
+            endpoint.in_flight += 1
+            endpoint.submitted_since_health += 1
+            return endpoint
+    
+    def _release_endpoint(self, endpoint: RunPodEndpoint, error: bool = False) -> None:
+        with self._schedule_lock:
+            endpoint.in_flight = max(0, endpoint.in_flight - 1)
+            endpoint.submitted_since_health = max(0, endpoint.submitted_since_health - 1)
+            if error:
+                endpoint.record_error()
+    
+    def _track_job(self, job_id: str, endpoint: RunPodEndpoint, expected_duration: Optional[float]) -> None:
+        with self._schedule_lock:
+            self._job_endpoints[job_id] = endpoint
+            self._in_flight[job_id] = expected_duration
+            endpoint.submitted += 1
+            endpoint.record_success()
+    
+    def _finish_job(self, job_id: str, status_data: Dict[str, Any]) -> None:
+        with self._schedule_lock:
+            if job_id not in self._in_flight:
+                return
+            expected_duration = self._in_flight.pop(job_id)
+            execution_ms = status_data.get('executionTime') if status_data.get('status') == 'COMPLETED' else None
+            self._endpoint_for(job_id).record_finish(expected_duration, execution_ms)
+    
+    def _endpoint_for(self, job_id: str) -> RunPodEndpoint:
+        return self._job_endpoints.get(job_id, self.endpoints[0])
+    
+    def _adopt_job(self, job_id: str, endpoint_name: Optional[str]) -> None:
+        """
+        Route a job submitted by an earlier run (from the journal) to its endpoint
+        
+        Args:
+            job_id: Job ID
+            endpoint_name: Endpoint the job was submitted to
+        """
+        for endpoint in self.endpoints:
+            if endpoint.name == endpoint_name:
+                self._job_endpoints.setdefault(job_id, endpoint)
+    
+    def endpoint_status(self) -> List[Dict[str, Any]]:
+        """
+        Scheduling state of every endpoint in the pool
+        
+        Returns:
+            List of {endpoint, submitted, in_flight, in_queue, in_progress, speed, available}
+        """
+        with self._schedule_lock:
+            return [endpoint.snapshot() for endpoint in self.endpoints]
+    
+    def submit_job(self, input_data: Dict[str, Any], webhook: Optional[str] = None) -> Optional[str]:
+        """
+        Submit job to RunPod
+        
+        With several endpoints the job goes to the one with the lowest expected
+        completion time, and a failed submission fails over to the next one.
+        Once every endpoint failed, 429 and 5xx responses and connections that
+        could not be opened are retried up to submit_retries times with backoff
+        keyed on the request fingerprint; other 4xx responses are not retried.
+        
+        A read timeout or dropped connection is never retried: the endpoint may
+        already have queued the job, and sending it again would run (and bill)
+        the same generation twice. The fingerprint is journaled as UNCONFIRMED
+        instead, so the caller can check the endpoint before resubmitting.
+        
+        Args:
+            input_data: API input data
+            webhook: URL RunPod calls with the job result when it finishes
+        
+        Returns:
+            Job ID or None (on failure)
+        """
+        payload = {"input": input_data}
+        if webhook:
+            payload["webhook"] = webhook
+        fingerprint = request_fingerprint(input_data)
+        expected_duration = estimate_job_duration(
+            input_data.get('width', 480), input_data.get('height', 832),
+            input_data.get('length', 81), input_data.get('steps', 10)
+        ) * max(len(input_data.get('variants') or []), 1)
+        
+        logger.info(f"Submitting job to RunPod (fingerprint {fingerprint[:12]})")
+        logger.info(f"Input data: {json.dumps(redact_input(input_data), ensure_ascii=False)}")
+        
+        attempt = 0
+        tried: List[RunPodEndpoint] = []
+        while True:
+            endpoint = self._reserve_endpoint(expected_duration, exclude=tried)
+            try:
+                response = self.session.post(endpoint.run_url, json=payload, timeout=30)
+                response.raise_for_status()
+                
+                response_data = response.json()
+                job_id = response_data.get('id')
+                
+                if job_id:
+                    self._track_job(job_id, endpoint, expected_duration)
+                    logger.info(f"✅ Job submission successful! Job ID: {job_id} (endpoint {endpoint.name})")
+                    return job_id
+                else:
+                    self._release_endpoint(endpoint)
+                    logger.error(f"❌ Failed to receive Job ID: {response_data}")
+                    return None
+                    
+            except requests.exceptions.RequestException as e:
+                status_code = e.response.status_code if e.response is not None else None
+                if status_code is None and not request_not_sent(e):
+                    # The job may have been queued; a resend could run the same generation twice
+                    self._release_endpoint(endpoint, error=True)
+                    logger.error(f"❌ Job submission to {endpoint.name} unconfirmed, not resending "
+                                 f"(the job may already be queued): {e}")
+                    if self.journal is not None:
+                        self.journal.record(fingerprint, 'UNCONFIRMED', endpoint=endpoint.name)
+                    return None
+                retryable = status_code is None or status_code == 429 or status_code >= 500
+                self._release_endpoint(endpoint, error=retryable)
+                if not retryable:
+                    logger.error(f"❌ Job submission failed: {e}")
+                    return None
+                tried.append(endpoint)
+                if len(tried) < len(self.endpoints):
+                    logger.warning(f"⚠️ Job submission to {endpoint.name} failed ({e}), trying another endpoint")
+                    continue
+                if attempt == self.submit_retries:
+                    logger.error(f"❌ Job submission failed: {e}")
+                    return None
+                delay = submit_backoff(fingerprint, attempt)
+                logger.warning(f"⚠️ Job submission failed ({e}), retrying in {delay:.1f}s ({attempt + 1}/{self.submit_retries})")
+                time.sleep(delay)
+                attempt += 1
+                tried = []
+    
+    def _cached_result(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """
+        Result of an identical request that already completed, from the journal
+        
+        Args:
+            fingerprint: Request fingerprint
+        
+        Returns:
+            Job result dictionary pointing at the cached video, or None
+        """
+        if self.journal is None:
+            return None
+        video = self.journal.cached_video(fingerprint)
+        if not video:
+            return None
+        job_id = self.journal.get(fingerprint).get('job_id')
+        logger.info(f"♻️ Identical request already rendered, reusing {video} (Job ID: {job_id})")
+        return {
+            'status': 'COMPLETED',
+            'output': {'video_url': f"file://{os.path.abspath(video)}"},
+            'job_id': job_id,
+            'cached': True
+        }
+    
+    def _submit_once(self, input_data: Dict[str, Any], fingerprint: str, webhook: Optional[str] = None) -> Optional[str]:
+        """
+        Submit a job unless the journal holds a live or finished submission of the same request
+        
+        Args:
+            input_data: API input data
+            fingerprint: Request fingerprint
+            webhook: URL RunPod calls with the job result when it finishes
+        
+        Returns:
+            Job ID or None (on failure)
+        """
+        record = self.journal.get(fingerprint) if self.journal is not None else None
+        if record and record['status'] in ('SUBMITTED', 'COMPLETED') and record.get('job_id'):
+            self._adopt_job(record['job_id'], record.get('endpoint'))
+            try:
+                status = self.get_job_status(record['job_id']).get('status')
+            except requests.exceptions.RequestException:
+                status = None
+            if status in ('IN_QUEUE', 'IN_PROGRESS', 'COMPLETED'):
+                logger.info(f"♻️ Identical request already submitted, resuming it (Job ID: {record['job_id']}, {status})")
+                return record['job_id']
+        if record and record['status'] == 'UNCONFIRMED':
+            logger.warning(f"⚠️ An earlier submission of this request to {record.get('endpoint')} was not confirmed "
+                           f"and may still run; submitting it again")
+        
+        job_id = self.submit_job(input_data, webhook=webhook)
+        if job_id and self.journal is not None:
+            self.journal.record(fingerprint, 'SUBMITTED', job_id=job_id, endpoint=self._endpoint_for(job_id).name)
+        return job_id
+    
+    def _journal_result(self, fingerprint: str, result: Dict[str, Any]) -> None:
+        """
+        Record a finished job in the journal, caching its video when it completed
+        
+        Args:
+            fingerprint: Request fingerprint
+            result: Job result dictionary
+        """
+        if self.journal is None or result.get('cached') or not result.get('job_id'):
+            return
+        status = result.get('status')
+        if status == 'COMPLETED':
+            fields = {}
+            output = result.get('output') or {}
+            if self.journal.cache_videos and (output.get('video') or output.get('video_url')):
+                video = self.journal.video_path(fingerprint)
+                try:
+                    if self._save_video_output(output, video):
+                        fields['video'] = video
+                except (OSError, ValueError, requests.exceptions.RequestException) as e:
+                    logger.warning(f"⚠️ Caching the video in the journal failed: {e}")
+            self.journal.record(fingerprint, status, job_id=result['job_id'], **fields)
+        elif status == 'TIMEOUT' and not result.get('cancelled'):
+            # Still running on the endpoint; keep the submission so a retry resumes it
+            return
+        else:
+            self.journal.record(fingerprint, status or 'UNKNOWN', job_id=result['job_id'])
+    
+    def get_job_status(self, job_id: str) -> Dict[str, Any]:
+        """
+        Fetch the raw status of a job (single request)
+        
+        Args:
+            job_id: Job ID
+        
+        Returns:
+            Status response dictionary
+        
+        Raises:
+            requests.exceptions.RequestException: On HTTP errors
+        """
+        endpoint = self._endpoint_for(job_id)
+        try:
+            response = self.session.get(f"{endpoint.status_url}/{job_id}", timeout=30)
+            response.raise_for_status()
+        except requests.exceptions.RequestException:
+            endpoint.record_error()
+            raise
+        endpoint.record_success()
+        return response.json()
+    
+    def cancel_job(self, job_id: str) -> bool:
+        """
+        Cancel a queued or running job so it stops occupying a worker
+        
+        Args:
+            job_id: Job ID
+        
+        Returns:
+            Whether the cancel request was accepted
+        """
+        try:
+            response = self.session.post(f"{self._endpoint_for(job_id).cancel_url}/{job_id}", timeout=30)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            logger.error(f"❌ Job cancel failed (Job ID: {job_id}): {e}")
+            return False
+        self._finish_job(job_id, {})
+        logger.info(f"🛑 Job cancelled (Job ID: {job_id}, status: {response.json().get('status')})")
+        return True
+    
+    def _to_job_result(self, job_id: str, status_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Convert a status response into a job result dictionary
+        
+        Args:
+            job_id: Job ID
+            status_data: Status response dictionary
+        
+        Returns:
+            Job result dictionary, or None if the job is still queued/running
+        """
+        status = status_data.get('status')
+        if status in ('COMPLETED', 'FAILED', 'CANCELLED', 'TIMED_OUT'):
+            self._finish_job(job_id, status_data)
+        
+        if status == 'COMPLETED':
+            logger.info(f"✅ Job completed! (Job ID: {job_id})")
+            return {
+                'status': 'COMPLETED',
+                'output': status_data.get('output'),
+                'job_id': job_id,
+                'delay_time': status_data.get('delayTime'),
+                'execution_time': status_data.get('executionTime')
+            }
+        elif status == 'FAILED':
+            logger.error(f"❌ Job failed. (Job ID: {job_id})")
+            result = {
+                'status': 'FAILED',
+                'error': status_data.get('error', 'Unknown error'),
+                'job_id': job_id
+            }
+            # the handler rejects invalid inputs before queueing them, with one entry per problem
+            output = status_data.get('output')
+            if isinstance(output, dict) and output.get('validation_errors'):
+                result['validation_errors'] = output['validation_errors']
+            return result
+        elif status in ['CANCELLED', 'TIMED_OUT']:
+            logger.error(f"❌ Job {status.lower()}. (Job ID: {job_id})")
+            return {
+                'status': status,
+                'error': status_data.get('error', status),
+                'job_id': job_id
+            }
+        elif status in ['IN_QUEUE', 'IN_PROGRESS']:
+            progress = status_data.get('output')
+            if isinstance(progress, dict) and progress.get('node'):
+                step = f" step {progress['step']}/{progress['max_steps']}" if progress.get('step') else ""
+                if progress.get('segments'):
+                    ready = progress.get('ready_segments') or []
+                    step += f", segment {progress['segment']}/{progress['segments']} ({len(ready)} ready)"
+                    if ready and ready[-1].get('video_url'):
+                        step += f", last ready segment: {ready[-1]['video_url']}"
+                logger.info(
+                    f"🏃 Job in progress... node {progress['node']} ({progress.get('node_type')}){step}, "
+                    f"{progress.get('percent', 0)}% of nodes, {progress.get('elapsed', 0)}s elapsed (Job ID: {job_id})"
+                )
+            else:
+                logger.info(f"🏃 Job in progress... (Status: {status}, Job ID: {job_id})")
+            return None
+        else:
+            logger.warning(f"❓ Unknown status: {status}")
+            return {
+                'status': 'UNKNOWN',
+                'data': status_data,
+                'job_id': job_id
+            }
+    
+    def _next_poll_interval(self, status_data: Dict[str, Any], check_interval: float) -> float:
+        """
+        Choose the next status check interval from the job's progress update
+        
+        When the worker reports an estimate for the running node, the next check is
+        scheduled for when that node should finish (never later than check_interval).
+        
+        Args:
+            status_data: Status response dictionary
+            check_interval: Default status check interval (seconds)
+        
+        Returns:
+            Seconds to wait before the next status check
+        """
+        progress = status_data.get('output')
+        if isinstance(progress, dict) and progress.get('node_eta') is not None:
+            return max(1.0, min(float(progress['node_eta']), check_interval))
+        return check_interval
+    
+    def run_sync(self, input_data: Dict[str, Any], timeout: int = 120) -> Dict[str, Any]:
+        """
+        Submit job through /runsync, which holds the request open until the job finishes
+        
+        Short jobs complete within the request. Longer jobs come back still queued or
+        running; the returned dictionary then has no terminal status and carries the job ID.
+        
+        Args:
+            input_data: API input data
+            timeout: HTTP timeout (seconds)
+        
+        Returns:
+            Job result dictionary, {'status': 'IN_PROGRESS', 'job_id': ...} or {'error': ...}
+        """
+        expected_duration = estimate_job_duration(
+            input_data.get('width', 480), input_data.get('height', 832),
+            input_data.get('length', 81), input_data.get('steps', 10)
+        )
+        endpoint = self._reserve_endpoint(expected_duration)
+        try:
+            logger.info(f"Submitting job to RunPod (sync): {endpoint.runsync_url}")
+            response = self.session.post(endpoint.runsync_url, json={"input": input_data}, timeout=timeout)
+            response.raise_for_status()
+            status_data = response.json()
+        except requests.exceptions.RequestException as e:
+            self._release_endpoint(endpoint, error=True)
+            logger.error(f"❌ Job submission failed: {e}")
+            return {"error": "Job submission failed"}
+        
+        job_id = status_data.get('id')
+        if not job_id:
+            self._release_endpoint(endpoint)
+            logger.error(f"❌ Failed to receive Job ID: {status_data}")
+            return {"error": "Job submission failed"}
+        self._track_job(job_id, endpoint, expected_duration)
+        
+        result = self._to_job_result(job_id, status_data)
+        if result is None:
+            logger.info(f"Job still running after runsync, continuing with polling (Job ID: {job_id})")
+            return {'status': 'IN_PROGRESS', 'job_id': job_id}
+        return result
+    
+    def list_models(self, timeout: int = 120) -> Optional[Dict[str, Any]]:
         """
-        Submit job to RunPod
+        List the LoRA and diffusion model files a worker can load
+        
+        Names are the ones accepted in lora_pairs; sizes help estimate LoRA load cost.
         
         Args:
-            input_data: API input data
+            timeout: HTTP timeout (seconds)
         
         Returns:
-            Job ID or None (on failure)
+            {'dirs': {category: [folder, ...]}, 'files': {category: {name: size_bytes}}, 'built_at': ...},
+            or None if the request failed
         """
-        payload = {"input": input_data}
+        result = self.run_sync({"list_models": True}, timeout=timeout)
+        if result.get('status') == 'IN_PROGRESS':
+            result = self.wait_for_completion(result['job_id'])
+        if result.get('status') != 'COMPLETED':
+            logger.error(f"❌ Listing models failed: {result.get('error')}")
+            return None
+        return result['output'].get('models')
+    
+    def _adaptive_interval(
+        self,
+        status_data: Dict[str, Any],
+        running_since: Optional[float],
+        expected_duration: float,
+        overdue_polls: int,
+        check_interval: float,
+        min_interval: float = 1.0,
+        max_interval: float = 60.0
+    ) -> float:
+        """
+        Choose the next status check interval from the expected job duration
         
-        try:
-            logger.info(f"Submitting job to RunPod: {self.runpod_api_endpoint}")
-            logger.info(f"Input data: {json.dumps(input_data, indent=2, ensure_ascii=False)}")
-            
-            response = self.session.post(self.runpod_api_endpoint, json=payload, timeout=30)
-            response.raise_for_status()
-            
-            response_data = response.json()
-            job_id = response_data.get('id')
-            
-            if job_id:
-                logger.info(f"✅ Job submission successful! Job ID: {job_id}")
-                return job_id
+        While the job is expected to be running, the wait halves the remaining
+        expected time, so checks get denser as the finish time approaches. Once the
+        job runs past the estimate, the interval backs off exponentially from
+        min_interval. A node_eta progress hint caps the wait.
+        
+        Args:
+            status_data: Status response dictionary
+            running_since: Time the job was first seen IN_PROGRESS (None while queued)
+            expected_duration: Expected execution time (seconds)
+            overdue_polls: Number of checks made after the expected finish time
+            check_interval: Interval used while the job is queued (seconds)
+            min_interval: Shortest interval (seconds)
+            max_interval: Longest interval (seconds)
+        
+        Returns:
+            Seconds to wait before the next status check
+        """
+        if running_since is None:
+            interval = check_interval
+        else:
+            remaining = expected_duration - (time.time() - running_since)
+            if remaining > 0:
+                interval = remaining / 2
             else:
-                logger.error(f"❌ Failed to receive Job ID: {response_data}")
-                return None
-                
-        except requests.exceptions.RequestException as e:
-            logger.error(f"❌ Job submission failed: {e}")
-            return None
+                interval = min_interval * (2 ** overdue_polls)
+        progress = status_data.get('output')
+        if isinstance(progress, dict) and progress.get('node_eta') is not None:
+            interval = min(interval, float(progress['node_eta']))
+        return max(min_interval, min(interval, max_interval))
     
-    def wait_for_completion(self, job_id: str, check_interval: int = 10, max_wait_time: int = 1800) -> Dict[str, Any]:
+    def wait_for_completion(
+        self,
+        job_id: str,
+        check_interval: int = 10,
+        max_wait_time: int = 1800,
+        expected_duration: Optional[float] = None,
+        mode: Optional[str] = None,
+        cancel_on_timeout: bool = True
+    ) -> Dict[str, Any]:
         """
         Wait for job completion
         
         Args:
             job_id: Job ID
-            check_interval: Status check interval (seconds)
+            check_interval: Status check interval (seconds); in adaptive mode only used while queued
             max_wait_time: Maximum wait time (seconds)
+            expected_duration: Expected execution time for adaptive polling (seconds)
+            mode: Completion mode override ("fixed", "adaptive" or "webhook"; defaults to the client mode)
+            cancel_on_timeout: Cancel the job when max_wait_time is reached so it frees its worker
         
         Returns:
             Job result dictionary
         """
+        mode = mode or self.completion_mode
+        if mode == "runsync":
+            mode = "adaptive"
+        if expected_duration is None:
+            expected_duration = estimate_job_duration()
+        
         start_time = time.time()
+        running_since = None
+        overdue_polls = 0
         
         while time.time() - start_time < max_wait_time:
+            if mode == "webhook":
+                # Wait for the push; fall back to a status check now and then in case a webhook is lost
+                remaining = max_wait_time - (time.time() - start_time)
+                webhook_data = self.webhook_receiver.wait(job_id, timeout=min(remaining, max(check_interval, 60)))
+                if webhook_data is not None:
+                    result = self._to_job_result(job_id, webhook_data)
+                    if result is not None:
+                        return result
+            
             try:
                 logger.info(f"⏱️ Checking job status... (Job ID: {job_id})")
                 
-                response = self.session.get(f"{self.status_url}/{job_id}", timeout=30)
-                response.raise_for_status()
-                
-                status_data = response.json()
-                status = status_data.get('status')
+                status_data = self.get_job_status(job_id)
+                result = self._to_job_result(job_id, status_data)
+                if result is not None:
+                    return result
                 
-                if status == 'COMPLETED':
-                    logger.info("✅ Job completed!")
-                    return {
-                        'status': 'COMPLETED',
-                        'output': status_data.get('output'),
-                        'job_id': job_id
-                    }
-                elif status == 'FAILED':
-                    logger.error("❌ Job failed.")
-                    return {
-                        'status': 'FAILED',
-                        'error': status_data.get('error', 'Unknown error'),
-                        'job_id': job_id
-                    }
-                elif status in ['IN_QUEUE', 'IN_PROGRESS']:
-                    logger.info(f"🏃 Job in progress... (Status: {status})")
-                    time.sleep(check_interval)
+                if mode == "adaptive":
+                    if running_since is None and status_data.get('status') == 'IN_PROGRESS':
+                        running_since = time.time()
+                    if running_since is not None and time.time() - running_since >= expected_duration:
+                        overdue_polls += 1
+                    interval = self._adaptive_interval(status_data, running_since, expected_duration, overdue_polls, check_interval)
+                elif mode == "fixed":
+                    interval = self._next_poll_interval(status_data, check_interval)
                 else:
-                    logger.warning(f"❓ Unknown status: {status}")
-                    return {
-                        'status': 'UNKNOWN',
-                        'data': status_data,
-                        'job_id': job_id
-                    }
+                    continue
+                time.sleep(min(interval, max(0, max_wait_time - (time.time() - start_time))))
                     
             except requests.exceptions.RequestException as e:
                 logger.error(f"❌ Status check error: {e}")
@@ -158,9 +1301,46 @@ class GenerateVideoClient:
         logger.error(f"❌ Job wait timeout ({max_wait_time} seconds)")
         return {
             'status': 'TIMEOUT',
-            'job_id': job_id
+            'job_id': job_id,
+            'cancelled': self.cancel_job(job_id) if cancel_on_timeout else False
         }
     
+    def download_file(self, url: str, output_path: str, chunk_size: int = 1024 * 1024) -> None:
+        """
+        Download a file in chunks without holding it in memory
+        
+        The file is written to a temporary path first and renamed when complete,
+        so an interrupted download never leaves a truncated output behind.
+        
+        Args:
+            url: File URL (http(s) or file://)
+            output_path: File path to save
+            chunk_size: Download chunk size in bytes
+        
+        Raises:
+            requests.exceptions.RequestException: On HTTP errors
+        """
+        tmp_path = f"{output_path}.part"
+        try:
+            if url.startswith('file://'):
+                with open(url[len('file://'):], 'rb') as src, open(tmp_path, 'wb') as dst:
+                    while True:
+                        chunk = src.read(chunk_size)
+                        if not chunk:
+                            break
+                        dst.write(chunk)
+            else:
+                # Plain requests (not self.session) so the RunPod API key is never sent to the storage host
+                with requests.get(url, stream=True, timeout=(10, 300)) as response:
+                    response.raise_for_status()
+                    with open(tmp_path, 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=chunk_size):
+                            f.write(chunk)
+            os.replace(tmp_path, output_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    
     def save_video_result(self, result: Dict[str, Any], output_path: str) -> bool:
         """
         Save video file from job result
@@ -177,31 +1357,74 @@ class GenerateVideoClient:
                 logger.error(f"Job not completed: {result.get('status')}")
                 return False
             
-            output = result.get('output', {})
-            video_b64 = output.get('video')
-            
-            if not video_b64:
-                logger.error("Video data not found")
-                return False
-            
-            # Create directory
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            return self._save_video_output(result.get('output', {}), output_path)
             
+        except Exception as e:
+            logger.error(f"❌ Video save failed: {e}")
+            return False
+    
+    def _save_video_output(self, output: Dict[str, Any], output_path: str) -> bool:
+        """
+        Write one video entry ("video" base64 or "video_url") to disk
+        
+        Args:
+            output: Output dictionary containing "video" or "video_url"
+            output_path: File path to save
+        
+        Returns:
+            Save success status
+        """
+        video_url = output.get('video_url')
+        video_b64 = output.get('video')
+        
+        if not video_url and not video_b64:
+            logger.error(f"Video data not found: {output.get('error', '')}")
+            return False
+        
+        # Create directory
+        os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+        
+        if video_url:
+            # Stream the uploaded video to disk
+            self.download_file(video_url, output_path)
+        else:
             # Decode base64 and save video
             decoded_video = base64.b64decode(video_b64)
             
             with open(output_path, 'wb') as f:
                 f.write(decoded_video)
-            
-            file_size = os.path.getsize(output_path)
-            logger.info(f"✅ Video saved successfully: {output_path} ({file_size / (1024*1024):.1f}MB)")
-            return True
-            
-        except Exception as e:
-            logger.error(f"❌ Video save failed: {e}")
-            return False
+        
+        file_size = os.path.getsize(output_path)
+        logger.info(f"✅ Video saved successfully: {output_path} ({file_size / (1024*1024):.1f}MB)")
+        return True
     
-    def create_video_from_image(
+    def save_video_variants(self, result: Dict[str, Any], output_folder_path: str, base_filename: str = "result") -> List[Optional[str]]:
+        """
+        Save every video of a variants job
+        
+        Args:
+            result: Job result dictionary (output contains "videos")
+            output_folder_path: Folder path to save videos
+            base_filename: File name prefix; files are named <base_filename>_<index>.mp4
+        
+        Returns:
+            Saved file path per variant (None where the variant failed)
+        """
+        if result.get('status') != 'COMPLETED':
+            logger.error(f"Job not completed: {result.get('status')}")
+            return []
+        
+        saved = []
+        for video in result.get('output', {}).get('videos', []):
+            output_path = os.path.join(output_folder_path, f"{base_filename}_{video.get('index', len(saved))}.mp4")
+            try:
+                saved.append(output_path if self._save_video_output(video, output_path) else None)
+            except Exception as e:
+                logger.error(f"❌ Video save failed: {e}")
+                saved.append(None)
+        return saved
+    
+    def build_input_data(
         self,
         image_path: str,
         prompt: str = "running man, grab the gun",
@@ -213,42 +1436,50 @@ class GenerateVideoClient:
         seed: int = 42,
         cfg: float = 2.0,
         context_overlap: int = 48,
-        lora_pairs: Optional[List[Dict[str, Any]]] = None
-    ) -> Dict[str, Any]:
+        lora_pairs: Optional[List[Dict[str, Any]]] = None,
+        output_mode: Optional[str] = None,
+        split_step: Optional[int] = None,
+        cfg_schedule: Optional[Dict[str, Any]] = None,
+        variants: Optional[List[Dict[str, Any]]] = None,
+        segment_length: Optional[int] = None,
+        upload_stats: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
         """
-        Generate video from image
+        Build API input data for a single image
         
         Args:
-            image_path: Image file path
-            prompt: Prompt text
-            negative_prompt: Negative prompt to exclude unwanted elements
-            width: Output width
-            height: Output height
-            length: Number of frames
-            steps: Number of steps
-            seed: Seed value
-            cfg: CFG scale
-            context_overlap: Context overlap
-            lora_pairs: LoRA settings list (max 4)
+            Same as create_video_from_image
+            upload_stats: Dictionary filled with image_bytes, upload_bytes, resized,
+                request_bytes and prepare_cpu_time (client CPU seconds)
         
         Returns:
-            Job result dictionary
+            API input data or None (on image encoding failure)
         """
-        # Check file existence
-        if not os.path.exists(image_path):
-            return {"error": f"Image file does not exist: {image_path}"}
+        cpu_start = time.thread_time()
         
-        # Encode image to base64
-        image_base64 = self.encode_file_to_base64(image_path)
-        if not image_base64:
-            return {"error": "Image base64 encoding failed"}
+        # Encode image to base64 (cropped/resized to the output size first when possible)
+        if self.prepare_images:
+            try:
+                image_bytes, image_info = prepare_image(image_path, width, height)
+            except OSError as e:
+                logger.error(f"❌ File base64 encoding failed: {e}")
+                return None
+            image_base64 = base64.b64encode(image_bytes).decode('utf-8')
+            if image_info["resized"]:
+                logger.info(f"🖼️ Image prepared for upload: {image_path} "
+                            f"({image_info['image_bytes']} -> {image_info['upload_bytes']} bytes)")
+        else:
+            image_base64 = self.encode_file_to_base64(image_path)
+            if not image_base64:
+                return None
+            image_size = os.path.getsize(image_path)
+            image_info = {"image_bytes": image_size, "upload_bytes": image_size, "resized": False}
         
         # Process LoRA settings
         if lora_pairs is None:
             lora_pairs = []
         
         # Support up to 4 LoRAs
-        lora_count = min(len(lora_pairs), 4)
         if len(lora_pairs) > 4:
             logger.warning(f"LoRA count is {len(lora_pairs)}. Only up to 4 LoRAs are supported. Using first 4 only.")
             lora_pairs = lora_pairs[:4]
@@ -271,14 +1502,275 @@ class GenerateVideoClient:
         if negative_prompt:
             input_data["negative_prompt"] = negative_prompt
         
-        # Submit job and wait
-        job_id = self.submit_job(input_data)
+        # Add output_mode if provided ("url" returns an uploaded video URL instead of base64)
+        if output_mode:
+            input_data["output_mode"] = output_mode
+        
+        # Add sampler schedule overrides if provided
+        if split_step is not None:
+            input_data["split_step"] = split_step
+        if cfg_schedule:
+            input_data["cfg_schedule"] = cfg_schedule
+        
+        # Add prompt/seed variants if provided (one job renders all of them)
+        if variants:
+            input_data["variants"] = variants
+        
+        # Add segment length if provided (longer videos are generated in segments and joined)
+        if segment_length is not None:
+            input_data["segment_length"] = segment_length
+        
+        if upload_stats is not None:
+            # Base64 needs no JSON escaping, so the body size follows without serializing the image again
+            body = json.dumps({"input": dict(input_data, image_base64="")})
+            upload_stats.update(
+                image_info,
+                request_bytes=len(body.encode('utf-8')) + len(image_base64),
+                prepare_cpu_time=round(time.thread_time() - cpu_start, 4)
+            )
+        
+        return input_data
+    
+    def create_video_from_image(
+        self,
+        image_path: str,
+        prompt: str = "running man, grab the gun",
+        negative_prompt: Optional[str] = None,
+        width: int = 480,
+        height: int = 832,
+        length: int = 81,
+        steps: int = 10,
+        seed: int = 42,
+        cfg: float = 2.0,
+        context_overlap: int = 48,
+        lora_pairs: Optional[List[Dict[str, Any]]] = None,
+        output_mode: Optional[str] = None,
+        split_step: Optional[int] = None,
+        cfg_schedule: Optional[Dict[str, Any]] = None,
+        variants: Optional[List[Dict[str, Any]]] = None,
+        segment_length: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Generate video from image
+        
+        Args:
+            image_path: Image file path
+            prompt: Prompt text
+            negative_prompt: Negative prompt to exclude unwanted elements
+            width: Output width
+            height: Output height
+            length: Number of frames
+            steps: Number of steps
+            seed: Seed value
+            cfg: CFG scale
+            context_overlap: Context overlap
+            lora_pairs: LoRA settings list (max 4)
+            output_mode: "base64" (default) or "url" (video is uploaded and downloaded by URL)
+            split_step: Step where the HIGH sampler hands over to the LOW sampler (default: keeps the workflow ratio)
+            cfg_schedule: HIGH sampler CFG schedule (start, end, interpolation, start_percent, end_percent)
+            variants: List of {prompt, seed, negative_prompt} overrides rendered from the same image
+                in one job; the output then contains "videos" (see save_video_variants)
+            segment_length: Frames generated per segment; a longer length is generated in segments
+                that continue from each other's last frame and are joined without re-encoding;
+                finished segments are uploaded and their URLs logged while the job runs
+        
+        Returns:
+            Job result dictionary ("upload" holds the upload statistics of build_input_data)
+        """
+        # Check file existence
+        if not os.path.exists(image_path):
+            return {"error": f"Image file does not exist: {image_path}"}
+        
+        upload_stats: Dict[str, Any] = {}
+        input_data = self.build_input_data(
+            image_path=image_path,
+            prompt=prompt,
+            negative_prompt=negative_prompt,
+            width=width,
+            height=height,
+            length=length,
+            steps=steps,
+            seed=seed,
+            cfg=cfg,
+            context_overlap=context_overlap,
+            lora_pairs=lora_pairs,
+            output_mode=output_mode,
+            split_step=split_step,
+            cfg_schedule=cfg_schedule,
+            variants=variants,
+            segment_length=segment_length,
+            upload_stats=upload_stats
+        )
+        if not input_data:
+            return {"error": "Image base64 encoding failed"}
+        
+        expected_duration = estimate_job_duration(width, height, length, steps) * max(len(variants or []), 1)
+        result = self._run_job(input_data, request_fingerprint(input_data), expected_duration)
+        result['upload'] = upload_stats
+        return result
+    
+    def _run_job(self, input_data: Dict[str, Any], fingerprint: str, expected_duration: float) -> Dict[str, Any]:
+        """
+        Run one request to completion, reusing journaled results and submissions
+        
+        Args:
+            input_data: API input data
+            fingerprint: Request fingerprint
+            expected_duration: Expected execution time for adaptive polling (seconds)
+        
+        Returns:
+            Job result dictionary
+        """
+        # The workflow is deterministic, so an identical request can be answered from the journal
+        cached = self._cached_result(fingerprint)
+        if cached:
+            return cached
+        
+        # Short jobs can finish within a single /runsync request (unless an earlier submission can be resumed)
+        record = self.journal.get(fingerprint) if self.journal is not None else None
+        if self.completion_mode == "runsync" and not (record and record['status'] in ('SUBMITTED', 'COMPLETED')):
+            result = self.run_sync(input_data)
+            if result.get('status') == 'IN_PROGRESS':
+                if self.journal is not None:
+                    self.journal.record(fingerprint, 'SUBMITTED', job_id=result['job_id'],
+                                        endpoint=self._endpoint_for(result['job_id']).name)
+                result = self.wait_for_completion(result['job_id'], expected_duration=expected_duration)
+            self._journal_result(fingerprint, result)
+            return result
+        
+        # Submit job (or resume an earlier submission of the same request) and wait
+        webhook = self.webhook_receiver.url if self.completion_mode == "webhook" else None
+        job_id = self._submit_once(input_data, fingerprint, webhook=webhook)
         if not job_id:
             return {"error": "Job submission failed"}
         
-        result = self.wait_for_completion(job_id)
+        result = self.wait_for_completion(job_id, expected_duration=expected_duration)
+        self._journal_result(fingerprint, result)
         return result
     
+    def _batch_output_path(self, output_folder_path: str, filename: str) -> str:
+        """
+        Output video path of a batch image
+        
+        Args:
+            output_folder_path: Folder path to save results
+            filename: Source image filename
+        
+        Returns:
+            "<output_folder_path>/result_<image name>.mp4"
+        """
+        return os.path.join(output_folder_path, f"result_{os.path.splitext(filename)[0]}.mp4")
+    
+    def _saved_output(self, fingerprint: str, output_filename: str) -> Optional[Dict[str, Any]]:
+        """
+        Journal record of a batch output already saved for the same request
+        
+        Args:
+            fingerprint: Request fingerprint
+            output_filename: Output video path
+        
+        Returns:
+            Journal record, or None when the output still has to be produced
+        """
+        record = self.journal.get(fingerprint) if self.journal is not None else None
+        if not record or record.get('output_file') != output_filename or not os.path.exists(output_filename):
+            return None
+        return record
+    
+    def _record_skipped(self, results: Dict[str, Any], filename: str, record: Dict[str, Any]) -> None:
+        """
+        Append a batch image whose output was already saved to the batch summary
+        
+        Args:
+            results: Batch summary dictionary (updated in place)
+            filename: Source image filename
+            record: Journal record from _saved_output
+        """
+        logger.info(f"⏭️ [{filename}] Output already saved, skipping: {record['output_file']}")
+        results["skipped"] += 1
+        results["results"].append({
+            "filename": filename,
+            "status": "skipped",
+            "output_file": record['output_file'],
+            "job_id": record.get('job_id')
+        })
+    
+    def _record_batch_result(
+        self,
+        results: Dict[str, Any],
+        filename: str,
+        result: Dict[str, Any],
+        output_folder_path: str,
+        timing: Dict[str, Any],
+        fingerprint: Optional[str] = None
+    ) -> None:
+        """
+        Save a finished batch job and append it to the batch summary
+        
+        Args:
+            results: Batch summary dictionary (updated in place)
+            filename: Source image filename
+            result: Job result dictionary
+            output_folder_path: Folder path to save results
+            timing: Per-job timing dictionary (save wall/CPU time, client upload sizes and
+                CPU time, the worker's timings/sizes blocks and total are added here)
+            fingerprint: Request fingerprint; the saved output file is journaled under it
+        """
+        output = result.get('output')
+        if isinstance(output, dict):
+            if output.get('timings'):
+                timing["handler"] = output['timings']
+            if output.get('lora_switched') is not None and "lora" in results:
+                results["lora"]["worker_switches" if output['lora_switched'] else "worker_reuses"] += 1
+            if output.get('sizes'):
+                timing["sizes"] = dict(output['sizes'])
+        upload = result.get('upload')
+        if upload:
+            timing["prepare_cpu_time"] = upload['prepare_cpu_time']
+            timing.setdefault("sizes", {}).update(
+                image_bytes=upload['image_bytes'], upload_bytes=upload['upload_bytes'], request_bytes=upload['request_bytes']
+            )
+        
+        if result.get('status') == 'COMPLETED':
+            # Save result file
+            output_filename = self._batch_output_path(output_folder_path, filename)
+            
+            save_start = time.time()
+            save_cpu_start = time.thread_time()
+            saved = self.save_video_result(result, output_filename)
+            timing["save_time"] = round(time.time() - save_start, 3)
+            timing["save_cpu_time"] = round(time.thread_time() - save_cpu_start, 4)
+            
+            if saved:
+                if self.journal is not None and fingerprint:
+                    self.journal.record(fingerprint, 'COMPLETED', job_id=result.get('job_id'),
+                                        filename=filename, output_file=output_filename)
+                logger.info(f"✅ [{filename}] Processing completed")
+                results["successful"] += 1
+                results["results"].append({
+                    "filename": filename,
+                    "status": "success",
+                    "output_file": output_filename,
+                    "job_id": result.get('job_id'),
+                    "timing": timing
+                })
+                return
+            
+            logger.error(f"[{filename}] Result save failed")
+            error = "Result save failed"
+        else:
+            logger.error(f"[{filename}] Job failed: {result.get('error', 'Unknown error')}")
+            error = result.get('error', result.get('status', 'Unknown error'))
+        
+        results["failed"] += 1
+        results["results"].append({
+            "filename": filename,
+            "status": "failed",
+            "error": error,
+            "job_id": result.get('job_id'),
+            "timing": timing
+        })
+    
     def batch_process_images(
         self,
         image_folder_path: str,
@@ -293,11 +1785,32 @@ class GenerateVideoClient:
         seed: int = 42,
         cfg: float = 2.0,
         context_overlap: int = 48,
-        lora_pairs: Optional[List[Dict[str, Any]]] = None
+        lora_pairs: Optional[List[Dict[str, Any]]] = None,
+        output_mode: Optional[str] = None,
+        split_step: Optional[int] = None,
+        cfg_schedule: Optional[Dict[str, Any]] = None,
+        segment_length: Optional[int] = None,
+        max_concurrent_jobs: int = 1,
+        check_interval: int = 10,
+        max_wait_time: int = 1800,
+        resume: bool = False,
+        lora_pairs_by_file: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+        group_by_lora: bool = True
     ) -> Dict[str, Any]:
         """
         Batch process all image files in folder
         
+        Files are processed in name order. When files use different LoRA sets
+        (lora_pairs_by_file), jobs are grouped by LoRA set so consecutive jobs
+        reuse the LoRA weights already applied on the worker instead of
+        re-patching the 14B models; results["lora"] reports the switches the
+        order saved and the switches workers actually made.
+        
+        With resume, every file's fingerprint, job ID, status and output path is
+        journaled (in the client's journal, or batch_journal.jsonl in the output
+        folder), so rerunning an interrupted batch skips saved outputs, resumes
+        polling jobs that were already submitted and only submits the rest.
+        
         Args:
             image_folder_path: Folder path containing image files
             output_folder_path: Folder path to save results
@@ -312,6 +1825,16 @@ class GenerateVideoClient:
             cfg: CFG scale
             context_overlap: Context overlap
             lora_pairs: LoRA settings list
+            output_mode: "base64" (default) or "url"
+            split_step: Step where the HIGH sampler hands over to the LOW sampler
+            cfg_schedule: HIGH sampler CFG schedule
+            segment_length: Frames generated per segment (long-video mode)
+            max_concurrent_jobs: Maximum number of jobs kept in flight (1 = serial)
+            check_interval: Status check interval (seconds)
+            max_wait_time: Maximum wait time per job (seconds)
+            resume: Journal progress so an interrupted batch can be rerun without repeating work
+            lora_pairs_by_file: Per-file LoRA settings lists ({filename: lora_pairs}), overriding lora_pairs
+            group_by_lora: Order jobs by LoRA set (False keeps name order)
         
         Returns:
             Batch processing result dictionary
@@ -324,82 +1847,234 @@ class GenerateVideoClient:
         os.makedirs(output_folder_path, exist_ok=True)
         
         # Get image file list
-        image_files = [
+        image_files = sorted(
             f for f in os.listdir(image_folder_path)
             if f.lower().endswith(valid_extensions)
-        ]
+        )
         
         if not image_files:
             return {"error": f"No image files to process: {image_folder_path}"}
         
-        logger.info(f"Starting batch processing: {len(image_files)} files")
+        # LoRA set of every file; grouping them avoids re-applying LoRAs between jobs
+        file_lora_pairs = {f: (lora_pairs_by_file or {}).get(f, lora_pairs) for f in image_files}
+        lora_keys = {f: lora_set_key(file_lora_pairs[f]) for f in image_files}
+        name_order_switches = count_lora_switches([lora_keys[f] for f in image_files])
+        if group_by_lora:
+            image_files = order_by_lora_set(image_files, lora_keys)
+        lora_switches = count_lora_switches([lora_keys[f] for f in image_files])
+        
+        logger.info(f"Starting batch processing: {len(image_files)} files (max {max_concurrent_jobs} in flight)")
         
         results = {
             "total_files": len(image_files),
             "successful": 0,
             "failed": 0,
-            "results": []
+            "skipped": 0,
+            "results": [],
+            "lora": {
+                "sets": len(set(lora_keys.values())),
+                "switches": lora_switches,
+                "switches_avoided": name_order_switches - lora_switches,
+                "worker_switches": 0,
+                "worker_reuses": 0
+            }
         }
+        logger.info(f"LoRA sets: {results['lora']['sets']}, {lora_switches} switches in run order "
+                    f"({name_order_switches - lora_switches} avoided by grouping)")
         
-        # Process each image file
-        for filename in image_files:
-            logger.info(f"\n==================== Processing started: {filename} ====================")
-            
-            image_path = os.path.join(image_folder_path, filename)
-            
-            # Generate video
-            result = self.create_video_from_image(
-                image_path=image_path,
-                prompt=prompt,
-                negative_prompt=negative_prompt,
-                width=width,
-                height=height,
-                length=length,
-                steps=steps,
-                seed=seed,
-                cfg=cfg,
-                context_overlap=context_overlap,
-                lora_pairs=lora_pairs
-            )
-            
-            if result.get('status') == 'COMPLETED':
-                # Save result file
-                base_filename = os.path.splitext(filename)[0]
-                output_filename = os.path.join(output_folder_path, f"result_{base_filename}.mp4")
-                
-                if self.save_video_result(result, output_filename):
-                    logger.info(f"✅ [{filename}] Processing completed")
-                    results["successful"] += 1
-                    results["results"].append({
-                        "filename": filename,
-                        "status": "success",
-                        "output_file": output_filename,
-                        "job_id": result.get('job_id')
-                    })
-                else:
-                    logger.error(f"[{filename}] Result save failed")
-                    results["failed"] += 1
-                    results["results"].append({
-                        "filename": filename,
-                        "status": "failed",
-                        "error": "Result save failed",
-                        "job_id": result.get('job_id')
-                    })
+        job_params = {
+            "prompt": prompt,
+            "negative_prompt": negative_prompt,
+            "width": width,
+            "height": height,
+            "length": length,
+            "steps": steps,
+            "seed": seed,
+            "cfg": cfg,
+            "context_overlap": context_overlap,
+            "lora_pairs": lora_pairs,
+            "output_mode": output_mode,
+            "split_step": split_step,
+            "cfg_schedule": cfg_schedule,
+            "segment_length": segment_length
+        }
+        
+        client_journal = self.journal
+        if resume and self.journal is None:
+            # Saved outputs double as the cache, so no extra copy of every video is kept
+            self.journal = ResultJournal(os.path.join(output_folder_path, BATCH_JOURNAL_NAME), cache_videos=False)
+        
+        batch_start = time.time()
+        try:
+            if max_concurrent_jobs > 1:
+                self._run_concurrent_batch(
+                    image_files, image_folder_path, output_folder_path, results,
+                    job_params, max_concurrent_jobs, check_interval, max_wait_time, file_lora_pairs
+                )
             else:
-                logger.error(f"[{filename}] Job failed: {result.get('error', 'Unknown error')}")
-                results["failed"] += 1
-                results["results"].append({
-                    "filename": filename,
-                    "status": "failed",
-                    "error": result.get('error', 'Unknown error'),
-                    "job_id": result.get('job_id')
-                })
-            
-            logger.info(f"==================== Processing completed: {filename} ====================")
+                expected_duration = estimate_job_duration(width, height, length, steps)
+                
+                # Process each image file
+                for filename in image_files:
+                    logger.info(f"\n==================== Processing started: {filename} ====================")
+                    
+                    image_path = os.path.join(image_folder_path, filename)
+                    job_start = time.time()
+                    
+                    # Generate video
+                    upload_stats: Dict[str, Any] = {}
+                    input_data = self.build_input_data(
+                        image_path=image_path, upload_stats=upload_stats,
+                        **dict(job_params, lora_pairs=file_lora_pairs[filename])
+                    )
+                    fingerprint = request_fingerprint(input_data) if input_data else None
+                    saved = fingerprint and self._saved_output(fingerprint, self._batch_output_path(output_folder_path, filename))
+                    if saved:
+                        self._record_skipped(results, filename, saved)
+                        continue
+                    if input_data:
+                        result = self._run_job(input_data, fingerprint, expected_duration)
+                        result['upload'] = upload_stats
+                    else:
+                        result = {"error": "Image base64 encoding failed"}
+                    
+                    timing = {
+                        "wait_time": round(time.time() - job_start, 3),
+                        "delay_time_ms": result.get('delay_time'),
+                        "execution_time_ms": result.get('execution_time')
+                    }
+                    self._record_batch_result(results, filename, result, output_folder_path, timing, fingerprint)
+                    timing["total_time"] = round(time.time() - job_start, 3)
+                    
+                    logger.info(f"==================== Processing completed: {filename} ====================")
+        finally:
+            self.journal = client_journal
         
-        logger.info(f"\n🎉 Batch processing completed: {results['successful']}/{results['total_files']} successful")
+        results["elapsed_time"] = round(time.time() - batch_start, 3)
+        results["timing_summary"] = summarize_timings(results["results"])
+        if len(self.endpoints) > 1:
+            results["endpoints"] = self.endpoint_status()
+            logger.info(f"Endpoint pool: {json.dumps(results['endpoints'])}")
+        logger.info(f"⏱️ Batch timing summary (seconds, sizes in bytes):\n{format_timing_summary(results['timing_summary'])}")
+        logger.info(f"\n🎉 Batch processing completed: {results['successful']}/{results['total_files']} successful, "
+                    f"{results['skipped']} skipped ({results['elapsed_time']}s)")
         return results
-
+    
+    def _run_concurrent_batch(
+        self,
+        image_files: List[str],
+        image_folder_path: str,
+        output_folder_path: str,
+        results: Dict[str, Any],
+        job_params: Dict[str, Any],
+        max_concurrent_jobs: int,
+        check_interval: int,
+        max_wait_time: int,
+        file_lora_pairs: Optional[Dict[str, Optional[List[Dict[str, Any]]]]] = None
+    ) -> None:
+        """
+        Run a batch with up to max_concurrent_jobs jobs in flight
+        
+        New jobs are submitted as soon as a slot frees up, all outstanding job IDs
+        are polled together on every tick, and results are saved as they finish.
+        
+        Args:
+            image_files: Image filenames to process
+            image_folder_path: Folder path containing image files
+            output_folder_path: Folder path to save results
+            results: Batch summary dictionary (updated in place)
+            job_params: Generation parameters shared by every job
+            max_concurrent_jobs: Maximum number of jobs kept in flight
+            check_interval: Status check interval (seconds)
+            max_wait_time: Maximum wait time per job (seconds)
+            file_lora_pairs: Per-file LoRA settings lists, overriding job_params["lora_pairs"]
+        """
+        def submit(filename: str) -> Dict[str, Any]:
+            submit_start = time.time()
+            upload_stats: Dict[str, Any] = {}
+            params = dict(job_params, lora_pairs=file_lora_pairs[filename]) if file_lora_pairs else job_params
+            input_data = self.build_input_data(
+                image_path=os.path.join(image_folder_path, filename), upload_stats=upload_stats, **params
+            )
+            fingerprint = request_fingerprint(input_data) if input_data else None
+            saved = fingerprint and self._saved_output(fingerprint, self._batch_output_path(output_folder_path, filename))
+            if saved:
+                return {"filename": filename, "skipped": saved}
+            cached = self._cached_result(fingerprint) if fingerprint else None
+            job_id = self._submit_once(input_data, fingerprint) if input_data and not cached else None
+            return {
+                "filename": filename,
+                "job_id": job_id,
+                "fingerprint": fingerprint,
+                "cached": cached,
+                "skipped": None,
+                "upload": upload_stats,
+                "error": None if job_id or cached else ("Job submission failed" if input_data else "Image base64 encoding failed"),
+                "started_at": submit_start,
+                "submitted_at": time.time()
+            }
+        
+        def poll(job: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+            try:
+                return self._to_job_result(job["job_id"], self.get_job_status(job["job_id"]))
+            except requests.exceptions.RequestException as e:
+                logger.error(f"❌ Status check error ({job['filename']}): {e}")
+                return None
+        
+        def finish(job: Dict[str, Any], result: Dict[str, Any]) -> None:
+            if job.get("upload"):
+                result['upload'] = job["upload"]
+            if job.get("fingerprint"):
+                self._journal_result(job["fingerprint"], result)
+            now = time.time()
+            timing = {
+                "submit_time": round(job["submitted_at"] - job["started_at"], 3),
+                "wait_time": round(now - job["submitted_at"], 3),
+                "delay_time_ms": result.get('delay_time'),
+                "execution_time_ms": result.get('execution_time')
+            }
+            self._record_batch_result(results, job["filename"], result, output_folder_path, timing, job.get("fingerprint"))
+            timing["total_time"] = round(time.time() - job["started_at"], 3)
+        
+        pending = list(image_files)
+        in_flight: List[Dict[str, Any]] = []
+        
+        with ThreadPoolExecutor(max_workers=max_concurrent_jobs) as executor:
+            while pending or in_flight:
+                # Fill the in-flight window
+                free_slots = max_concurrent_jobs - len(in_flight)
+                to_submit, pending = pending[:free_slots], pending[free_slots:]
+                for job in executor.map(submit, to_submit):
+                    if job["skipped"]:
+                        self._record_skipped(results, job["filename"], job["skipped"])
+                        continue
+                    if job["cached"]:
+                        finish(job, job["cached"])
+                    elif job["job_id"]:
+                        logger.info(f"🚀 [{job['filename']}] Submitted (Job ID: {job['job_id']}, {len(in_flight) + 1} in flight)")
+                        in_flight.append(job)
+                    else:
+                        finish(job, {"error": job["error"]})
+                
+                if not in_flight:
+                    continue
+                
+                # Poll all outstanding jobs together
+                still_running = []
+                for job, result in zip(in_flight, executor.map(poll, in_flight)):
+                    if result is None and time.time() - job["submitted_at"] >= max_wait_time:
+                        logger.error(f"❌ [{job['filename']}] Job wait timeout ({max_wait_time} seconds)")
+                        result = {'status': 'TIMEOUT', 'error': 'TIMEOUT', 'job_id': job["job_id"],
+                                  'cancelled': self.cancel_job(job["job_id"])}
+                    if result is None:
+                        still_running.append(job)
+                    else:
+                        finish(job, result)
+                in_flight = still_running
+                
+                # Only sleep when the window is full or nothing is left to submit
+                if in_flight and (not pending or len(in_flight) >= max_concurrent_jobs):
+                    time.sleep(check_interval)
 
 def main():
     """Usage example"""
@@ -9,8 +9,23 @@ import logging
 import urllib.request
 import urllib.parse
 import binascii # Base64 에러 처리를 위해 import
-import subprocess
 import time
+import re
+import hashlib
+import tempfile
+import shutil
+import struct
+import subprocess
+import threading
+import asyncio
+import zlib
+import requests
+import yaml
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from collections import deque
+from dataclasses import dataclass, field
+from types import MappingProxyType
 # 로깅 설정
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,6 +33,64 @@ logger = logging.getLogger(__name__)
 
 server_address = os.getenv('SERVER_ADDRESS', '127.0.0.1')
 client_id = str(uuid.uuid4())
+
+# 출력 업로드 설정 (output_mode가 "url"일 때 사용)
+# runpod: rp_upload로 버킷에 업로드 (BUCKET_ENDPOINT_URL 등 필요)
+# local: OUTPUT_LOCAL_DIR로 복사 후 OUTPUT_BASE_URL 기준 URL 반환
+# http: OUTPUT_HTTP_UPLOAD_URL로 PUT 업로드
+OUTPUT_UPLOADER = os.getenv('OUTPUT_UPLOADER', 'runpod')
+OUTPUT_LOCAL_DIR = os.getenv('OUTPUT_LOCAL_DIR', '/runpod-volume/outputs')
+OUTPUT_BASE_URL = os.getenv('OUTPUT_BASE_URL', '')
+OUTPUT_HTTP_UPLOAD_URL = os.getenv('OUTPUT_HTTP_UPLOAD_URL', '')
+
+# 긴 영상 모드 - 구간 비디오를 재인코딩 없이 이어 붙일 ffmpeg 경로 (비어 있으면 PATH, imageio-ffmpeg 순서로 찾음)
+FFMPEG_PATH = os.getenv('FFMPEG_PATH', '')
+
+# 입력 캐시 설정 (image_url / image_base64 입력을 콘텐츠 해시로 캐시, 빈 값이면 비활성화)
+INPUT_CACHE_DIR = os.getenv('INPUT_CACHE_DIR', '/tmp/input_cache')
+INPUT_CACHE_MAX_BYTES = int(os.getenv('INPUT_CACHE_MAX_BYTES', str(2 * 1024 ** 3)))
+DOWNLOAD_TIMEOUT = float(os.getenv('DOWNLOAD_TIMEOUT', '60'))
+
+# 입력 이미지(URL/Base64) 최대 크기(바이트), 0이면 제한 없음
+MAX_INPUT_BYTES = int(os.getenv('MAX_INPUT_BYTES', str(50 * 1024 ** 2)))
+# Base64를 한 번에 디코딩하는 문자 수 (4의 배수) - 디코딩된 전체 사본을 메모리에 만들지 않음
+BASE64_CHUNK_CHARS = 4 * 1024 ** 2
+
+# 텍스트 임베딩 디스크 캐시 (WanVideoTextEncode use_disk_cache 폴더, 빈 값이면 비활성화)
+TEXT_EMBED_CACHE_DIR = os.getenv('TEXT_EMBED_CACHE_DIR', '/ComfyUI/custom_nodes/ComfyUI-WanVideoWrapper/text_embed_cache')
+TEXT_EMBED_CACHE_MAX_BYTES = int(os.getenv('TEXT_EMBED_CACHE_MAX_BYTES', str(5 * 1024 ** 3)))
+
+# 모델 인덱스 설정 - extra_model_paths.yaml에 등록된 loras/diffusion_models 폴더의 파일 목록으로 요청을 사전 검증
+# MODEL_INDEX_REFRESH: 백그라운드 재스캔 간격(초), 0이면 워커 시작 시 한 번만 스캔
+MODEL_PATHS_CONFIG = os.getenv('MODEL_PATHS_CONFIG', '/ComfyUI/extra_model_paths.yaml')
+MODEL_INDEX_REFRESH = float(os.getenv('MODEL_INDEX_REFRESH', '300'))
+
+# 진행 상황 업데이트 최소 간격(초), 0이면 RunPod progress update를 보내지 않음
+PROGRESS_UPDATE_INTERVAL = float(os.getenv('PROGRESS_UPDATE_INTERVAL', '2'))
+
+# 워밍업 설정 (0이면 비활성화) - 작업을 받기 전에 합성 워크플로우로 모델을 미리 로드
+WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', '1') != '0'
+WORKER_READY_FILE = os.getenv('WORKER_READY_FILE', '/tmp/worker_ready')
+
+# 메모리 계획 설정 - GPU 메모리(GB, 비어 있으면 ComfyUI /system_stats의 vram_total 사용)
+GPU_MEMORY_GB = os.getenv('GPU_MEMORY_GB', '')
+MEMORY_PLANNER = os.getenv('MEMORY_PLANNER', '1') != '0'
+
+# 작업 결과 보존 정책 - 끝난 작업의 ComfyUI 히스토리, 출력 비디오, 입력 디렉토리를 보존할 범위
+# RETENTION_JOBS: 보존할 최근 작업 수 (0이면 결과 전달 후 바로 삭제)
+# RETENTION_MAX_BYTES / RETENTION_MAX_AGE: 보존 파일 총 용량(바이트) / 보존 기간(초), 0이면 제한 없음
+RETENTION_JOBS = int(os.getenv('RETENTION_JOBS', '0'))
+RETENTION_MAX_BYTES = int(os.getenv('RETENTION_MAX_BYTES', '0'))
+RETENTION_MAX_AGE = float(os.getenv('RETENTION_MAX_AGE', '0'))
+
+# 작업 실행 제한 시간(초) - 넘으면 ComfyUI 큐에서 삭제/중단 (0이면 제한 없음)
+JOB_TIMEOUT = float(os.getenv('JOB_TIMEOUT', '1800'))
+# 웹소켓 수신 대기 간격(초) - 이 간격마다 제한 시간과 취소 여부를 확인
+WS_RECV_TIMEOUT = 1.0
+
+# 워커가 동시에 받는 작업 수 (RunPod concurrency modifier)
+# 2 이상이면 GPU 실행과 다음 작업의 입력 준비/이전 작업의 출력 인코딩이 겹쳐서 진행됨
+JOB_CONCURRENCY = int(os.getenv('JOB_CONCURRENCY', '2'))
 def to_nearest_multiple_of_16(value):
     """주어진 값을 가장 가까운 16의 배수로 보정, 최소 16 보장"""
     try:
@@ -28,6 +101,364 @@ def to_nearest_multiple_of_16(value):
     if adjusted < 16:
         adjusted = 16
     return adjusted
+def evict_lru(directory, max_bytes, keep=()):
+    """디렉토리 용량이 max_bytes 이하가 될 때까지 수정 시각이 오래된 파일부터 삭제하는 함수"""
+    entries = []
+    total = 0
+    for entry in os.scandir(directory):
+        if not entry.is_file():
+            continue
+        stat = entry.stat()
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total += stat.st_size
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path in keep:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+            logger.info(f"🧹 캐시에서 삭제: {path}")
+        except FileNotFoundError:
+            pass
+    return total
+
+class ContentCache:
+    """콘텐츠 해시(sha256) 기반 디스크 캐시 - 용량을 넘으면 가장 오래 사용하지 않은 파일부터 삭제 (LRU)"""
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(cache_dir, "blobs"), exist_ok=True)
+        os.makedirs(os.path.join(cache_dir, "meta"), exist_ok=True)
+
+    def blob_path(self, digest, suffix=""):
+        return os.path.join(self.cache_dir, "blobs", f"{digest}{suffix}")
+
+    def get(self, digest, suffix=""):
+        """캐시된 파일 경로를 반환 (없으면 None), 사용 시각을 갱신하여 LRU 순서 유지"""
+        path = self.blob_path(digest, suffix)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def temp_file(self):
+        """캐시 디렉토리 안에 임시 파일을 만들어 (fd, path)를 반환 - put_file로 원자적으로 이동"""
+        return tempfile.mkstemp(dir=self.cache_dir, suffix=".part")
+
+    def put_file(self, tmp_path, digest, suffix=""):
+        """임시 파일을 캐시에 등록하고 경로를 반환"""
+        path = self.blob_path(digest, suffix)
+        os.replace(tmp_path, path)
+        self.evict(keep=path)
+        return path
+
+    def read_meta(self, key):
+        try:
+            with open(os.path.join(self.cache_dir, "meta", f"{key}.json"), 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def write_meta(self, key, meta):
+        path = os.path.join(self.cache_dir, "meta", f"{key}.json")
+        with open(f"{path}.part", 'w') as f:
+            json.dump(meta, f)
+        os.replace(f"{path}.part", path)
+
+    def evict(self, keep=None):
+        """캐시 용량이 max_bytes 이하가 될 때까지 오래된 파일을 삭제"""
+        with self._lock:
+            evict_lru(os.path.join(self.cache_dir, "blobs"), self.max_bytes, keep=(keep,))
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+input_cache = ContentCache(INPUT_CACHE_DIR, INPUT_CACHE_MAX_BYTES) if INPUT_CACHE_DIR else None
+
+
+class TextEmbedCache:
+    """WanVideoTextEncode 디스크 캐시(use_disk_cache) 관리 - 적중/미스 집계와 LRU 용량 제한
+
+    WanVideoTextEncode는 프롬프트 문자열의 sha256을 파일명으로 임베딩(.pt)을 저장하고, 파일이 있으면
+    T5 인코딩을 건너뛴다. 엔트리포인트가 이 디렉토리를 네트워크 볼륨의 모델별 폴더로 연결하므로
+    캐시 키는 (T5 모델, 프롬프트)가 된다.
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, text):
+        return os.path.join(self.cache_dir, f"{hashlib.sha256(text.strip().encode('utf-8')).hexdigest()}.pt")
+
+    def lookup(self, texts):
+        """이번 작업에서 인코딩할 프롬프트들의 캐시 적중 여부를 집계하고 적중한 파일의 사용 시각을 갱신"""
+        hits = 0
+        for text in set(texts):
+            try:
+                os.utime(self.path(text))
+                hits += 1
+            except FileNotFoundError:
+                self.misses += 1
+        self.hits += hits
+        return hits
+
+    def evict(self):
+        if os.path.isdir(self.cache_dir):
+            evict_lru(self.cache_dir, self.max_bytes)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+text_embed_cache = TextEmbedCache(TEXT_EMBED_CACHE_DIR, TEXT_EMBED_CACHE_MAX_BYTES) if TEXT_EMBED_CACHE_DIR else None
+
+# 인덱스할 모델 카테고리와 모델 파일 확장자 (ComfyUI folder_paths.supported_pt_extensions)
+MODEL_INDEX_CATEGORIES = ("loras", "diffusion_models")
+MODEL_FILE_EXTENSIONS = (".ckpt", ".pt", ".pt2", ".bin", ".pth", ".safetensors", ".pkl", ".sft", ".gguf")
+
+
+def load_model_paths(config_path, categories):
+    """extra_model_paths.yaml에서 카테고리별 모델 폴더 목록을 읽는 함수
+
+    ComfyUI(load_extra_path_config)와 같은 규칙 - 각 섹션의 base_path 기준으로 줄 단위 경로를 합치고,
+    is_default가 true인 섹션의 폴더를 앞에 둔다.
+    """
+    with open(config_path, 'r') as f:
+        config = yaml.safe_load(f) or {}
+    paths = {category: [] for category in categories}
+    for section in config.values():
+        if not isinstance(section, dict):
+            continue
+        base_path = section.get("base_path")
+        if base_path:
+            base_path = os.path.expandvars(os.path.expanduser(base_path))
+            if not os.path.isabs(base_path):
+                base_path = os.path.abspath(os.path.join(os.path.dirname(config_path), base_path))
+        for category, value in section.items():
+            if category not in paths or not isinstance(value, str):
+                continue
+            for line in value.split("\n"):
+                line = line.strip()
+                if not line:
+                    continue
+                full_path = os.path.expandvars(os.path.expanduser(line))
+                if base_path:
+                    full_path = os.path.join(base_path, full_path)
+                full_path = os.path.normpath(full_path)
+                if full_path in paths[category]:
+                    continue
+                if section.get("is_default"):
+                    paths[category].insert(0, full_path)
+                else:
+                    paths[category].append(full_path)
+    return paths
+
+
+def scan_model_dir(directory, files):
+    """폴더를 재귀적으로 스캔하여 {폴더 기준 상대 경로: 크기}를 files에 추가 (먼저 등록된 폴더가 우선)"""
+    for root, dirs, names in os.walk(directory, followlinks=True):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]
+        for name in names:
+            if not name.lower().endswith(MODEL_FILE_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            files.setdefault(os.path.relpath(path, directory), size)
+
+
+class ModelIndex:
+    """모델 폴더의 파일 이름과 크기 인덱스 - 요청 사전 검증과 LoRA 로드 비용 추정에 사용
+
+    워커 시작 시 스캔하고 refresh_interval마다 백그라운드에서 다시 스캔한다. 스캔 결과를 통째로 교체하므로
+    조회는 락 없는 dict 조회다. 인덱스에 없는 이름은 등록된 폴더를 한 번 더 확인하여
+    마지막 스캔 이후 네트워크 볼륨에 올라온 파일도 통과시킨다.
+    """
+
+    def __init__(self, config_path, categories=MODEL_INDEX_CATEGORIES, refresh_interval=0):
+        self.config_path = config_path
+        self.categories = categories
+        self.refresh_interval = refresh_interval
+        self.dirs = {category: [] for category in categories}
+        self.files = {category: {} for category in categories}
+        self.built_at = None
+        self.scan_seconds = None
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self.built_at is not None
+
+    def refresh(self):
+        """모델 폴더를 다시 스캔하여 인덱스를 교체"""
+        start = time.time()
+        try:
+            dirs = load_model_paths(self.config_path, self.categories)
+        except (OSError, yaml.YAMLError) as e:
+            logger.warning(f"모델 경로 설정을 읽을 수 없어 모델 인덱스를 사용하지 않습니다: {self.config_path} ({e})")
+            return
+        files = {}
+        for category in self.categories:
+            files[category] = {}
+            for directory in dirs[category]:
+                scan_model_dir(directory, files[category])
+        self.dirs, self.files = dirs, files
+        self.built_at = time.time()
+        self.scan_seconds = round(self.built_at - start, 3)
+        logger.info(f"📚 모델 인덱스: {', '.join(f'{c} {len(f)}개' for c, f in files.items())} ({self.scan_seconds}초)")
+
+    def start(self):
+        """첫 스캔 후 주기적 재스캔 스레드를 시작"""
+        self.refresh()
+        if self.refresh_interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._refresh_loop, name="model-index", daemon=True)
+            self._thread.start()
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"모델 인덱스 갱신 실패: {e}")
+
+    def size(self, category, name):
+        """모델 파일 크기(바이트) - 등록된 폴더에 없으면 None"""
+        files = self.files.get(category)
+        if files is None:
+            return None
+        size = files.get(name)
+        if size is None:
+            # 폴더 밖을 가리키는 이름은 확인하지 않음
+            if os.path.isabs(name) or ".." in name.replace("\\", "/").split("/"):
+                return None
+            for directory in self.dirs[category]:
+                try:
+                    size = os.path.getsize(os.path.join(directory, name))
+                except OSError:
+                    continue
+                files[name] = size
+                break
+        return size
+
+    def exists(self, category, name):
+        return self.size(category, name) is not None
+
+    def snapshot(self):
+        """list_models 요청에 반환할 폴더 목록과 카테고리별 {이름: 크기}"""
+        return {
+            "dirs": self.dirs,
+            "files": {category: dict(sorted(files.items())) for category, files in self.files.items()},
+            "built_at": self.built_at,
+        }
+
+    def stats(self):
+        return {
+            "ready": self.ready,
+            "files": {category: len(files) for category, files in self.files.items()},
+            "scan_seconds": self.scan_seconds,
+            "age_seconds": round(time.time() - self.built_at, 1) if self.ready else None,
+        }
+
+
+model_index = ModelIndex(MODEL_PATHS_CONFIG, refresh_interval=MODEL_INDEX_REFRESH)
+
+# 입력 이미지 형식 판별용 파일 시그니처 (ComfyUI LoadImage가 PIL로 여는 형식)
+IMAGE_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"BM", "bmp"),
+    (b"II*\x00", "tiff"),
+    (b"MM\x00*", "tiff"),
+)
+IMAGE_HEADER_BYTES = 12
+
+_BASE64_WHITESPACE = re.compile(r"\s")
+
+
+def sniff_image_format(head):
+    """파일 앞부분(12바이트)으로 이미지 형식을 판별 - 이미지가 아니면 None"""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    for signature, image_format in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return image_format
+    return None
+
+
+def check_input_size(size):
+    if MAX_INPUT_BYTES and size > MAX_INPUT_BYTES:
+        raise Exception(f"입력 파일이 너무 큽니다: {size} 바이트 (최대 {MAX_INPUT_BYTES} 바이트)")
+
+
+def check_image_header(head):
+    if sniff_image_format(head) is None:
+        raise Exception(f"이미지 파일이 아닙니다 (PNG/JPEG/WEBP/GIF/BMP/TIFF만 지원, 시작 바이트: {head[:IMAGE_HEADER_BYTES].hex()})")
+
+
+class InputWriter:
+    """입력 파일을 청크 단위로 쓰면서 sha256, 크기 제한, 이미지 헤더를 함께 확인하는 writer"""
+
+    def __init__(self, f):
+        self.f = f
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.head = b""
+
+    def write(self, chunk):
+        if len(self.head) < IMAGE_HEADER_BYTES:
+            self.head += chunk[:IMAGE_HEADER_BYTES - len(self.head)]
+            if len(self.head) == IMAGE_HEADER_BYTES:
+                check_image_header(self.head)
+        self.size += len(chunk)
+        check_input_size(self.size)
+        self.digest.update(chunk)
+        self.f.write(chunk)
+
+    def finish(self):
+        """헤더 검사가 끝나지 않은 아주 작은 파일도 검사하고 sha256을 반환"""
+        if len(self.head) < IMAGE_HEADER_BYTES:
+            check_image_header(self.head)
+        return self.digest.hexdigest()
+
+
+def redact_url(url):
+    """로그용 URL - 쿼리 문자열(서명 등)을 가림"""
+    parts = urllib.parse.urlsplit(url)
+    return parts._replace(query="<redacted>").geturl() if parts.query else url
+
+
+def redact_job_input(job_input):
+    """로그용 작업 입력 - *_base64 필드는 길이와 해시만, *_url 필드는 쿼리 문자열을 가려서 반환"""
+    redacted = {}
+    for key, value in job_input.items():
+        if key.endswith("_base64") and isinstance(value, str):
+            digest = hashlib.sha256()
+            for start in range(0, len(value), BASE64_CHUNK_CHARS):
+                digest.update(value[start:start + BASE64_CHUNK_CHARS].encode("utf-8"))
+            redacted[key] = {"chars": len(value), "sha256": digest.hexdigest()[:16]}
+        elif key.endswith("_url") and isinstance(value, str):
+            redacted[key] = redact_url(value)
+        else:
+            redacted[key] = value
+    return redacted
+
+
 def process_input(input_data, temp_dir, output_filename, input_type):
     """입력 데이터를 처리하여 파일 경로를 반환하는 함수"""
     if input_type == "path":
@@ -35,168 +466,1433 @@ def process_input(input_data, temp_dir, output_filename, input_type):
         logger.info(f"📁 경로 입력 처리: {input_data}")
         return input_data
     elif input_type == "url":
-        # URL인 경우 다운로드
-        logger.info(f"🌐 URL 입력 처리: {input_data}")
+        # URL인 경우 다운로드 (캐시가 있으면 URL+ETag로 재사용)
+        logger.info(f"🌐 URL 입력 처리: {redact_url(input_data)}")
+        if input_cache:
+            return download_file_cached(input_data, os.path.splitext(output_filename)[1])
         os.makedirs(temp_dir, exist_ok=True)
         file_path = os.path.abspath(os.path.join(temp_dir, output_filename))
         return download_file_from_url(input_data, file_path)
     elif input_type == "base64":
-        # Base64인 경우 디코딩하여 저장
+        # Base64인 경우 디코딩하여 저장 (캐시가 있으면 디코딩된 바이트의 해시로 재사용)
         logger.info(f"🔢 Base64 입력 처리")
+        if input_cache:
+            return save_base64_cached(input_data, os.path.splitext(output_filename)[1])
         return save_base64_to_file(input_data, temp_dir, output_filename)
     else:
         raise Exception(f"지원하지 않는 입력 타입: {input_type}")
 
         
+def _stream_response_to_file(response, fd):
+    """HTTP 응답을 청크 단위로 파일에 쓰고 sha256 해시를 반환하는 함수
+
+    Content-Length가 제한을 넘으면 받기 전에, 이미지가 아니거나 받는 도중 제한을 넘으면 즉시 중단한다.
+    """
+    content_length = response.headers.get("Content-Length", "")
+    if content_length.isdigit():
+        check_input_size(int(content_length))
+    with os.fdopen(fd, 'wb') as f:
+        writer = InputWriter(f)
+        for chunk in response.iter_content(chunk_size=1024 * 1024):
+            writer.write(chunk)
+        return writer.finish()
+
 def download_file_from_url(url, output_path):
     """URL에서 파일을 다운로드하는 함수"""
     try:
-        # wget을 사용하여 파일 다운로드
-        result = subprocess.run([
-            'wget', '-O', output_path, '--no-verbose', url
-        ], capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            logger.info(f"✅ URL에서 파일을 성공적으로 다운로드했습니다: {url} -> {output_path}")
-            return output_path
-        else:
-            logger.error(f"❌ wget 다운로드 실패: {result.stderr}")
-            raise Exception(f"URL 다운로드 실패: {result.stderr}")
-    except subprocess.TimeoutExpired:
+        with requests.get(url, stream=True, timeout=(10, DOWNLOAD_TIMEOUT)) as response:
+            response.raise_for_status()
+            _stream_response_to_file(response, os.open(output_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644))
+        logger.info(f"✅ URL에서 파일을 성공적으로 다운로드했습니다: {redact_url(url)} -> {output_path}")
+        return output_path
+    except requests.exceptions.Timeout:
         logger.error("❌ 다운로드 시간 초과")
         raise Exception("다운로드 시간 초과")
     except Exception as e:
+        # 크기 제한/형식 검사로 중단된 경우 일부만 받은 파일을 남기지 않음
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        logger.error(f"❌ 다운로드 중 오류 발생: {e}")
+        raise Exception(f"다운로드 중 오류 발생: {e}")
+
+def download_file_cached(url, suffix):
+    """URL+ETag 기준으로 입력 캐시를 사용하여 파일을 다운로드하는 함수
+
+    ETag가 있는 URL은 If-None-Match로 재검증하고, 304 응답이면 캐시된 파일을 그대로 사용한다.
+    """
+    url_key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+    meta = input_cache.read_meta(url_key)
+    headers = {}
+    if meta and input_cache.get(meta["digest"], suffix):
+        headers["If-None-Match"] = meta["etag"]
+
+    tmp_path = None
+    try:
+        with requests.get(url, stream=True, timeout=(10, DOWNLOAD_TIMEOUT), headers=headers) as response:
+            if response.status_code == 304:
+                path = input_cache.get(meta["digest"], suffix)
+                if path:
+                    input_cache.hits += 1
+                    logger.info(f"♻️ 입력 캐시 적중 (ETag): {redact_url(url)} -> {path}")
+                    return path
+                # 재검증 직후 파일이 삭제된 경우 조건 없이 다시 다운로드
+                return download_file_cached(url, suffix)
+            response.raise_for_status()
+            fd, tmp_path = input_cache.temp_file()
+            digest = _stream_response_to_file(response, fd)
+            etag = response.headers.get("ETag")
+
+        path = input_cache.get(digest, suffix)
+        if path:
+            input_cache.hits += 1
+            os.remove(tmp_path)
+            logger.info(f"♻️ 입력 캐시 적중 (내용 동일): {redact_url(url)} -> {path}")
+        else:
+            input_cache.misses += 1
+            path = input_cache.put_file(tmp_path, digest, suffix)
+            logger.info(f"✅ URL에서 파일을 성공적으로 다운로드했습니다: {redact_url(url)} -> {path}")
+        tmp_path = None
+        if etag:
+            input_cache.write_meta(url_key, {"url": url, "etag": etag, "digest": digest})
+        return path
+    except requests.exceptions.Timeout:
+        logger.error("❌ 다운로드 시간 초과")
+        raise Exception("다운로드 시간 초과")
+    except requests.exceptions.RequestException as e:
         logger.error(f"❌ 다운로드 중 오류 발생: {e}")
         raise Exception(f"다운로드 중 오류 발생: {e}")
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _decode_base64_to_file(base64_data, fd):
+    """Base64 문자열을 청크 단위로 디코딩하여 파일에 쓰고 sha256 해시를 반환하는 함수
+
+    디코딩된 전체 사본을 만들지 않으며, 예상 크기가 제한을 넘으면 디코딩 전에,
+    첫 청크가 이미지가 아니면 바로 거부한다. data URI 접두사와 줄바꿈/공백은 허용한다.
+    """
+    if base64_data.startswith("data:"):
+        base64_data = base64_data.partition(",")[2]
+    if _BASE64_WHITESPACE.search(base64_data):
+        base64_data = _BASE64_WHITESPACE.sub("", base64_data)
+    check_input_size(len(base64_data) // 4 * 3 - base64_data[-2:].count("="))
 
+    with os.fdopen(fd, 'wb') as f:
+        writer = InputWriter(f)
+        try:
+            for start in range(0, len(base64_data), BASE64_CHUNK_CHARS):
+                writer.write(base64.b64decode(base64_data[start:start + BASE64_CHUNK_CHARS], validate=True))
+        except (binascii.Error, ValueError) as e:
+            logger.error(f"❌ Base64 디코딩 실패: {e}")
+            raise Exception(f"Base64 디코딩 실패: {e}")
+        return writer.finish()
 
 def save_base64_to_file(base64_data, temp_dir, output_filename):
     """Base64 데이터를 파일로 저장하는 함수"""
+    # 디렉토리가 존재하지 않으면 생성
+    os.makedirs(temp_dir, exist_ok=True)
+
+    file_path = os.path.abspath(os.path.join(temp_dir, output_filename))
     try:
-        # Base64 문자열 디코딩
-        decoded_data = base64.b64decode(base64_data)
-        
-        # 디렉토리가 존재하지 않으면 생성
-        os.makedirs(temp_dir, exist_ok=True)
-        
-        # 파일로 저장
-        file_path = os.path.abspath(os.path.join(temp_dir, output_filename))
-        with open(file_path, 'wb') as f:
-            f.write(decoded_data)
-        
-        logger.info(f"✅ Base64 입력을 '{file_path}' 파일로 저장했습니다.")
+        _decode_base64_to_file(base64_data, os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644))
+    except Exception:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+
+    logger.info(f"✅ Base64 입력을 '{file_path}' 파일로 저장했습니다.")
+    return file_path
+
+def save_base64_cached(base64_data, suffix):
+    """디코딩된 바이트의 해시로 입력 캐시를 사용하여 Base64 데이터를 저장하는 함수"""
+    fd, tmp_path = input_cache.temp_file()
+    try:
+        digest = _decode_base64_to_file(base64_data, fd)
+        file_path = input_cache.get(digest, suffix)
+        if file_path:
+            input_cache.hits += 1
+            logger.info(f"♻️ 입력 캐시 적중 (Base64): {file_path}")
+        else:
+            input_cache.misses += 1
+            file_path = input_cache.put_file(tmp_path, digest, suffix)
+            tmp_path = None
+            logger.info(f"✅ Base64 입력을 '{file_path}' 파일로 저장했습니다.")
         return file_path
-    except (binascii.Error, ValueError) as e:
-        logger.error(f"❌ Base64 디코딩 실패: {e}")
-        raise Exception(f"Base64 디코딩 실패: {e}")
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
     
+class ComfyUIConnection:
+    """ComfyUI 연결 관리자 - 워커 수명 동안 HTTP 세션과 웹소켓을 재사용"""
+
+    def __init__(self, address, client_id, port=8188):
+        self.base_url = f"http://{address}:{port}"
+        self.ws_url = f"ws://{address}:{port}/ws?clientId={client_id}"
+        # keep-alive 커넥션 풀을 사용하는 HTTP 세션
+        self.session = requests.Session()
+        self.ws = None
+        self.ready = False
+        self._lock = threading.Lock()
+
+    def wait_until_ready(self, max_attempts=180, interval=1):
+        """ComfyUI HTTP 서버가 응답할 때까지 대기 (워커 시작 시 한 번만 수행)"""
+        if self.ready:
+            return
+        logger.info(f"Checking HTTP connection to: {self.base_url}/")
+        for attempt in range(max_attempts):
+            try:
+                self.session.get(f"{self.base_url}/", timeout=5)
+                logger.info(f"HTTP 연결 성공 (시도 {attempt+1})")
+                self.ready = True
+                return
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"HTTP 연결 실패 (시도 {attempt+1}/{max_attempts}): {e}")
+                time.sleep(interval)
+        raise Exception("ComfyUI 서버에 연결할 수 없습니다. 서버가 실행 중인지 확인하세요.")
+
+    def get_websocket(self, max_wait=180):
+        """연결된 웹소켓을 반환 - 끊어진 경우에만 백오프로 재연결"""
+        with self._lock:
+            if self.ws is not None and self.ws.connected:
+                return self.ws
+            self.wait_until_ready()
+            logger.info(f"Connecting to WebSocket: {self.ws_url}")
+            delay = 0.5
+            deadline = time.time() + max_wait
+            attempt = 0
+            while True:
+                attempt += 1
+                ws = websocket.WebSocket()
+                try:
+                    ws.connect(self.ws_url)
+                    ws.settimeout(WS_RECV_TIMEOUT)
+                    logger.info(f"웹소켓 연결 성공 (시도 {attempt})")
+                    self.ws = ws
+                    return ws
+                except Exception as e:
+                    logger.warning(f"웹소켓 연결 실패 (시도 {attempt}): {e}")
+                    if time.time() + delay > deadline:
+                        raise Exception(f"웹소켓 연결 시간 초과 ({max_wait}초)")
+                    time.sleep(delay)
+                    delay = min(delay * 2, 5)
+
+    def reset_websocket(self):
+        """실패한 웹소켓을 닫아 다음 get_websocket 호출 때 재연결되도록 함"""
+        with self._lock:
+            if self.ws is not None:
+                try:
+                    self.ws.close()
+                except Exception:
+                    pass
+            self.ws = None
+
+
+comfy = ComfyUIConnection(server_address, client_id)
+
 def queue_prompt(prompt):
-    url = f"http://{server_address}:8188/prompt"
+    url = f"{comfy.base_url}/prompt"
     logger.info(f"Queueing prompt to: {url}")
     p = {"prompt": prompt, "client_id": client_id}
-    data = json.dumps(p).encode('utf-8')
-    req = urllib.request.Request(url, data=data)
-    return json.loads(urllib.request.urlopen(req).read())
+    data = json.dumps(p, default=_json_default)
+    response = comfy.session.post(url, data=data, headers={"Content-Type": "application/json"}, timeout=30)
+    response.raise_for_status()
+    return response.json()
 
 def get_image(filename, subfolder, folder_type):
-    url = f"http://{server_address}:8188/view"
+    url = f"{comfy.base_url}/view"
     logger.info(f"Getting image from: {url}")
     data = {"filename": filename, "subfolder": subfolder, "type": folder_type}
-    url_values = urllib.parse.urlencode(data)
-    with urllib.request.urlopen(f"{url}?{url_values}") as response:
-        return response.read()
+    response = comfy.session.get(url, params=data, timeout=60)
+    response.raise_for_status()
+    return response.content
 
 def get_history(prompt_id):
-    url = f"http://{server_address}:8188/history/{prompt_id}"
+    url = f"{comfy.base_url}/history/{prompt_id}"
     logger.info(f"Getting history from: {url}")
-    with urllib.request.urlopen(url) as response:
-        return json.loads(response.read())
+    response = comfy.session.get(url, timeout=30)
+    response.raise_for_status()
+    return response.json()
 
-def get_videos(ws, prompt):
-    prompt_id = queue_prompt(prompt)['prompt_id']
-    output_videos = {}
-    while True:
-        out = ws.recv()
-        if isinstance(out, str):
-            message = json.loads(out)
-            if message['type'] == 'executing':
-                data = message['data']
-                if data['node'] is None and data['prompt_id'] == prompt_id:
-                    break
-        else:
-            continue
+# rp_upload 버킷 설정 - 없으면 rp_upload가 업로드 대신 워커 로컬 경로를 반환함
+RUNPOD_BUCKET_ENV = ("BUCKET_ENDPOINT_URL", "BUCKET_ACCESS_KEY_ID", "BUCKET_SECRET_ACCESS_KEY")
+
+def upload_to_runpod_bucket(file_path, object_name):
+    """rp_upload를 사용하여 버킷에 업로드하고 presigned URL을 반환하는 함수"""
+    missing = [name for name in RUNPOD_BUCKET_ENV if not os.getenv(name)]
+    if missing:
+        raise Exception(f"RunPod 버킷 설정이 없습니다: {', '.join(missing)}")
+    url = rp_upload.upload_file_to_bucket(file_name=object_name, file_location=file_path)
+    # boto3가 없는 경우에도 rp_upload는 로컬 경로를 반환하므로 클라이언트가 받을 수 없는 결과로 처리
+    if not url.startswith(("http://", "https://")):
+        raise Exception(f"RunPod 버킷 업로드 실패 (boto3 설치 여부 확인): {url}")
+    return url
+
+def upload_to_local_dir(file_path, object_name):
+    """OUTPUT_LOCAL_DIR로 파일을 복사하고 OUTPUT_BASE_URL 기준 URL을 반환하는 함수"""
+    dest_path = os.path.abspath(os.path.join(OUTPUT_LOCAL_DIR, object_name))
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    shutil.copyfile(file_path, dest_path)
+    if OUTPUT_BASE_URL:
+        return f"{OUTPUT_BASE_URL.rstrip('/')}/{urllib.parse.quote(object_name)}"
+    return f"file://{dest_path}"
+
+def upload_to_http(file_path, object_name):
+    """OUTPUT_HTTP_UPLOAD_URL로 파일을 스트리밍 PUT 업로드하는 함수"""
+    if not OUTPUT_HTTP_UPLOAD_URL:
+        raise Exception("OUTPUT_HTTP_UPLOAD_URL이 설정되지 않았습니다.")
+    url = f"{OUTPUT_HTTP_UPLOAD_URL.rstrip('/')}/{urllib.parse.quote(object_name)}"
+    with open(file_path, 'rb') as f:
+        req = urllib.request.Request(url, data=f, method='PUT')
+        req.add_header('Content-Length', str(os.path.getsize(file_path)))
+        req.add_header('Content-Type', 'video/mp4')
+        with urllib.request.urlopen(req, timeout=300) as response:
+            return response.headers.get('Location') or url
+
+# 업로더 레지스트리 - register_uploader로 다른 오브젝트 스토리지를 추가할 수 있음
+UPLOADERS = {
+    "runpod": upload_to_runpod_bucket,
+    "local": upload_to_local_dir,
+    "http": upload_to_http,
+}
+
+def register_uploader(name, upload_func):
+    """업로더 함수(file_path, object_name) -> url 을 등록하는 함수"""
+    UPLOADERS[name] = upload_func
+
+def upload_video(file_path, object_name):
+    """설정된 업로더로 비디오를 업로드하고 URL을 반환하는 함수"""
+    uploader = UPLOADERS.get(OUTPUT_UPLOADER)
+    if uploader is None:
+        raise Exception(f"지원하지 않는 업로더: {OUTPUT_UPLOADER}")
+    url = uploader(file_path, object_name)
+    logger.info(f"✅ 비디오 업로드 완료 ({OUTPUT_UPLOADER}): {file_path} -> {url}")
+    return url
+
+def output_upload_error():
+    """output_mode="url" 결과를 업로드할 수 없는 설정이면 그 이유를, 업로드할 수 있으면 None을 반환"""
+    if OUTPUT_UPLOADER not in UPLOADERS:
+        return f"지원하지 않는 업로더: {OUTPUT_UPLOADER}"
+    if OUTPUT_UPLOADER == "runpod":
+        missing = [name for name in RUNPOD_BUCKET_ENV if not os.getenv(name)]
+        if missing:
+            return f"RunPod 버킷 설정이 없어 output_mode \"url\"을 사용할 수 없습니다: {', '.join(missing)}"
+    if OUTPUT_UPLOADER == "http" and not OUTPUT_HTTP_UPLOAD_URL:
+        return "OUTPUT_HTTP_UPLOAD_URL이 설정되지 않아 output_mode \"url\"을 사용할 수 없습니다."
+    return None
+
+def build_video_output(file_path, output_mode, job_id):
+    """출력 모드에 따라 비디오 결과(base64 또는 URL)를 만드는 함수"""
+    if output_mode == "url":
+        object_name = f"{job_id}/{os.path.basename(file_path)}"
+        return {"video_url": upload_video(file_path, object_name)}
+    elif output_mode == "base64":
+        # fullpath를 이용하여 직접 파일을 읽고 base64로 인코딩
+        with open(file_path, 'rb') as f:
+            return {"video": base64.b64encode(f.read()).decode('utf-8')}
+    else:
+        raise Exception(f"지원하지 않는 출력 모드: {output_mode}")
+
+_ffmpeg_path = None
+
+def find_ffmpeg():
+    """ffmpeg 실행 파일 경로 - FFMPEG_PATH, PATH, imageio-ffmpeg(VideoHelperSuite가 사용) 순서로 찾음 (없으면 None)"""
+    global _ffmpeg_path
+    if _ffmpeg_path is None:
+        _ffmpeg_path = FFMPEG_PATH or shutil.which("ffmpeg")
+        if not _ffmpeg_path:
+            try:
+                import imageio_ffmpeg
+                _ffmpeg_path = imageio_ffmpeg.get_ffmpeg_exe()
+            except (ImportError, RuntimeError):
+                return None
+    return _ffmpeg_path
+
+def concat_videos(paths, output_path):
+    """같은 설정으로 인코딩된 구간 비디오들을 재인코딩 없이(스트림 복사) 하나로 이어 붙이는 함수"""
+    ffmpeg = find_ffmpeg()
+    if ffmpeg is None:
+        raise Exception("구간 비디오를 이어 붙일 ffmpeg를 찾을 수 없습니다.")
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    list_path = f"{output_path}.txt"
+    with open(list_path, "w") as f:
+        for path in paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    command = [ffmpeg, "-y", "-v", "error", "-f", "concat", "-safe", "0", "-i", list_path,
+               "-c", "copy", "-movflags", "+faststart", output_path]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise Exception(f"구간 비디오 연결 실패: {completed.stderr.strip()[-1000:]}")
+    return output_path
+
+class ProgressTracker:
+    """ComfyUI 웹소켓 이벤트로 노드별 진행 상황과 실행 시간을 추적하는 클래스
+
+    report가 주어지면 노드가 바뀔 때마다, 그리고 샘플러 스텝 진행은 최소 min_interval 간격으로
+    구조화된 진행 상황을 전달한다.
+    """
+
+    def __init__(self, prompt, report=None, min_interval=None, extra=None):
+        self.prompt_id = None
+        self.extra = extra or {}
+        self.class_types = {node_id: node["class_type"] for node_id, node in prompt.items()}
+        self.report = report
+        self.min_interval = PROGRESS_UPDATE_INTERVAL if min_interval is None else min_interval
+        self.start_time = time.time()
+        self.last_report = 0.0
+        self.current_node = None
+        self.node_start = None
+        self.step = None
+        self.max_steps = None
+        self.node_timings = {}
+        self.cached_nodes = []
+        # executed 이벤트로 받은 노드별 출력 파일 경로 (히스토리 조회 없이 결과 수집)
+        self.outputs = {}
+        # executed 이벤트로 받은 노드별 출력 이미지 ({filename, subfolder, type}) - 긴 영상 모드의 구간 마지막 프레임
+        self.images = {}
+
+    def _finish_node(self, now):
+        if self.current_node is not None:
+            self.node_timings[self.current_node] = {
+                "class_type": self.class_types.get(self.current_node),
+                "seconds": round(now - self.node_start, 3),
+            }
+        self.current_node = None
+
+    def handle(self, message):
+        """웹소켓 메시지 하나를 처리 - 현재 프롬프트 실행이 끝나면 True 반환"""
+        data = message.get('data', {})
+        if data.get('prompt_id') not in (None, self.prompt_id):
+            return False
+        msg_type = message.get('type')
+        now = time.time()
+        if msg_type == 'execution_start':
+            self.start_time = now
+        elif msg_type == 'execution_cached':
+            self.cached_nodes.extend(data.get('nodes', []))
+        elif msg_type == 'executing':
+            self._finish_node(now)
+            if data.get('node') is None:
+                if data.get('prompt_id') != self.prompt_id:
+                    return False
+                self.send(force=True)
+                return True
+            self.current_node = data['node']
+            self.node_start = now
+            self.step = self.max_steps = None
+            self.send(force=True)
+        elif msg_type == 'executed':
+            output = data.get('output') or {}
+            videos = [video['fullpath'] for video in output.get('gifs', []) if 'fullpath' in video]
+            # 비디오가 없는 출력 노드(PreviewImage 등)는 기록하지 않음 - 비디오를 받지 못했으면 히스토리에서 조회
+            if videos:
+                self.outputs[data.get('node')] = videos
+            if output.get('images'):
+                self.images[data.get('node')] = output['images']
+        elif msg_type == 'progress':
+            self.step = data.get('value')
+            self.max_steps = data.get('max')
+            self.send()
+        elif msg_type == 'execution_interrupted':
+            raise Exception(f"ComfyUI 실행이 중단되었습니다 (노드 {data.get('node_id')} {data.get('node_type')})")
+        elif msg_type == 'execution_error':
+            raise Exception(f"ComfyUI 실행 오류 (노드 {data.get('node_id')} {data.get('node_type')}): {data.get('exception_message')}")
+        return False
+
+    def snapshot(self):
+        """현재 진행 상황을 딕셔너리로 반환"""
+        now = time.time()
+        done = len(self.node_timings) + len(self.cached_nodes)
+        progress = {
+            "elapsed": round(now - self.start_time, 1),
+            "completed_nodes": done,
+            "total_nodes": len(self.class_types),
+            "percent": round(100.0 * done / max(len(self.class_types), 1), 1),
+            **self.extra,
+        }
+        if self.current_node is not None:
+            node_elapsed = now - self.node_start
+            progress.update({
+                "node": self.current_node,
+                "node_type": self.class_types.get(self.current_node),
+                "node_elapsed": round(node_elapsed, 1),
+            })
+            if self.step and self.max_steps:
+                progress["step"] = self.step
+                progress["max_steps"] = self.max_steps
+                # 현재 노드의 남은 시간 추정 (스텝당 평균 시간 기준)
+                progress["node_eta"] = round(node_elapsed / self.step * (self.max_steps - self.step), 1)
+        return progress
+
+    def send(self, force=False):
+        if self.report is None or self.min_interval <= 0:
+            return
+        now = time.time()
+        if not force and now - self.last_report < self.min_interval:
+            return
+        self.last_report = now
+        try:
+            self.report(self.snapshot())
+        except Exception as e:
+            logger.warning(f"진행 상황 업데이트 실패: {e}")
+
+    def log_summary(self):
+        """노드별 실행 시간을 오래 걸린 순서로 로그에 남김"""
+        ranked = sorted(self.node_timings.items(), key=lambda item: item[1]["seconds"], reverse=True)
+        summary = ", ".join(f"{node_id}({t['class_type']})={t['seconds']}s" for node_id, t in ranked)
+        logger.info(f"⏱️ 노드별 실행 시간: {summary} / 캐시된 노드 {len(self.cached_nodes)}개")
+
+
+class JobMetrics:
+    """작업 단계별 소요 시간, 입출력 크기, 노드별 실행 시간을 모으는 클래스"""
+
+    def __init__(self):
+        self.start_time = time.time()
+        self.timings = {}
+        self.sizes = {}
+        self.nodes = {}
+
+    def add_time(self, name, seconds):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name):
+        """with 블록의 실행 시간을 name 단계에 누적"""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.time() - start)
+
+    def add_size(self, name, size):
+        self.sizes[name] = self.sizes.get(name, 0) + size
 
+    def add_nodes(self, tracker):
+        """ProgressTracker의 노드별 실행 시간을 합산 (변형이 여러 개면 runs가 늘어남)"""
+        for node_id, timing in tracker.node_timings.items():
+            entry = self.nodes.setdefault(node_id, {"class_type": timing["class_type"], "seconds": 0.0, "runs": 0})
+            entry["seconds"] = round(entry["seconds"] + timing["seconds"], 3)
+            entry["runs"] += 1
+
+    def report(self):
+        """결과에 포함할 timings/sizes 블록"""
+        timings = {name: round(seconds, 3) for name, seconds in self.timings.items()}
+        timings["total"] = round(time.time() - self.start_time, 3)
+        if self.nodes:
+            timings["nodes"] = self.nodes
+        return {"timings": timings, "sizes": dict(self.sizes)}
+
+
+def collect_videos(prompt_id):
+    """히스토리에서 프롬프트의 출력 비디오 경로를 노드별로 모으는 함수"""
+    output_videos = {}
     history = get_history(prompt_id)[prompt_id]
     for node_id in history['outputs']:
         node_output = history['outputs'][node_id]
         videos_output = []
         if 'gifs' in node_output:
             for video in node_output['gifs']:
-                # fullpath를 이용하여 직접 파일을 읽고 base64로 인코딩
-                with open(video['fullpath'], 'rb') as f:
-                    video_data = base64.b64encode(f.read()).decode('utf-8')
-                videos_output.append(video_data)
+                videos_output.append(video['fullpath'])
         output_videos[node_id] = videos_output
-
     return output_videos
 
+def cancel_prompts(prompt_ids):
+    """ComfyUI 큐에서 대기 중인 프롬프트를 삭제하고, 실행 중인 프롬프트는 중단(/interrupt)하는 함수"""
+    try:
+        comfy.session.post(f"{comfy.base_url}/queue", json={"delete": list(prompt_ids)}, timeout=10).raise_for_status()
+        queue = comfy.session.get(f"{comfy.base_url}/queue", timeout=10).json()
+        # 다른 작업의 프롬프트를 중단하지 않도록 실행 중인 프롬프트가 이 작업의 것일 때만 중단
+        running = {item[1] for item in queue.get("queue_running", [])}
+        for prompt_id in running & set(prompt_ids):
+            comfy.session.post(f"{comfy.base_url}/interrupt", json={"prompt_id": prompt_id}, timeout=10).raise_for_status()
+            logger.warning(f"🛑 실행 중인 프롬프트 중단: {prompt_id}")
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"ComfyUI 프롬프트 취소 실패: {e}")
+
+def check_job_deadline(deadline, cancel_event):
+    """작업이 취소되었거나 제한 시간이 지났으면 예외를 발생시키는 함수"""
+    if cancel_event is not None and cancel_event.is_set():
+        raise Exception("작업이 취소되었습니다.")
+    if deadline is not None and time.time() > deadline:
+        raise TimeoutError(f"작업 실행 시간 초과 ({JOB_TIMEOUT:g}초)")
+
+def get_videos_batch(ws, prompts, trackers, metrics=None, deadline=None, cancel_event=None):
+    """여러 프롬프트를 한 번에 큐에 넣고 같은 웹소켓으로 모두 끝날 때까지 기다리는 함수
+
+    ComfyUI는 큐에 들어온 순서대로 실행하며, 입력이 같은 노드(모델 로더, 이미지 리사이즈,
+    CLIP vision 인코딩 등)는 이전 프롬프트의 캐시된 출력을 재사용한다.
+    metrics가 주어지면 queue/execute/reconnect/history 단계 시간을 기록한다.
+    deadline(시각)이 지나거나 cancel_event가 설정되면 남은 프롬프트를 취소하고 예외를 발생시킨다.
+    """
+    metrics = metrics or JobMetrics()
+    pending = {}
+    # prompt_id가 없는 메시지(일부 progress 이벤트)는 현재 실행 중인 프롬프트로 전달
+    active = trackers[0]
+    reconnect_seconds = 0.0
+    try:
+        # 큐에 넣는 도중 실패해도 앞서 넣은 프롬프트는 아래에서 취소됨
+        with metrics.stage("queue"):
+            for prompt, tracker in zip(prompts, trackers):
+                prompt_id = queue_prompt(prompt)['prompt_id']
+                tracker.prompt_id = prompt_id
+                pending[prompt_id] = tracker
+        execute_start = time.time()
+        while pending:
+            check_job_deadline(deadline, cancel_event)
+            try:
+                out = ws.recv()
+            except websocket.WebSocketTimeoutException:
+                continue
+            except (websocket.WebSocketException, OSError) as e:
+                # 웹소켓이 끊어진 경우 재연결 후, 그 사이에 작업이 끝났는지 히스토리로 확인
+                logger.warning(f"웹소켓 수신 실패, 재연결합니다: {e}")
+                reconnect_start = time.time()
+                comfy.reset_websocket()
+                ws = comfy.get_websocket()
+                for prompt_id in list(pending):
+                    if prompt_id in get_history(prompt_id):
+                        pending.pop(prompt_id).log_summary()
+                reconnect_seconds += time.time() - reconnect_start
+                continue
+            if not isinstance(out, str):
+                # 바이너리 메시지(미리보기 이미지)는 무시
+                continue
+            message = json.loads(out)
+            prompt_id = message.get('data', {}).get('prompt_id')
+            if prompt_id is not None:
+                if prompt_id not in pending:
+                    continue
+                active = pending[prompt_id]
+            try:
+                done = active.handle(message)
+            except Exception:
+                # 실행 오류/중단으로 끝난 프롬프트는 취소할 필요 없음
+                pending.pop(active.prompt_id, None)
+                raise
+            if done:
+                pending.pop(active.prompt_id, None)
+                active.log_summary()
+    except Exception:
+        # 실행 오류, 취소, 시간 초과 시 남은 프롬프트(다른 변형)가 ComfyUI에서 계속 실행되지 않도록 취소
+        if pending:
+            cancel_prompts(list(pending))
+        raise
+    metrics.add_time("execute", time.time() - execute_start - reconnect_seconds)
+    if reconnect_seconds:
+        metrics.add_time("reconnect", reconnect_seconds)
+    for tracker in trackers:
+        metrics.add_nodes(tracker)
+
+    # 출력은 executed 이벤트에서 가져오고, 받지 못한 경우(재연결, 캐시된 출력)만 히스토리 조회
+    with metrics.stage("history"):
+        for tracker in trackers:
+            if not tracker.outputs:
+                tracker.outputs = collect_videos(tracker.prompt_id)
+        return [tracker.outputs for tracker in trackers]
+
+def get_videos(ws, prompt, tracker=None, metrics=None):
+    if tracker is None:
+        tracker = ProgressTracker(prompt)
+    return get_videos_batch(ws, [prompt], [tracker], metrics)[0]
+
+def delete_history(prompt_ids):
+    """ComfyUI 히스토리에서 프롬프트 항목을 삭제하는 함수"""
+    if not prompt_ids:
+        return
+    try:
+        comfy.session.post(f"{comfy.base_url}/history", json={"delete": list(prompt_ids)}, timeout=10).raise_for_status()
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"ComfyUI 히스토리 삭제 실패: {e}")
+
+def _path_size(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+def _remove_path(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+class JobRetention:
+    """끝난 작업의 ComfyUI 히스토리와 입력/출력 파일을 보존 정책(개수/용량/기간)에 따라 정리하는 클래스
+
+    max_jobs가 0이면 작업이 끝나는 즉시 삭제한다. 기간 초과 항목은 다음 작업이 끝날 때 정리된다.
+    """
+
+    def __init__(self, max_jobs=0, max_bytes=0, max_age=0):
+        self.max_jobs = max_jobs
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.entries = deque()
+        self.total_bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, prompt_ids, paths):
+        """작업 하나의 프롬프트 ID와 파일 경로를 보존 목록에 넣고 정책을 넘는 항목을 삭제"""
+        paths = [path for path in paths if path and os.path.exists(path)]
+        # VHS_VideoCombine이 비디오와 함께 저장하는 첫 프레임 PNG도 함께 정리
+        paths += [os.path.splitext(path)[0] + ".png" for path in paths if path.endswith(".mp4")
+                  and os.path.exists(os.path.splitext(path)[0] + ".png")]
+        size = sum(_path_size(path) for path in paths)
+        with self._lock:
+            self.entries.append((time.time(), list(prompt_ids), paths, size))
+            self.total_bytes += size
+            expired = self._expire()
+        for _, expired_ids, expired_paths, _ in expired:
+            self.delete(expired_ids, expired_paths)
+
+    def _expire(self):
+        now = time.time()
+        expired = []
+        while self.entries and (
+            len(self.entries) > self.max_jobs
+            or (self.max_bytes and self.total_bytes > self.max_bytes)
+            or (self.max_age and now - self.entries[0][0] > self.max_age)
+        ):
+            entry = self.entries.popleft()
+            self.total_bytes -= entry[3]
+            expired.append(entry)
+        return expired
+
+    def delete(self, prompt_ids, paths):
+        """히스토리 항목과 파일을 바로 삭제"""
+        delete_history(prompt_ids)
+        for path in paths:
+            try:
+                _remove_path(path)
+            except OSError as e:
+                logger.warning(f"파일 삭제 실패: {path} ({e})")
+
+
+job_retention = JobRetention(RETENTION_JOBS, RETENTION_MAX_BYTES, RETENTION_MAX_AGE)
+
+def release_job(task_id, staged=None, results=None):
+    """결과 전달이 끝난 작업의 히스토리와 입력/출력 파일을 보존 정책에 넘기는 함수
+
+    실패한 작업은 results가 없으므로, 진행 추적기에 모인 출력(배치에서 끝난 변형, 실패 전에 끝난 구간)도 함께 넘긴다.
+    """
+    trackers = staged.trackers if isinstance(staged, StagedJob) else []
+    prompt_ids = [tracker.prompt_id for tracker in trackers if tracker.prompt_id]
+    outputs = list(results or []) + [tracker.outputs for tracker in trackers]
+    paths = [task_id] + list(dict.fromkeys(path for videos in outputs for node_paths in videos.values() for path in node_paths))
+    job_retention.add(prompt_ids, paths)
+
 def load_workflow(workflow_path):
     with open(workflow_path, 'r') as file:
         return json.load(file)
 
+def freeze(value):
+    """JSON 값을 읽기 전용 형태(MappingProxyType/tuple)로 변환하는 함수"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+def _json_default(value):
+    """freeze된 워크플로우 노드를 JSON으로 직렬화하기 위한 함수"""
+    if isinstance(value, MappingProxyType):
+        return dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+# 워크플로우 템플릿 - import 시 한 번만 파싱하여 읽기 전용으로 캐시
+WORKFLOW_DIR = os.getenv('WORKFLOW_DIR', os.path.dirname(os.path.abspath(__file__)))
+WORKFLOW_FILES = {
+    "single": "new_Wan22_api.json",
+    "flf2v": "new_Wan22_flf2v_api.json",
+}
+WORKFLOW_TEMPLATES = {
+    name: freeze(load_workflow(os.path.join(WORKFLOW_DIR, filename)))
+    for name, filename in WORKFLOW_FILES.items()
+}
+
+@dataclass(frozen=True)
+class Binding:
+    """요청 파라미터를 워크플로우 노드 입력에 연결하는 바인딩"""
+    node_id: str
+    input_name: str
+    type: type
+    min_value: float = None
+    max_value: float = None
+    choices: tuple = None
+
+    def coerce(self, param, value):
+        """값을 바인딩 타입으로 변환하고 범위를 검사"""
+        try:
+            value = self.type(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{param} 값이 {self.type.__name__} 타입이 아닙니다: {value!r}")
+        if self.min_value is not None and value < self.min_value:
+            raise ValueError(f"{param} 값이 최솟값({self.min_value})보다 작습니다: {value}")
+        if self.max_value is not None and value > self.max_value:
+            raise ValueError(f"{param} 값이 최댓값({self.max_value})보다 큽니다: {value}")
+        if self.choices is not None and value not in self.choices:
+            raise ValueError(f"{param} 값은 {', '.join(self.choices)} 중 하나여야 합니다: {value}")
+        return value
+
+# 파라미터 → 노드/입력 바인딩 테이블 (모든 워크플로우 템플릿 공통)
+WORKFLOW_BINDINGS = {
+    "image": [Binding("244", "image", str)],
+    "end_image": [Binding("617", "image", str)],
+    "prompt": [Binding("135", "positive_prompt", str)],
+    "negative_prompt": [Binding("135", "negative_prompt", str)],
+    "text_embed_disk_cache": [Binding("135", "use_disk_cache", bool)],
+    "length": [Binding("541", "num_frames", int, 1, 1000)],
+    "seed": [Binding("220", "seed", int, 0, 0xffffffffffffffff), Binding("540", "seed", int, 0, 0xffffffffffffffff)],
+    "cfg": [Binding("540", "cfg", float, 0.0, 30.0)],
+    "width": [Binding("235", "value", int, 16, 8192)],
+    "height": [Binding("236", "value", int, 16, 8192)],
+    "context_overlap": [Binding("498", "context_overlap", int, 0, 1000)],
+    # 메모리 계획 (plan_memory) - 컨텍스트 윈도우, 블록 스왑, VAE 타일링
+    "context_frames": [Binding("498", "context_frames", int, 1, 1000)],
+    "blocks_to_swap": [Binding("525", "blocks_to_swap", int, 0, 40)],
+    "vae_tiling": [Binding("130", "enable_vae_tiling", bool), Binding("612", "enable_vae_tiling", bool), Binding("541", "tiled_vae", bool)],
+    # 샘플러 스텝 - 569: 전체 스텝 수 (220/540/570 공유), 575: HIGH(220) 종료 = LOW(540) 시작 스텝
+    # HIGH/LOW 샘플러가 각각 1스텝 이상 실행되도록 steps는 2 이상, split_step은 1 ~ steps-1
+    "steps": [Binding("569", "value", int, 2, 200)],
+    "split_step": [Binding("575", "value", int, 1, 200)],
+    # HIGH 샘플러(220) CFG 스케줄 (CreateCFGScheduleFloatList 570)
+    "cfg_schedule_start": [Binding("570", "cfg_scale_start", float, 0.0, 30.0)],
+    "cfg_schedule_end": [Binding("570", "cfg_scale_end", float, 0.0, 30.0)],
+    "cfg_schedule_interpolation": [Binding("570", "interpolation", str, choices=("linear", "ease_in", "ease_out"))],
+    "cfg_schedule_start_percent": [Binding("570", "start_percent", float, 0.0, 1.0)],
+    "cfg_schedule_end_percent": [Binding("570", "end_percent", float, 0.0, 1.0)],
+}
+
+# cfg_schedule 입력 키 → 바인딩 파라미터
+CFG_SCHEDULE_KEYS = {
+    "start": "cfg_schedule_start",
+    "end": "cfg_schedule_end",
+    "interpolation": "cfg_schedule_interpolation",
+    "start_percent": "cfg_schedule_start_percent",
+    "end_percent": "cfg_schedule_end_percent",
+}
+
+# LoRA 슬롯 바인딩 - HIGH LoRA는 노드 279, LOW LoRA는 노드 553 (lora_1 ~ lora_4)
+LORA_NODE_IDS = {"high": "279", "low": "553"}
+MAX_LORA_PAIRS = 4
+
+def node_inputs(prompt, node_id):
+    """수정할 노드의 inputs를 반환 - 처음 수정할 때만 해당 노드를 복사 (copy-on-write)"""
+    node = prompt[node_id]
+    if isinstance(node, MappingProxyType):
+        node = dict(node)
+        node["inputs"] = dict(node["inputs"])
+        prompt[node_id] = node
+    return node["inputs"]
+
+def resolve_step_schedule(template_name, steps, split_step=None, cfg_schedule=None):
+    """스텝 수, HIGH/LOW 분할 지점, HIGH 샘플러 CFG 스케줄을 바인딩 파라미터로 변환하는 함수
+
+    split_step을 지정하지 않으면 템플릿의 분할 비율(575/569)을 유지한다.
+    HIGH/LOW 샘플러가 모두 1스텝 이상 실행되도록 split_step은 1 ~ steps-1로 제한한다.
+    """
+    template = WORKFLOW_TEMPLATES[template_name]
+    steps = WORKFLOW_BINDINGS["steps"][0].coerce("steps", steps)
+    if split_step is None:
+        template_steps = template[WORKFLOW_BINDINGS["steps"][0].node_id]["inputs"]["value"]
+        template_split = template[WORKFLOW_BINDINGS["split_step"][0].node_id]["inputs"]["value"]
+        split_step = min(max(round(steps * template_split / template_steps), 1), steps - 1)
+    split_step = WORKFLOW_BINDINGS["split_step"][0].coerce("split_step", split_step)
+    if split_step >= steps:
+        raise ValueError(f"split_step({split_step})은 steps({steps})보다 작아야 합니다 (LOW 샘플러가 실행되지 않음).")
+
+    params = {"steps": steps, "split_step": split_step}
+    for key, value in (cfg_schedule or {}).items():
+        if key not in CFG_SCHEDULE_KEYS:
+            raise ValueError(f"지원하지 않는 cfg_schedule 키: {key} (사용 가능: {', '.join(CFG_SCHEDULE_KEYS)})")
+        params[CFG_SCHEDULE_KEYS[key]] = value
+    logger.info(f"Steps set to: {steps} (HIGH 0-{split_step}, LOW {split_step}-{steps})")
+    return params
+
+def canonical_loras(lora_pairs):
+    """LoRA 쌍을 HIGH/LOW별 ((이름, 가중치), ...) 정렬 튜플로 변환하는 함수
+
+    LoRA는 순서와 관계없이 더해지므로 슬롯을 정렬된 순서로 채우면 같은 LoRA 구성은 항상 같은 노드 입력이 되고,
+    ComfyUI 캐시가 직전 작업에서 LoRA를 적용한 모델(552/556)을 그대로 재사용한다.
+    """
+    return {
+        side: tuple(sorted(
+            (lora_pair[side], float(lora_pair.get(f"{side}_weight", 1.0)))
+            for lora_pair in lora_pairs[:MAX_LORA_PAIRS] if lora_pair.get(side)
+        ))
+        for side in LORA_NODE_IDS
+    }
+
+def build_prompt(template_name, params, lora_pairs=()):
+    """캐시된 템플릿에서 바인딩 테이블에 따라 작업용 워크플로우를 생성하는 함수
+
+    변경하는 노드만 복사하고 나머지 노드는 템플릿과 공유한다.
+    """
+    template = WORKFLOW_TEMPLATES[template_name]
+    prompt = dict(template)
+    for param, value in params.items():
+        for binding in WORKFLOW_BINDINGS[param]:
+            if binding.node_id not in template:
+                raise ValueError(f"'{template_name}' 워크플로우는 {param} 파라미터를 지원하지 않습니다 (노드 {binding.node_id} 없음)")
+            node_inputs(prompt, binding.node_id)[binding.input_name] = binding.coerce(param, value)
+
+    for side, loras in canonical_loras(lora_pairs).items():
+        node_id = LORA_NODE_IDS[side]
+        for i, (lora_name, weight) in enumerate(loras):
+            inputs = node_inputs(prompt, node_id)
+            inputs[f"lora_{i+1}"] = lora_name
+            inputs[f"strength_{i+1}"] = weight
+            logger.info(f"LoRA {i+1} {side.upper()} applied to node {node_id}: {lora_name} with weight {weight}")
+    return prompt
+
+# 긴 영상 모드 (segment_length) - 출력 비디오 노드(VHS_VideoCombine) 앞에 구간 프레임을 고르는 노드를 끼움
+VIDEO_OUTPUT_NODE_ID = "131"
+SEGMENT_TRIM_NODE_ID = "segment_trim"
+SEGMENT_LAST_FRAME_NODE_ID = "segment_last_frame"
+SEGMENT_PREVIEW_NODE_ID = "segment_last_frame_preview"
+MIN_SEGMENT_LENGTH = 5
+
+def plan_segments(length, segment_length):
+    """긴 영상 모드의 구간 계획 - [(생성 프레임 수, 앞에서 버릴 프레임 수, 출력 프레임 수), ...]
+
+    구간 길이는 Wan 프레임 수 규칙(4n+1)으로 내림한다. 2번째 구간부터는 앞 구간의 마지막 프레임을 시작 이미지로 쓰므로
+    구간끼리 한 프레임이 겹치고, 겹친 첫 프레임은 버린다. 마지막 구간은 남은 프레임만큼만 생성한다.
+    """
+    segment_length = max(MIN_SEGMENT_LENGTH, (segment_length - 1) // 4 * 4 + 1)
+    segments = [(segment_length, 0, min(length, segment_length))]
+    remaining = length - segments[0][2]
+    while remaining > 0:
+        keep = min(remaining, segment_length - 1)
+        segments.append((-(-keep // 4) * 4 + 1, 1, keep))
+        remaining -= keep
+    return segments
+
+def segment_frame_path(task_id, index):
+    """구간의 마지막 프레임 (다음 구간의 시작 이미지) 경로"""
+    return os.path.abspath(os.path.join(task_id, f"segment_{index + 1}_last.png"))
+
+def add_segment_nodes(prompt, frames, skip, keep, save_last_frame):
+    """구간 워크플로우에 출력할 프레임만 고르는 노드와, 다음 구간 시작 이미지용 마지막 프레임 노드를 추가"""
+    video_inputs = node_inputs(prompt, VIDEO_OUTPUT_NODE_ID)
+    decoded = list(video_inputs["images"])
+    if (skip, keep) != (0, frames):
+        prompt[SEGMENT_TRIM_NODE_ID] = {
+            "class_type": "ImageFromBatch",
+            "inputs": {"image": decoded, "batch_index": skip, "length": keep},
+        }
+        video_inputs["images"] = [SEGMENT_TRIM_NODE_ID, 0]
+    if save_last_frame:
+        prompt[SEGMENT_LAST_FRAME_NODE_ID] = {
+            "class_type": "ImageFromBatch",
+            "inputs": {"image": decoded, "batch_index": frames - 1, "length": 1},
+        }
+        prompt[SEGMENT_PREVIEW_NODE_ID] = {
+            "class_type": "PreviewImage",
+            "inputs": {"images": [SEGMENT_LAST_FRAME_NODE_ID, 0]},
+        }
+
+def build_segment_prompts(template_name, params, lora_pairs, segments, task_id):
+    """긴 영상 모드의 구간별 워크플로우를 생성하는 함수 - 2번째 구간부터는 앞 구간의 마지막 프레임에서 시작"""
+    prompts = []
+    for i, (frames, skip, keep) in enumerate(segments):
+        segment_params = dict(params, length=frames)
+        if i > 0:
+            segment_params["image"] = segment_frame_path(task_id, i - 1)
+        prompt = build_prompt(template_name, segment_params, lora_pairs)
+        add_segment_nodes(prompt, frames, skip, keep, save_last_frame=i < len(segments) - 1)
+        prompts.append(prompt)
+    return prompts
+
+# 모델 인덱스로 확인하는 템플릿 노드 입력 (노드 클래스 → {입력 이름: 모델 카테고리})
+MODEL_NODE_INPUTS = {
+    "WanVideoModelLoader": {"model": "diffusion_models"},
+    "WanVideoLoraSelectMulti": {f"lora_{i}": "loras" for i in range(MAX_LORA_PAIRS + 1)},
+}
+
+# 템플릿별 필요한 모델 파일 - (노드 ID, 입력 이름, 카테고리, 파일 이름)
+TEMPLATE_MODELS = {
+    name: tuple(
+        (node_id, input_name, category, node["inputs"][input_name])
+        for node_id, node in template.items()
+        for input_name, category in MODEL_NODE_INPUTS.get(node.get("class_type"), {}).items()
+        if isinstance(node["inputs"].get(input_name), str) and node["inputs"][input_name] != "none"
+    )
+    for name, template in WORKFLOW_TEMPLATES.items()
+}
+
+def validation_error(field, code, message):
+    return {"field": field, "code": code, "message": message}
+
+def parse_number(value, number_type):
+    """검증용 숫자 변환 (정수 바인딩은 float를 거치지 않아 큰 seed도 반올림되지 않음)"""
+    if isinstance(value, bool):
+        raise TypeError
+    if number_type is not int:
+        return float(value)
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    number = float(value)
+    if not number.is_integer():
+        raise ValueError
+    return int(number)
+
+def validate_job_input(job_input):
+    """ComfyUI에 보내기 전에 작업 입력을 검증하고 구조화된 오류 목록을 반환하는 함수 (비어 있으면 통과)
+
+    필수 값/타입/범위, 경로 입력 파일, LoRA와 템플릿 모델 파일 존재 여부를 확인한다.
+    모델 확인은 model_index 조회라서 디스크를 스캔하지 않는다 (인덱스가 없으면 건너뜀).
+    """
+    errors = []
+    numbers = {}
+    for param in ("width", "height", "cfg", "length", "steps", "split_step", "seed", "context_overlap"):
+        if param not in job_input:
+            if param in ("width", "height", "cfg"):
+                errors.append(validation_error(param, "required", f"{param} 값이 필요합니다."))
+            continue
+        value = job_input[param]
+        if value is None and param in ("split_step", "seed"):
+            continue
+        binding = WORKFLOW_BINDINGS[param][0]
+        try:
+            number = parse_number(value, binding.type)
+        except (TypeError, ValueError, OverflowError):
+            kind = "정수" if binding.type is int else "숫자"
+            errors.append(validation_error(param, "type", f"{param} 값이 {kind}가 아닙니다: {value!r}"))
+            continue
+        numbers[param] = number
+        if param == "length" and job_input.get("segment_length") is not None:
+            # 긴 영상 모드는 구간마다 segment_length 프레임씩 생성하므로 전체 길이에는 노드 최댓값을 적용하지 않음
+            if number < 1:
+                errors.append(validation_error(param, "range", f"length 값이 최솟값(1)보다 작습니다: {value}"))
+            continue
+        try:
+            binding.coerce(param, number)
+        except ValueError as e:
+            errors.append(validation_error(param, "range", str(e)))
+
+    split_step, steps = numbers.get("split_step"), numbers.get("steps", 10)
+    if not any(e["field"] in ("split_step", "steps") for e in errors) and split_step is not None and split_step >= steps:
+        errors.append(validation_error("split_step", "range", f"split_step({split_step})은 steps({steps})보다 작아야 합니다."))
+
+    segment_length = job_input.get("segment_length")
+    if segment_length is not None:
+        max_length = WORKFLOW_BINDINGS["length"][0].max_value
+        if isinstance(segment_length, bool) or not isinstance(segment_length, int):
+            errors.append(validation_error("segment_length", "type", f"segment_length 값이 정수가 아닙니다: {segment_length!r}"))
+        elif not MIN_SEGMENT_LENGTH <= segment_length <= max_length:
+            errors.append(validation_error("segment_length", "range", f"segment_length 값은 {MIN_SEGMENT_LENGTH}~{max_length} 사이여야 합니다: {segment_length}"))
+        if job_input.get("variants") or any(key in job_input for key in ("end_image_path", "end_image_url", "end_image_base64")):
+            errors.append(validation_error("segment_length", "unsupported", "긴 영상 모드(segment_length)는 variants, end_image_*와 함께 사용할 수 없습니다."))
+        if find_ffmpeg() is None:
+            errors.append(validation_error("segment_length", "unsupported", "ffmpeg가 없어 긴 영상 모드(segment_length)를 사용할 수 없습니다."))
+        # 끝난 구간은 출력 모드와 관계없이 업로드하여 URL로 전달하므로 업로더 설정이 필요 (url 모드는 아래에서 확인)
+        if job_input.get("output_mode") != "url" and output_upload_error():
+            errors.append(validation_error("segment_length", "unsupported", f"긴 영상 모드(segment_length)는 구간을 업로드하여 전달합니다: {output_upload_error()}"))
+
+    if job_input.get("output_mode") == "url":
+        upload_error = output_upload_error()
+        if upload_error:
+            errors.append(validation_error("output_mode", "unsupported", upload_error))
+
+    for key in ("image_path", "end_image_path"):
+        if key in job_input and not (isinstance(job_input[key], str) and os.path.isfile(job_input[key])):
+            errors.append(validation_error(key, "file_not_found", f"입력 파일이 없습니다: {job_input[key]!r}"))
+
+    lora_pairs = job_input.get("lora_pairs", [])
+    if not isinstance(lora_pairs, list):
+        errors.append(validation_error("lora_pairs", "type", "lora_pairs는 배열이어야 합니다."))
+        lora_pairs = []
+    if len(lora_pairs) > MAX_LORA_PAIRS:
+        errors.append(validation_error("lora_pairs", "range", f"LoRA는 최대 {MAX_LORA_PAIRS}쌍까지 지원됩니다: {len(lora_pairs)}쌍"))
+    for i, lora_pair in enumerate(lora_pairs[:MAX_LORA_PAIRS]):
+        if not isinstance(lora_pair, dict):
+            errors.append(validation_error(f"lora_pairs[{i}]", "type", "LoRA 설정은 객체여야 합니다."))
+            continue
+        for side in LORA_NODE_IDS:
+            name = lora_pair.get(side)
+            weight = lora_pair.get(f"{side}_weight", 1.0)
+            if isinstance(weight, bool) or not isinstance(weight, (int, float)):
+                errors.append(validation_error(f"lora_pairs[{i}].{side}_weight", "type", f"LoRA 가중치가 숫자가 아닙니다: {weight!r}"))
+            if not name:
+                continue
+            if not isinstance(name, str):
+                errors.append(validation_error(f"lora_pairs[{i}].{side}", "type", f"LoRA 이름이 문자열이 아닙니다: {name!r}"))
+            elif model_index.ready and not model_index.exists("loras", name):
+                errors.append(validation_error(f"lora_pairs[{i}].{side}", "model_not_found", f"LoRA 파일이 없습니다: {name}"))
+
+    if model_index.ready:
+        workflow_name = "flf2v" if any(key in job_input for key in ("end_image_path", "end_image_url", "end_image_base64")) else "single"
+        for node_id, input_name, category, name in TEMPLATE_MODELS[workflow_name]:
+            if not model_index.exists(category, name):
+                errors.append(validation_error(f"workflow.{node_id}.{input_name}", "model_not_found", f"{category} 모델 파일이 없습니다: {name}"))
+    return errors
+
+# 메모리 추정 모델 (Wan2.2 A14B fp8, sageattn 기준의 대략적인 값)
+# HIGH/LOW 모델은 force_offload로 한 번에 하나만 GPU에 올라가고, 디코딩 전에 모델이 내려간다.
+MODEL_WEIGHT_BYTES = 15 * 1024 ** 3
+MODEL_BLOCKS = 40
+BLOCK_BYTES = MODEL_WEIGHT_BYTES * 0.95 / MODEL_BLOCKS
+RUNTIME_RESERVE_BYTES = 2 * 1024 ** 3  # CUDA 컨텍스트, LoRA, 텍스트/CLIP 임베딩
+ACTIVATION_BYTES_PER_TOKEN = 60 * 1024  # 트랜스포머 블록 하나의 최대 활성화 메모리 (hidden 5120, FFN 13824)
+LATENT_BYTES_PER_ELEMENT = 4 * 4  # fp32 latent, 샘플러 상태 포함 약 4벌
+VAE_WEIGHT_BYTES = 256 * 1024 ** 2
+VAE_DECODE_BYTES_PER_PIXEL = 10 * 1024  # 프레임 단위(causal) 디코딩 시 픽셀당 피크 메모리
+VAE_TILE_PIXELS = 272 * 272  # WanVideoDecode tile_x/tile_y
+MEMORY_SAFETY_MARGIN = 0.9
+# 블록 스왑 단위 - 스왑 수가 바뀌면 LOW 모델 로더(549)가 다시 실행되므로 값을 거칠게 나눔
+BLOCK_SWAP_STEP = 10
+MIN_CONTEXT_FRAMES = 33
+
+def latent_tokens(width, height, frames):
+    """트랜스포머 토큰 수 - VAE 8x 공간/4x 시간 압축 후 1x2x2 패치"""
+    return ((frames - 1) // 4 + 1) * (height // 16) * (width // 16)
+
+def estimate_memory(width, height, context_frames, blocks_to_swap=0, vae_tiling=False):
+    """샘플링/디코딩 단계의 최대 GPU 메모리 사용량(바이트)을 추정하는 함수"""
+    latent_frames = (context_frames - 1) // 4 + 1
+    latent_bytes = 16 * latent_frames * (height // 8) * (width // 8) * LATENT_BYTES_PER_ELEMENT
+    sampling = (
+        MODEL_WEIGHT_BYTES - blocks_to_swap * BLOCK_BYTES
+        + latent_tokens(width, height, context_frames) * ACTIVATION_BYTES_PER_TOKEN
+        + latent_bytes
+        + RUNTIME_RESERVE_BYTES
+    )
+    decode_pixels = min(VAE_TILE_PIXELS, width * height) if vae_tiling else width * height
+    decode = VAE_WEIGHT_BYTES + decode_pixels * VAE_DECODE_BYTES_PER_PIXEL + RUNTIME_RESERVE_BYTES
+    return {"sampling": sampling, "decode": decode}
+
+def plan_memory(width, height, length, context_overlap, gpu_memory_bytes):
+    """GPU 메모리 안에서 가장 빠른 설정(컨텍스트 윈도우, 블록 스왑, VAE 타일링)을 고르는 함수
+
+    속도 우선순위: 전체 길이 한 번에 샘플링 > 블록 스왑 증가 > 컨텍스트 윈도우 축소.
+    VAE 타일링은 타일 없이 디코딩하면 메모리를 넘을 때만 켠다.
+    """
+    budget = gpu_memory_bytes * MEMORY_SAFETY_MARGIN
+    # 컨텍스트 윈도우 후보 (4n+1 프레임, overlap보다 길어야 함)
+    windows = [length] + [
+        frames for frames in range(length - 4, MIN_CONTEXT_FRAMES - 1, -4)
+        if frames > context_overlap
+    ]
+    swaps = list(range(0, MODEL_BLOCKS + 1, BLOCK_SWAP_STEP))
+    choice = None
+    for context_frames in windows:
+        for blocks_to_swap in swaps:
+            if estimate_memory(width, height, context_frames, blocks_to_swap)["sampling"] <= budget:
+                choice = (context_frames, blocks_to_swap)
+                break
+        if choice:
+            break
+    fits = choice is not None
+    if not fits:
+        choice = (windows[-1], swaps[-1])
+        logger.warning(f"메모리 계획: {width}x{height}x{length}은 가장 작은 설정으로도 GPU 메모리를 넘을 수 있습니다.")
+    context_frames, blocks_to_swap = choice
+    vae_tiling = estimate_memory(width, height, context_frames)["decode"] > budget
+    estimate = estimate_memory(width, height, context_frames, blocks_to_swap, vae_tiling)
+    return {
+        "gpu_memory_gb": round(gpu_memory_bytes / 1024 ** 3, 1),
+        "context_frames": context_frames,
+        "blocks_to_swap": blocks_to_swap,
+        "vae_tiling": vae_tiling,
+        "estimated_sampling_gb": round(estimate["sampling"] / 1024 ** 3, 1),
+        "estimated_decode_gb": round(estimate["decode"] / 1024 ** 3, 1),
+        "fits": fits,
+    }
+
+_gpu_memory_bytes = None
+
+def get_gpu_memory_bytes():
+    """GPU 메모리 크기 - GPU_MEMORY_GB 설정값 또는 ComfyUI /system_stats의 vram_total (조회 실패 시 None)"""
+    global _gpu_memory_bytes
+    if _gpu_memory_bytes is None:
+        if GPU_MEMORY_GB:
+            _gpu_memory_bytes = float(GPU_MEMORY_GB) * 1024 ** 3
+        else:
+            try:
+                response = comfy.session.get(f"{comfy.base_url}/system_stats", timeout=5)
+                response.raise_for_status()
+                _gpu_memory_bytes = response.json()["devices"][0]["vram_total"]
+                logger.info(f"GPU 메모리: {_gpu_memory_bytes / 1024 ** 3:.1f}GB (ComfyUI system_stats)")
+            except (requests.exceptions.RequestException, KeyError, IndexError, ValueError) as e:
+                logger.warning(f"GPU 메모리를 조회할 수 없어 템플릿 기본 메모리 설정을 사용합니다: {e}")
+    return _gpu_memory_bytes
+
+def resolve_memory_plan(width, height, length, context_overlap):
+    """작업의 메모리 계획 - 비활성화되었거나 GPU 메모리를 모르면 템플릿 기본값(전체 길이, 스왑/타일링 없음)"""
+    gpu_memory_bytes = get_gpu_memory_bytes() if MEMORY_PLANNER else None
+    if gpu_memory_bytes is None:
+        return {"context_frames": length, "blocks_to_swap": 0, "vae_tiling": False}
+    plan = plan_memory(width, height, length, context_overlap, gpu_memory_bytes)
+    logger.info(f"🧮 메모리 계획: {plan}")
+    return plan
+
+# 한 작업에서 생성할 수 있는 최대 변형(variants) 수
+MAX_VARIANTS = int(os.getenv('MAX_VARIANTS', '8'))
+VARIANT_KEYS = ("prompt", "negative_prompt", "seed")
+
+DEFAULT_NEGATIVE_PROMPT = "bright tones, overexposed, static, blurred details, subtitles, style, works, paintings, images, static, overall gray, worst quality, low quality, JPEG compression residue, ugly, incomplete, extra fingers, poorly drawn hands, poorly drawn faces, deformed, disfigured, misshapen limbs, fused fingers, still picture, messy background, three legs, many people in the background, walking backwards"
+
+# 워밍업용 합성 입력 - 작은 해상도, 5프레임, 2스텝 (HIGH/LOW 모델을 각각 1스텝씩 실행)
+# 시작 이미지는 warmup()에서 만드는 WARMUP_IMAGE_SIZE 크기의 회색 PNG
+WARMUP_IMAGE_SIZE = 64
+WARMUP_PARAMS = {
+    "prompt": "warmup",
+    "negative_prompt": DEFAULT_NEGATIVE_PROMPT,
+    "seed": 0,
+    "cfg": 1.0,
+    "width": 64,
+    "height": 64,
+    "length": 5,
+    "context_overlap": 0,
+    "context_frames": 5,
+    "steps": 2,
+    "split_step": 1,
+}
+
+# 워커 상태 - 콜드 스타트(워밍업)와 첫 작업 지연을 구분하여 측정하기 위해 사용
+worker_state = {
+    "ready": False,
+    "started_at": time.time(),
+    "warmup_seconds": None,
+    "warmup_error": None,
+    "jobs": 0,
+    # 마지막으로 실행한 작업의 LoRA 구성 (canonical_loras)과 구성이 바뀐/유지된 작업 수
+    "loras": None,
+    "lora_switches": 0,
+    "lora_reuses": 0,
+}
+
+def mark_worker_ready():
+    """워커 준비 완료 플래그를 설정하고 상태를 준비 파일에 기록하는 함수"""
+    worker_state["ready"] = True
+    worker_state["startup_seconds"] = round(time.time() - worker_state["started_at"], 2)
+    if WORKER_READY_FILE:
+        with open(WORKER_READY_FILE, "w") as f:
+            json.dump(worker_state, f)
+    logger.info(f"✅ 워커 준비 완료 (시작 후 {worker_state['startup_seconds']}초)")
+
+def write_warmup_image(path, size=WARMUP_IMAGE_SIZE):
+    """워밍업용 size x size 회색 RGB PNG를 만드는 함수 (Pillow 없이 zlib로 인코딩)"""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    rows = (b"\0" + b"\x80" * size * 3) * size
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(rows)))
+        f.write(chunk(b"IEND", b""))
+    return path
+
+def warmup():
+    """합성 워크플로우를 한 번 실행하여 모델(HIGH/LOW, T5, CLIP vision, VAE)을 RAM/VRAM에 로드하는 함수
+
+    실패해도 워커는 시작하며, 이 경우 첫 작업이 모델 로드 시간을 부담한다.
+    """
+    logger.info("🔥 워밍업 시작: 모델을 미리 로드합니다.")
+    start = time.time()
+    image_dir = tempfile.mkdtemp(prefix="warmup_")
+    try:
+        params = dict(WARMUP_PARAMS, image=write_warmup_image(os.path.join(image_dir, "warmup.png")))
+        # 기본 작업(480x832, 81프레임)과 같은 블록 스왑으로 로드해야 첫 작업에서 모델을 다시 로드하지 않음
+        params["blocks_to_swap"] = resolve_memory_plan(480, 832, 81, 48)["blocks_to_swap"]
+        if text_embed_cache:
+            params["text_embed_disk_cache"] = True
+        prompt = build_prompt("single", params)
+        tracker = ProgressTracker(prompt)
+        videos = get_videos(comfy.get_websocket(), prompt, tracker)
+        # 워밍업 결과 영상과 히스토리는 필요 없으므로 바로 삭제
+        job_retention.delete([tracker.prompt_id], [path for paths in videos.values() for path in paths])
+        worker_state["loras"] = canonical_loras(())
+        worker_state["warmup_seconds"] = round(time.time() - start, 2)
+        logger.info(f"🔥 워밍업 완료: {worker_state['warmup_seconds']}초")
+    except Exception as e:
+        worker_state["warmup_error"] = str(e)
+        comfy.reset_websocket()
+        logger.warning(f"워밍업 실패, 첫 작업에서 모델을 로드합니다: {e}")
+    finally:
+        shutil.rmtree(image_dir, ignore_errors=True)
+
+def worker_info(job_number):
+    """작업 결과에 포함할 워커 상태 (첫 작업 여부, 워밍업 시간)"""
+    return {
+        "warm": worker_state["warmup_seconds"] is not None,
+        "first_job": job_number == 1,
+        "warmup_seconds": worker_state["warmup_seconds"],
+        "startup_seconds": worker_state.get("startup_seconds"),
+        "model_index": model_index.stats(),
+        "lora_switches": worker_state["lora_switches"],
+        "lora_reuses": worker_state["lora_reuses"],
+    }
+
+def finalize_result(result, metrics, job_number):
+    """성공한 결과에 timings/sizes와 워커 상태를 추가"""
+    if "error" not in result:
+        result.update(metrics.report())
+        result["worker"] = worker_info(job_number)
+    return result
+
 def handler(job):
-    job_input = job.get("input", {})
+    task_id = f"task_{uuid.uuid4()}"
+    worker_state["jobs"] += 1
+    job_number = worker_state["jobs"]
+    metrics = JobMetrics()
+    staged = results = None
+    try:
+        staged = stage_job(job, task_id, metrics)
+        if isinstance(staged, dict):
+            return staged
+        results = execute_job(staged, metrics)
+        return finalize_result(finish_job(staged, results, metrics), metrics, job_number)
+    finally:
+        # 작업 종료 시 히스토리, 출력 비디오, 임시 입력 디렉토리를 보존 정책에 따라 정리
+        release_job(task_id, staged, results)
+
+# GPU 실행 큐 - 여러 작업을 동시에 받아도 ComfyUI 실행은 받은 순서대로 한 번에 하나씩 진행
+gpu_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gpu")
+# 긴 영상 모드의 구간 전달 (업로드) - GPU가 다음 구간을 생성하는 동안 진행
+segment_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="segment")
 
-    logger.info(f"Received job input: {job_input}")
+def concurrency_modifier(current_concurrency):
+    """RunPod concurrency modifier - 워커가 동시에 받을 작업 수를 반환"""
+    return max(JOB_CONCURRENCY, 1)
+
+async def async_handler(job):
+    """파이프라인 핸들러 - 작업 N이 GPU에서 실행되는 동안 작업 N+1의 입력을 준비하고,
+    작업 N의 출력 인코딩/업로드는 작업 N+1의 샘플링과 겹쳐서 수행한다.
+
+    준비/출력 단계는 기본 스레드 풀에서, GPU 실행은 gpu_executor 큐에서 순서대로 실행된다.
+    """
     task_id = f"task_{uuid.uuid4()}"
+    worker_state["jobs"] += 1
+    job_number = worker_state["jobs"]
+    metrics = JobMetrics()
+    loop = asyncio.get_running_loop()
+    staged = results = gpu_future = None
+    try:
+        staged = await loop.run_in_executor(None, stage_job, job, task_id, metrics)
+        if isinstance(staged, dict):
+            return staged
 
-    # 이미지 입력 처리 (image_path, image_url, image_base64 중 하나만 사용)
-    image_path = None
-    if "image_path" in job_input:
-        image_path = process_input(job_input["image_path"], task_id, "input_image.jpg", "path")
-    elif "image_url" in job_input:
-        image_path = process_input(job_input["image_url"], task_id, "input_image.jpg", "url")
-    elif "image_base64" in job_input:
-        image_path = process_input(job_input["image_base64"], task_id, "input_image.jpg", "base64")
-    else:
-        # 기본값 사용
-        image_path = "/example_image.png"
-        logger.info("기본 이미지 파일을 사용합니다: /example_image.png")
-
-    # 엔드 이미지 입력 처리 (end_image_path, end_image_url, end_image_base64 중 하나만 사용)
-    end_image_path_local = None
-    if "end_image_path" in job_input:
-        end_image_path_local = process_input(job_input["end_image_path"], task_id, "end_image.jpg", "path")
-    elif "end_image_url" in job_input:
-        end_image_path_local = process_input(job_input["end_image_url"], task_id, "end_image.jpg", "url")
-    elif "end_image_base64" in job_input:
-        end_image_path_local = process_input(job_input["end_image_base64"], task_id, "end_image.jpg", "base64")
+        queued_at = time.time()
+        def run_on_gpu():
+            # 앞선 작업의 GPU 실행이 끝나기를 기다린 시간
+            metrics.add_time("gpu_wait", time.time() - queued_at)
+            return execute_job(staged, metrics)
+
+        gpu_future = gpu_executor.submit(run_on_gpu)
+        # 취소되면 wrap_future가 아직 GPU 큐에서 기다리는 실행도 취소함
+        results = await asyncio.wrap_future(gpu_future)
+        result = await loop.run_in_executor(None, finish_job, staged, results, metrics)
+        return finalize_result(result, metrics, job_number)
+    except asyncio.CancelledError:
+        # RunPod에서 작업이 취소됨 - GPU 실행 스레드가 ComfyUI 프롬프트를 취소하도록 알림
+        logger.warning(f"작업 취소 요청을 받았습니다: {job.get('id')}")
+        if isinstance(staged, StagedJob):
+            staged.cancel_event.set()
+        raise
+    finally:
+        if gpu_future is not None and not gpu_future.done():
+            # 취소되었지만 GPU 스레드가 아직 ComfyUI 실행을 기다리는 중 - 입력 파일은 실행이 끝난 뒤에,
+            # 그 사이에 완성된 출력 비디오와 함께 보존 정책에 넘김
+            gpu_future.add_done_callback(lambda future: release_job(task_id, staged, settled_result(future)))
+        else:
+            await loop.run_in_executor(None, release_job, task_id, staged, results)
+
+def settled_result(future):
+    """끝난 Future의 결과 (취소되었거나 예외로 끝났으면 None)"""
+    if future.cancelled() or future.exception() is not None:
+        return None
+    return future.result()
+
+@dataclass
+class StagedJob:
+    """GPU 실행 전에 준비가 끝난 작업 (입력 파일, 워크플로우, 진행 추적기)"""
+    job: dict
+    task_id: str
+    output_mode: str
+    variants: list
+    variant_params: list
+    prompts: list
+    trackers: list
+    memory_plan: dict
+    # HIGH/LOW LoRA 구성 (canonical_loras)과 직전 작업 대비 변경 여부 (execute_job에서 설정)
+    loras: dict = field(default_factory=dict)
+    lora_switched: bool = None
+    # 긴 영상 모드 구간 계획 (plan_segments), 구간 전달 작업(Future), 전달이 끝난 구간 정보 (진행 상황에 포함)
+    segments: list = None
+    segment_futures: list = field(default_factory=list)
+    ready_segments: list = field(default_factory=list)
+    # RunPod 취소 시 설정 - GPU 실행 중이면 ComfyUI 프롬프트를 삭제/중단
+    cancel_event: threading.Event = field(default_factory=threading.Event)
+
+def stage_job(job, task_id, metrics):
+    """입력 다운로드/디코딩, 검증, 워크플로우 생성 - StagedJob 또는 오류 dict 반환"""
+    job_input = job.get("input", {})
+
+    logger.info(f"Received job input: {json.dumps(redact_job_input(job_input), ensure_ascii=False)}")
+
+    # 출력 모드 확인 (base64: 결과에 인라인 포함, url: 업로드 후 URL 반환)
+    output_mode = job_input.get("output_mode", "base64")
+    if output_mode not in ("base64", "url"):
+        return {"error": f"지원하지 않는 출력 모드: {output_mode}"}
+
+    # 사용 가능한 모델/LoRA 목록 조회 요청
+    if job_input.get("list_models"):
+        return {"models": model_index.snapshot()}
+
+    # 사전 검증 - 잘못된 입력은 입력 다운로드와 모델 로드 전에 실패
+    with metrics.stage("validate"):
+        errors = validate_job_input(job_input)
+    if errors:
+        return {"error": f"입력 검증 실패: {'; '.join(e['message'] for e in errors)}", "validation_errors": errors}
+
+    with metrics.stage("input"):
+        # 이미지 입력 처리 (image_path, image_url, image_base64 중 하나만 사용)
+        image_path = None
+        if "image_path" in job_input:
+            image_path = process_input(job_input["image_path"], task_id, "input_image.jpg", "path")
+        elif "image_url" in job_input:
+            image_path = process_input(job_input["image_url"], task_id, "input_image.jpg", "url")
+        elif "image_base64" in job_input:
+            image_path = process_input(job_input["image_base64"], task_id, "input_image.jpg", "base64")
+        else:
+            # 기본값 사용
+            image_path = "/example_image.png"
+            logger.info("기본 이미지 파일을 사용합니다: /example_image.png")
+
+        # 엔드 이미지 입력 처리 (end_image_path, end_image_url, end_image_base64 중 하나만 사용)
+        end_image_path_local = None
+        if "end_image_path" in job_input:
+            end_image_path_local = process_input(job_input["end_image_path"], task_id, "end_image.jpg", "path")
+        elif "end_image_url" in job_input:
+            end_image_path_local = process_input(job_input["end_image_url"], task_id, "end_image.jpg", "url")
+        elif "end_image_base64" in job_input:
+            end_image_path_local = process_input(job_input["end_image_base64"], task_id, "end_image.jpg", "base64")
+        for path in (image_path, end_image_path_local):
+            if path and os.path.exists(path):
+                metrics.add_size("input_bytes", os.path.getsize(path))
     
     # LoRA 설정 확인 - 배열로 받아서 처리
+    # 최대 MAX_LORA_PAIRS쌍 (초과하면 validate_job_input에서 거부됨)
     lora_pairs = job_input.get("lora_pairs", [])
+    # LoRA 파일 크기 합계 (LoRA 적용 비용 추정용)
+    metrics.add_size("lora_bytes", sum(
+        model_index.size("loras", lora_pair[side]) or 0
+        for lora_pair in lora_pairs[:MAX_LORA_PAIRS] for side in LORA_NODE_IDS if lora_pair.get(side)
+    ))
     
-    # 최대 4개 LoRA까지 지원
-    lora_count = min(len(lora_pairs), 4)
-    if lora_count > len(lora_pairs):
-        logger.warning(f"LoRA 개수가 {len(lora_pairs)}개입니다. 최대 4개까지만 지원됩니다. 처음 4개만 사용합니다.")
-        lora_pairs = lora_pairs[:4]
-    
-    # 워크플로우 파일 선택 (end_image_*가 있으면 FLF2V 워크플로 사용)
-    workflow_file = "/new_Wan22_flf2v_api.json" if end_image_path_local else "/new_Wan22_api.json"
-    logger.info(f"Using {'FLF2V' if end_image_path_local else 'single'} workflow with {lora_count} LoRA pairs")
-    
-    prompt = load_workflow(workflow_file)
+    # 워크플로우 선택 (end_image_*가 있으면 FLF2V 워크플로 사용)
+    workflow_name = "flf2v" if end_image_path_local else "single"
+    logger.info(f"Using {'FLF2V' if end_image_path_local else 'single'} workflow with {len(lora_pairs)} LoRA pairs")
     
     length = job_input.get("length", 81)
     steps = job_input.get("steps", 10)
 
-    prompt["244"]["inputs"]["image"] = image_path
-    prompt["541"]["inputs"]["num_frames"] = length
-    prompt["135"]["inputs"]["positive_prompt"] = job_input["prompt"]
-    prompt["135"]["inputs"]["negative_prompt"] = job_input.get("negative_prompt", "bright tones, overexposed, static, blurred details, subtitles, style, works, paintings, images, static, overall gray, worst quality, low quality, JPEG compression residue, ugly, incomplete, extra fingers, poorly drawn hands, poorly drawn faces, deformed, disfigured, misshapen limbs, fused fingers, still picture, messy background, three legs, many people in the background, walking backwards")
-    prompt["220"]["inputs"]["seed"] = job_input["seed"]
-    prompt["540"]["inputs"]["seed"] = job_input["seed"]
-    prompt["540"]["inputs"]["cfg"] = job_input["cfg"]
     # 해상도(폭/높이) 16배수 보정
     original_width = job_input["width"]
     original_height = job_input["height"]
@@ -206,94 +1902,215 @@ def handler(job):
         logger.info(f"Width adjusted to nearest multiple of 16: {original_width} -> {adjusted_width}")
     if adjusted_height != original_height:
         logger.info(f"Height adjusted to nearest multiple of 16: {original_height} -> {adjusted_height}")
-    prompt["235"]["inputs"]["value"] = adjusted_width
-    prompt["236"]["inputs"]["value"] = adjusted_height
-    prompt["498"]["inputs"]["context_overlap"] = job_input.get("context_overlap", 48)
-    prompt["498"]["inputs"]["context_frames"] = length
-
-    # step 설정 적용
-    if "834" in prompt:
-        prompt["834"]["inputs"]["steps"] = steps
-        logger.info(f"Steps set to: {steps}")
-        lowsteps = int(steps*0.6)
-        prompt["829"]["inputs"]["step"] = lowsteps
-        logger.info(f"LowSteps set to: {lowsteps}")
 
+    params = {
+        "image": image_path,
+        "prompt": job_input.get("prompt"),
+        "negative_prompt": job_input.get("negative_prompt", DEFAULT_NEGATIVE_PROMPT),
+        "length": length,
+        "seed": job_input.get("seed"),
+        "cfg": job_input["cfg"],
+        "width": adjusted_width,
+        "height": adjusted_height,
+        "context_overlap": job_input.get("context_overlap", 48),
+    }
+    # 긴 영상 모드 - length가 segment_length보다 길면 구간별로 생성한 뒤 이어 붙임
+    segments = None
+    # 해상도/길이와 GPU 메모리에 맞춰 컨텍스트 윈도우, 블록 스왑, VAE 타일링 결정
+    try:
+        if job_input.get("segment_length") is not None and int(length) > job_input["segment_length"]:
+            segments = plan_segments(int(length), job_input["segment_length"])
+            logger.info(f"🎞️ 긴 영상 모드: {length}프레임을 {len(segments)}개 구간으로 생성 (생성/버림/출력 프레임: {segments})")
+        # 긴 영상 모드는 구간 길이로 계획하므로 전체 길이와 관계없이 피크 메모리가 같음
+        plan_length = segments[0][0] if segments else int(length)
+        memory_plan = resolve_memory_plan(adjusted_width, adjusted_height, plan_length, int(params["context_overlap"]))
+    except (TypeError, ValueError):
+        return {"error": f"length/context_overlap 값이 정수가 아닙니다: {length!r}, {params['context_overlap']!r}"}
+    params.update({key: memory_plan[key] for key in ("context_frames", "blocks_to_swap", "vae_tiling")})
+    # 텍스트 임베딩 디스크 캐시 사용 - 캐시된 프롬프트는 T5 인코딩을 건너뜀
+    if text_embed_cache:
+        params["text_embed_disk_cache"] = True
     # 엔드 이미지가 있는 경우 617번 노드에 경로 적용 (FLF2V 전용)
     if end_image_path_local:
-        prompt["617"]["inputs"]["image"] = end_image_path_local
-    
-    # LoRA 설정 적용 - HIGH LoRA는 노드 279, LOW LoRA는 노드 553
-    if lora_count > 0:
-        # HIGH LoRA 노드 (279번)
-        high_lora_node_id = "279"
-        
-        # LOW LoRA 노드 (553번)
-        low_lora_node_id = "553"
-        
-        # 입력받은 LoRA pairs 적용 (lora_1부터 시작)
-        for i, lora_pair in enumerate(lora_pairs):
-            if i < 4:  # 최대 4개까지만
-                lora_high = lora_pair.get("high")
-                lora_low = lora_pair.get("low")
-                lora_high_weight = lora_pair.get("high_weight", 1.0)
-                lora_low_weight = lora_pair.get("low_weight", 1.0)
-                
-                # HIGH LoRA 설정 (노드 279번, lora_1부터 시작)
-                if lora_high:
-                    prompt[high_lora_node_id]["inputs"][f"lora_{i+1}"] = lora_high
-                    prompt[high_lora_node_id]["inputs"][f"strength_{i+1}"] = lora_high_weight
-                    logger.info(f"LoRA {i+1} HIGH applied to node 279: {lora_high} with weight {lora_high_weight}")
-                
-                # LOW LoRA 설정 (노드 553번, lora_1부터 시작)
-                if lora_low:
-                    prompt[low_lora_node_id]["inputs"][f"lora_{i+1}"] = lora_low
-                    prompt[low_lora_node_id]["inputs"][f"strength_{i+1}"] = lora_low_weight
-                    logger.info(f"LoRA {i+1} LOW applied to node 553: {lora_low} with weight {lora_low_weight}")
-
-    ws_url = f"ws://{server_address}:8188/ws?clientId={client_id}"
-    logger.info(f"Connecting to WebSocket: {ws_url}")
-    
-    # 먼저 HTTP 연결이 가능한지 확인
-    http_url = f"http://{server_address}:8188/"
-    logger.info(f"Checking HTTP connection to: {http_url}")
-    
-    # HTTP 연결 확인 (최대 1분)
-    max_http_attempts = 180
-    for http_attempt in range(max_http_attempts):
-        try:
-            import urllib.request
-            response = urllib.request.urlopen(http_url, timeout=5)
-            logger.info(f"HTTP 연결 성공 (시도 {http_attempt+1})")
-            break
-        except Exception as e:
-            logger.warning(f"HTTP 연결 실패 (시도 {http_attempt+1}/{max_http_attempts}): {e}")
-            if http_attempt == max_http_attempts - 1:
-                raise Exception("ComfyUI 서버에 연결할 수 없습니다. 서버가 실행 중인지 확인하세요.")
-            time.sleep(1)
-    
-    ws = websocket.WebSocket()
-    # 웹소켓 연결 시도 (최대 3분)
-    max_attempts = int(180/5)  # 3분 (1초에 한 번씩 시도)
-    for attempt in range(max_attempts):
-        import time
-        try:
-            ws.connect(ws_url)
-            logger.info(f"웹소켓 연결 성공 (시도 {attempt+1})")
-            break
-        except Exception as e:
-            logger.warning(f"웹소켓 연결 실패 (시도 {attempt+1}/{max_attempts}): {e}")
-            if attempt == max_attempts - 1:
-                raise Exception("웹소켓 연결 시간 초과 (3분)")
-            time.sleep(5)
-    videos = get_videos(ws, prompt)
-    ws.close()
-
-    # 이미지가 없는 경우 처리
-    for node_id in videos:
-        if videos[node_id]:
-            return {"video": videos[node_id][0]}
-    
-    return {"error": "비디오를를 찾을 수 없습니다."}
+        params["end_image"] = end_image_path_local
+
+    # 프롬프트/시드 변형 - 같은 이미지로 여러 영상을 한 번의 작업에서 생성
+    variants = job_input.get("variants")
+    if variants is not None and (not isinstance(variants, list) or not variants):
+        return {"error": "variants는 비어 있지 않은 배열이어야 합니다."}
+    if variants and len(variants) > MAX_VARIANTS:
+        return {"error": f"variants는 최대 {MAX_VARIANTS}개까지 지원됩니다: {len(variants)}개"}
+
+    try:
+        build_start = time.time()
+        # step 설정 적용 (전체 스텝, HIGH/LOW 분할 지점, CFG 스케줄)
+        params.update(resolve_step_schedule(workflow_name, steps, job_input.get("split_step"), job_input.get("cfg_schedule")))
+        variant_params = []
+        for variant in variants or [{}]:
+            merged = dict(params, **{key: variant[key] for key in VARIANT_KEYS if key in variant})
+            for key in ("prompt", "seed"):
+                if merged[key] is None:
+                    raise ValueError(f"{key} 값이 필요합니다.")
+            variant_params.append(merged)
+        if segments:
+            prompts = build_segment_prompts(workflow_name, variant_params[0], lora_pairs, segments, task_id)
+        else:
+            prompts = [build_prompt(workflow_name, p, lora_pairs) for p in variant_params]
+        metrics.add_time("build", time.time() - build_start)
+    except ValueError as e:
+        return {"error": str(e)}
+
+    if text_embed_cache:
+        texts = [text for p in variant_params for text in (p["prompt"], p["negative_prompt"])]
+        hits = text_embed_cache.lookup(texts)
+        logger.info(f"📦 텍스트 임베딩 캐시: {hits}/{len(set(texts))} 적중 (누적 {text_embed_cache.stats()})")
+
+    # ComfyUI 진행 상황을 RunPod progress update로 전달
+    report = (lambda progress: runpod.serverless.progress_update(job, progress)) if "id" in job else None
+    # 긴 영상 모드에서는 전달이 끝난 구간 목록(ready_segments)을 모든 진행 상황 업데이트에 함께 보냄
+    ready_segments = []
+    if segments:
+        extras = [{"segment": i + 1, "segments": len(segments), "ready_segments": ready_segments} for i in range(len(prompts))]
+    elif variants:
+        extras = [{"variant": i + 1, "variants": len(prompts)} for i in range(len(prompts))]
+    else:
+        extras = [None] * len(prompts)
+    trackers = [ProgressTracker(prompt, report=report, extra=extra) for prompt, extra in zip(prompts, extras)]
+    return StagedJob(job, task_id, output_mode, variants, variant_params, prompts, trackers, memory_plan,
+                     loras=canonical_loras(lora_pairs), segments=segments, ready_segments=ready_segments)
+
+def execute_job(staged, metrics):
+    """준비된 프롬프트를 ComfyUI에서 실행하고 노드별 출력 비디오 경로를 반환하는 함수"""
+    # GPU 큐에서 기다리는 동안 취소된 작업은 ComfyUI에 보내지 않음
+    check_job_deadline(None, staged.cancel_event)
+    with metrics.stage("connect"):
+        ws = comfy.get_websocket()
+    deadline = time.time() + JOB_TIMEOUT if JOB_TIMEOUT else None
+    # GPU 실행 순서대로 적용된 LoRA 구성을 추적 - 직전 작업과 같으면 HIGH/LOW 모델에 LoRA를 다시 적용하지 않음
+    staged.lora_switched = staged.loras != worker_state["loras"]
+    worker_state["lora_switches" if staged.lora_switched else "lora_reuses"] += 1
+    worker_state["loras"] = staged.loras
+    if staged.lora_switched:
+        logger.info(f"🔀 LoRA 구성 변경: {worker_state['loras']}")
+    if staged.segments:
+        results = execute_segments(ws, staged, metrics, deadline)
+    else:
+        results = get_videos_batch(ws, staged.prompts, staged.trackers, metrics, deadline, staged.cancel_event)
+
+    if text_embed_cache:
+        text_embed_cache.evict()
+    return results
+
+def save_segment_frame(tracker, path):
+    """구간의 마지막 프레임(PreviewImage 출력)을 ComfyUI에서 받아 다음 구간의 시작 이미지로 저장하는 함수"""
+    images = tracker.images.get(SEGMENT_PREVIEW_NODE_ID)
+    if not images:
+        # executed 이벤트를 받지 못한 경우(재연결 등) 히스토리에서 조회
+        outputs = get_history(tracker.prompt_id).get(tracker.prompt_id, {}).get("outputs", {})
+        images = outputs.get(SEGMENT_PREVIEW_NODE_ID, {}).get("images")
+    if not images:
+        raise Exception("구간의 마지막 프레임을 찾을 수 없습니다.")
+    image = images[0]
+    data = get_image(image["filename"], image.get("subfolder", ""), image.get("type", "temp"))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+def deliver_segment(staged, index, path):
+    """끝난 구간을 부분 결과로 전달하는 함수 - 구간 비디오를 업로드하고 URL을 ready_segments에 추가
+
+    ready_segments는 다음 구간의 진행 상황 업데이트마다 함께 전달된다. 진행 상황 업데이트에 비디오를 인라인으로
+    넣을 수 없으므로 base64 모드에서도 구간은 업로드하여 전달하고, 최종 비디오만 base64로 반환한다.
+    """
+    frames, skip, keep = staged.segments[index]
+    segment = {"segment": index + 1, "frames": keep, "bytes": os.path.getsize(path)}
+    segment.update(build_video_output(path, "url", staged.job.get("id", staged.task_id)))
+    staged.ready_segments.append(segment)
+    logger.info(f"🎞️ 구간 {index + 1}/{len(staged.segments)} 완료: {keep}프레임")
+    return segment
+
+def execute_segments(ws, staged, metrics, deadline):
+    """긴 영상 모드 - 구간을 순서대로 실행하고, 끝난 구간은 다음 구간을 생성하는 동안 부분 결과로 전달하는 함수
+
+    각 구간의 마지막 프레임을 다음 구간의 시작 이미지로 저장하고, 구간 비디오 경로를 출력 노드 아래에 모아 반환한다.
+    """
+    paths = []
+    for i, (prompt, tracker) in enumerate(zip(staged.prompts, staged.trackers)):
+        # 구간은 하나씩 큐에 넣으므로, 앞 구간이 실패하거나 취소/시간 초과되면 남은 구간은 ComfyUI에 보내지 않음
+        check_job_deadline(deadline, staged.cancel_event)
+        videos = get_videos_batch(ws, [prompt], [tracker], metrics, deadline, staged.cancel_event)[0]
+        # 구간 실행 중 재연결되었을 수 있으므로 다음 구간은 현재 웹소켓을 사용
+        ws = comfy.get_websocket()
+        found = [node_paths[0] for node_paths in videos.values() if node_paths]
+        if not found:
+            raise Exception(f"구간 {i + 1}의 비디오를 찾을 수 없습니다.")
+        paths.append(found[0])
+        if i < len(staged.segments) - 1:
+            with metrics.stage("segment_frame"):
+                save_segment_frame(tracker, segment_frame_path(staged.task_id, i))
+        staged.segment_futures.append(segment_executor.submit(deliver_segment, staged, i, found[0]))
+    return [{VIDEO_OUTPUT_NODE_ID: paths}]
+
+def finish_long_video(staged, results, metrics):
+    """긴 영상 모드의 결과 - 구간 전달이 끝나기를 기다린 뒤 구간 비디오를 재인코딩 없이 이어 붙여 전달하는 함수"""
+    segments = []
+    with metrics.stage("output"):
+        for i, future in enumerate(staged.segment_futures):
+            try:
+                segments.append(future.result())
+            except Exception as e:
+                # 구간 전달(업로드) 실패는 최종 비디오 전달을 막지 않음
+                logger.warning(f"구간 {i + 1} 전달 실패: {e}")
+                segments.append({"segment": i + 1, "error": str(e)})
+    with metrics.stage("concat"):
+        video_path = concat_videos(results[0][VIDEO_OUTPUT_NODE_ID], os.path.abspath(os.path.join(staged.task_id, "long_video.mp4")))
+    with metrics.stage("output"):
+        metrics.add_size("output_bytes", os.path.getsize(video_path))
+        result = build_video_output(video_path, staged.output_mode, staged.job.get("id", staged.task_id))
+        metrics.add_size("output_payload_bytes", len(result.get("video") or result.get("video_url", "")))
+    result["segments"] = segments
+    result["memory_plan"] = staged.memory_plan
+    result["lora_switched"] = staged.lora_switched
+    return result
+
+def finish_job(staged, results, metrics):
+    """출력 비디오를 Base64 인코딩 또는 업로드하여 작업 결과를 만드는 함수"""
+    if staged.segments:
+        return finish_long_video(staged, results, metrics)
+    outputs = []
+    with metrics.stage("output"):
+        for videos in results:
+            # 이미지가 없는 경우 처리
+            found = [node_paths[0] for node_paths in videos.values() if node_paths]
+            if found:
+                metrics.add_size("output_bytes", os.path.getsize(found[0]))
+                output = build_video_output(found[0], staged.output_mode, staged.job.get("id", staged.task_id))
+                metrics.add_size("output_payload_bytes", len(output.get("video") or output.get("video_url", "")))
+                outputs.append(output)
+            else:
+                outputs.append({"error": "비디오를를 찾을 수 없습니다."})
+
+    if not staged.variants:
+        result = outputs[0]
+    else:
+        result = {
+            "videos": [
+                dict(output, index=i, prompt=p["prompt"], seed=p["seed"])
+                for i, (output, p) in enumerate(zip(outputs, staged.variant_params))
+            ]
+        }
+    if "error" not in result:
+        result["memory_plan"] = staged.memory_plan
+        result["lora_switched"] = staged.lora_switched
+    return result
 
-runpod.serverless.start({"handler": handler})
\ No newline at end of file
+if __name__ == "__main__":
+    # 워커 시작 시 한 번만 ComfyUI 준비 상태를 확인하고 웹소켓을 연결
+    comfy.wait_until_ready()
+    comfy.get_websocket()
+    model_index.start()
+    if WARMUP_ENABLED:
+        warmup()
+    mark_worker_ready()
+    runpod.serverless.start({"handler": async_handler, "concurrency_modifier": concurrency_modifier})
@@ -0,0 +1,131 @@
+"""
+Unit checks for handler input validation, long-video segment planning and
+memory planning. These run without ComfyUI or a GPU:
+
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Keep module import side effects (caches, model index) off the real volume
+os.environ.setdefault("INPUT_CACHE_DIR", "")
+os.environ.setdefault("TEXT_EMBED_CACHE_DIR", "")
+os.environ.setdefault("MODEL_PATHS_CONFIG", os.path.join(ROOT, "tests", "missing_extra_model_paths.yaml"))
+
+import pytest  # noqa: E402
+
+import handler  # noqa: E402
+
+BASE_INPUT = {"width": 480, "height": 832, "cfg": 1.0}
+
+
+def errors_for(**job_input):
+    return [(e["field"], e["code"]) for e in handler.validate_job_input({**BASE_INPUT, **job_input})]
+
+
+def test_required_fields():
+    assert handler.validate_job_input({}) == [
+        {"field": param, "code": "required", "message": f"{param} 값이 필요합니다."}
+        for param in ("width", "height", "cfg")
+    ]
+
+
+@pytest.mark.parametrize("seed", [0, 0xffffffffffffffff, "18446744073709551615", 7.0])
+def test_seed_accepts_full_range(seed):
+    assert errors_for(seed=seed) == []
+
+
+@pytest.mark.parametrize("seed, code", [
+    (0xffffffffffffffff + 1, "range"),
+    (-1, "range"),
+    (1.5, "type"),
+    (True, "type"),
+    ("abc", "type"),
+])
+def test_seed_rejects_invalid(seed, code):
+    assert errors_for(seed=seed) == [("seed", code)]
+
+
+def test_float_binding_keeps_fractions():
+    assert errors_for(cfg=1.5) == []
+    assert errors_for(cfg=31) == [("cfg", "range")]
+
+
+@pytest.mark.parametrize("job_input, expected", [
+    ({"width": 8193}, [("width", "range")]),
+    ({"width": 480.5}, [("width", "type")]),
+    ({"length": 1001}, [("length", "range")]),
+    ({"steps": 1}, [("steps", "range")]),
+    ({"steps": 4, "split_step": 4}, [("split_step", "range")]),
+    ({"steps": 4, "split_step": 3}, []),
+    ({"split_step": None, "seed": None}, []),
+])
+def test_numeric_limits(job_input, expected):
+    assert errors_for(**job_input) == expected
+
+
+def test_lora_pair_limit():
+    pairs = [{"high": "", "low": ""}] * (handler.MAX_LORA_PAIRS + 1)
+    assert errors_for(lora_pairs=pairs) == [("lora_pairs", "range")]
+    assert errors_for(lora_pairs=pairs[:handler.MAX_LORA_PAIRS]) == []
+
+
+def test_segment_length_limits(monkeypatch):
+    monkeypatch.setattr(handler, "find_ffmpeg", lambda: "/usr/bin/ffmpeg")
+    monkeypatch.setattr(handler, "output_upload_error", lambda: None)
+    # 긴 영상 모드에서는 전체 length에 노드 최댓값을 적용하지 않음
+    assert errors_for(length=2000, segment_length=81) == []
+    assert errors_for(segment_length=handler.MIN_SEGMENT_LENGTH - 1) == [("segment_length", "range")]
+    assert errors_for(segment_length=81.0) == [("segment_length", "type")]
+    assert errors_for(segment_length=81, variants=[{"seed": 1}]) == [("segment_length", "unsupported")]
+
+    monkeypatch.setattr(handler, "find_ffmpeg", lambda: None)
+    assert errors_for(segment_length=81) == [("segment_length", "unsupported")]
+
+
+@pytest.mark.parametrize("length, segment_length", [(81, 81), (200, 81), (161, 81), (10, 33), (300, 50)])
+def test_plan_segments_covers_length(length, segment_length):
+    segments = handler.plan_segments(length, segment_length)
+    assert sum(keep for frames, skip, keep in segments) == length
+    assert segments[0][1] == 0
+    for frames, skip, keep in segments:
+        # Wan 프레임 수 규칙 (4n+1), 출력 프레임은 버린 프레임 뒤에 들어가야 함
+        assert frames % 4 == 1
+        assert skip + keep <= frames
+    for frames, skip, keep in segments[1:]:
+        assert skip == 1
+
+
+def test_plan_segments_rounds_down_segment_length():
+    assert handler.plan_segments(200, 83) == [(81, 0, 81), (81, 1, 80), (41, 1, 39)]
+
+
+def test_resolve_memory_plan_disabled(monkeypatch):
+    monkeypatch.setattr(handler, "MEMORY_PLANNER", False)
+    assert handler.resolve_memory_plan(1280, 720, 81, 16) == {"context_frames": 81, "blocks_to_swap": 0, "vae_tiling": False}
+
+
+def test_resolve_memory_plan_unknown_gpu(monkeypatch):
+    monkeypatch.setattr(handler, "MEMORY_PLANNER", True)
+    monkeypatch.setattr(handler, "get_gpu_memory_bytes", lambda: None)
+    assert handler.resolve_memory_plan(1280, 720, 81, 16)["blocks_to_swap"] == 0
+
+
+def test_resolve_memory_plan_large_gpu(monkeypatch):
+    monkeypatch.setattr(handler, "MEMORY_PLANNER", True)
+    monkeypatch.setattr(handler, "get_gpu_memory_bytes", lambda: 1024 * 1024 ** 3)
+    plan = handler.resolve_memory_plan(480, 832, 81, 16)
+    assert (plan["context_frames"], plan["blocks_to_swap"], plan["vae_tiling"], plan["fits"]) == (81, 0, False, True)
+
+
+def test_resolve_memory_plan_small_gpu(monkeypatch):
+    monkeypatch.setattr(handler, "MEMORY_PLANNER", True)
+    monkeypatch.setattr(handler, "get_gpu_memory_bytes", lambda: 24 * 1024 ** 3)
+    plan = handler.resolve_memory_plan(1280, 720, 161, 16)
+    # 메모리가 부족하면 블록 스왑 또는 컨텍스트 윈도우 축소로 예산 안에 맞춤
+    assert plan["blocks_to_swap"] > 0 or plan["context_frames"] < 161
+    assert plan["estimated_sampling_gb"] <= 24